@@ -0,0 +1,187 @@
+import asyncio
+import logging
+import math
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from backend.metrics import ADMISSION_EVENTS, QUEUE_DEPTH, IN_FLIGHT, observe
+
+log = logging.getLogger(__name__)
+
+
+def limits(name, concurrency, queue, timeout):
+    prefix = name.upper()
+    return {
+        "limit": int(os.getenv(f"{prefix}_CONCURRENCY", concurrency)),
+        "max_queue": int(os.getenv(f"{prefix}_QUEUE", queue)),
+        "timeout": float(os.getenv(f"{prefix}_QUEUE_TIMEOUT", timeout)),
+    }
+
+
+# seconds ingestion embedding may be held back by query embedding
+EMBED_YIELD_MAX = float(os.getenv("EMBED_YIELD_MAX", 2))
+
+
+class Overloaded(Exception):
+    """Request shed by admission control; answered with 429."""
+
+    def __init__(self, endpoint, retry_after, reason):
+        super().__init__(f"{endpoint} overloaded ({reason})")
+        self.endpoint = endpoint
+        self.retry_after = retry_after
+        self.reason = reason
+
+
+# -----------------------------
+# ENDPOINT LIMITER
+# -----------------------------
+class Limiter:
+    """At most `limit` requests run at once, `max_queue` more wait in
+    FIFO order. A request is rejected up front when the queue is full or
+    its estimated wait (from a moving average of service time) exceeds
+    `timeout`, and rejected after waiting `timeout` seconds otherwise.
+    Waiters hold no thread, only an event-loop future.
+    """
+
+    def __init__(self, name, limit, max_queue, timeout):
+        self.name = name
+        self.limit = limit
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.active = 0
+        self.waiters = deque()
+        self.service = 1.0      # EWMA of seconds per request
+
+    def estimate(self, position):
+        # seconds until `position` requests ahead of us have been served
+        return self.service * position / self.limit
+
+    def reject(self, reason, wait):
+        ADMISSION_EVENTS.labels(self.name, reason).inc()
+        retry_after = max(1, math.ceil(wait))
+        log.warning("%s shed (%s), %d running, %d queued", self.name, reason, self.active, len(self.waiters))
+        raise Overloaded(self.name, retry_after, reason)
+
+    def _gauges(self):
+        QUEUE_DEPTH.labels(self.name).set(len(self.waiters))
+        IN_FLIGHT.labels(self.name).set(self.active)
+
+    async def acquire(self):
+        if self.active < self.limit and not self.waiters:
+            self.active += 1
+            self._gauges()
+            ADMISSION_EVENTS.labels(self.name, "admitted").inc()
+            return
+
+        position = len(self.waiters) + 1
+        if len(self.waiters) >= self.max_queue:
+            self.reject("queue_full", self.estimate(position))
+        if self.estimate(position) > self.timeout:
+            self.reject("deadline", self.estimate(position))
+
+        waiter = asyncio.get_running_loop().create_future()
+        self.waiters.append(waiter)
+        self._gauges()
+        start = time.monotonic()
+        try:
+            await asyncio.wait_for(waiter, self.timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.done() and not waiter.cancelled():
+                # the slot was handed over as we gave up: pass it on
+                self.release()
+            elif waiter in self.waiters:
+                self.waiters.remove(waiter)
+            self._gauges()
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            self.reject("timeout", self.estimate(len(self.waiters) + 1))
+        finally:
+            observe("admission", self.name, time.monotonic() - start)
+
+        ADMISSION_EVENTS.labels(self.name, "queued").inc()
+
+    def release(self):
+        while self.waiters:
+            waiter = self.waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)     # slot moves to the waiter
+                self._gauges()
+                return
+        self.active -= 1
+        self._gauges()
+
+    async def run(self, fn, *args, **kwargs):
+        """Run `fn` on the threadpool in an admitted slot.
+
+        The slot is released when `fn` returns, not when the request ends:
+        a client that disconnects cancels the request, but the thread keeps
+        running and still counts against `limit`.
+        """
+        from starlette.concurrency import run_in_threadpool
+
+        await self.acquire()
+        start = time.monotonic()
+        try:
+            work = asyncio.ensure_future(run_in_threadpool(fn, *args, **kwargs))
+        except BaseException:
+            self.release()
+            raise
+
+        def finished(task):
+            if not task.cancelled():
+                task.exception()    # retrieved here if the request is gone
+            self.service = 0.8 * self.service + 0.2 * (time.monotonic() - start)
+            self.release()
+
+        work.add_done_callback(finished)
+        return await asyncio.shield(work)
+
+
+query_limiter = Limiter("query", **limits("query", 8, 32, 10))
+summarize_limiter = Limiter("summarize", **limits("summarize", 2, 8, 30))
+
+
+# -----------------------------
+# EMBEDDING PRIORITY
+# -----------------------------
+class PriorityGate:
+    """Lets query embeddings run ahead of ingestion embeddings on the
+    shared model. Background batches wait while any foreground call is
+    in progress, for at most EMBED_YIELD_MAX seconds so ingestion is
+    never starved outright."""
+
+    def __init__(self, max_yield=EMBED_YIELD_MAX):
+        self.max_yield = max_yield
+        self.foreground_calls = 0
+        self.waiting = 0
+        self.cond = threading.Condition()
+
+    @contextmanager
+    def foreground(self):
+        with self.cond:
+            self.foreground_calls += 1
+        try:
+            yield
+        finally:
+            with self.cond:
+                self.foreground_calls -= 1
+                if not self.foreground_calls:
+                    self.cond.notify_all()
+
+    @contextmanager
+    def background(self):
+        with self.cond:
+            if self.foreground_calls:
+                self.waiting += 1
+                QUEUE_DEPTH.labels("ingest_embed").set(self.waiting)
+                start = time.monotonic()
+                self.cond.wait_for(lambda: not self.foreground_calls, self.max_yield)
+                observe("admission", "ingest_embed", time.monotonic() - start)
+                self.waiting -= 1
+                QUEUE_DEPTH.labels("ingest_embed").set(self.waiting)
+        yield
+
+
+embedding_gate = PriorityGate()
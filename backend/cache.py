@@ -0,0 +1,294 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import struct
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from backend.metrics import CACHE_EVENTS
+
+log = logging.getLogger(__name__)
+
+# "sqlite" shares entries between uvicorn workers and across restarts;
+# "memory" keeps the per-process L1 only.
+QUERY_CACHE = os.getenv("QUERY_CACHE", "sqlite")
+QUERY_CACHE_PATH = os.getenv(
+    "QUERY_CACHE_PATH", os.path.join(tempfile.gettempdir(), "intyrasense-cache.sqlite3")
+)
+QUERY_CACHE_L1_SIZE = int(os.getenv("QUERY_CACHE_L1_SIZE", 256))
+QUERY_CACHE_L2_SIZE = int(os.getenv("QUERY_CACHE_L2_SIZE", 50000))
+RETRIEVAL_CACHE_TTL = float(os.getenv("RETRIEVAL_CACHE_TTL", 300))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS embeddings (
+    key TEXT PRIMARY KEY,
+    model TEXT NOT NULL,
+    vector BLOB NOT NULL,
+    used REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS retrievals (
+    key TEXT PRIMARY KEY,
+    payload TEXT NOT NULL,
+    expires REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+
+# -----------------------------
+# ENCODING
+# -----------------------------
+def pack_vector(vector):
+    # float16: 768 bytes for a 384-dim embedding instead of ~3 KB of floats
+    return struct.pack(f"<{len(vector)}e", *vector)
+
+
+def unpack_vector(blob):
+    return struct.unpack(f"<{len(blob) // 2}e", blob)
+
+
+def cache_key(*parts):
+    return hashlib.sha256("\x00".join(str(p) for p in parts).encode("utf-8")).hexdigest()
+
+
+# -----------------------------
+# L1: IN-PROCESS LRU
+# -----------------------------
+class LRU:
+
+    def __init__(self, size):
+        self.size = size
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            value = self.items.get(key)
+            if value is not None:
+                self.items.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self.lock:
+            self.items[key] = value
+            self.items.move_to_end(key)
+            while len(self.items) > self.size:
+                self.items.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.items.clear()
+
+
+# -----------------------------
+# L2: SHARED SQLITE FILE
+# -----------------------------
+class SqliteStore:
+    """WAL-mode sqlite file shared by every worker on the host.
+
+    A file that cannot be opened or given the schema disables the store for
+    this process; the caches keep working from L1 only. Errors on a single
+    statement (a lock held past the timeout by another worker) are a miss.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.local = threading.local()
+        self.disabled = False
+
+    def _conn(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            try:
+                conn = sqlite3.connect(self.path, timeout=1.0, isolation_level=None)
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("PRAGMA synchronous=NORMAL")
+                conn.executescript(SCHEMA)
+            except sqlite3.Error as e:
+                if is_busy(e):
+                    raise
+                self.disabled = True
+                log.warning("query cache store %s disabled: %s", self.path, e)
+                return None
+            self.local.conn = conn
+        return conn
+
+    def run(self, sql, params=(), fetch=False):
+        if self.disabled:
+            return None
+        try:
+            conn = self._conn()
+            if conn is None:
+                return None
+            cursor = conn.execute(sql, params)
+            return cursor.fetchone() if fetch else True
+        except sqlite3.Error as e:
+            if is_busy(e):
+                log.debug("query cache store busy: %s", e)
+            else:
+                log.warning("query cache statement failed: %s", e)
+            return None
+
+
+def is_busy(error):
+    # another worker holds the write lock past our timeout
+    message = str(error).lower()
+    return isinstance(error, sqlite3.OperationalError) and ("locked" in message or "busy" in message)
+
+
+def open_store():
+    if QUERY_CACHE != "sqlite":
+        return None
+    store = SqliteStore(QUERY_CACHE_PATH)
+    store.run("SELECT 1")
+    # busy at startup is fine; only a file we cannot use is dropped
+    return None if store.disabled else store
+
+
+# -----------------------------
+# QUERY EMBEDDINGS
+# -----------------------------
+class EmbeddingCache:
+    """Query text -> float16 vector, keyed by embedding model name."""
+
+    def __init__(self, model, store=None, size=QUERY_CACHE_L1_SIZE):
+        self.model = model
+        self.store = store
+        self.l1 = LRU(size)
+        self.inserts = 0
+
+    def get_or_compute(self, text, compute):
+        key = cache_key(self.model, text)
+
+        vector = self.l1.get(key)
+        if vector is not None:
+            CACHE_EVENTS.labels("embedding", "l1_hit").inc()
+            return vector
+
+        row = self.store.run(
+            "SELECT vector FROM embeddings WHERE key = ?", (key,), fetch=True
+        ) if self.store else None
+        if row:
+            CACHE_EVENTS.labels("embedding", "l2_hit").inc()
+            vector = unpack_vector(row[0])
+            self.l1.put(key, vector)
+            self.store.run("UPDATE embeddings SET used = ? WHERE key = ?", (time.time(), key))
+            return vector
+
+        CACHE_EVENTS.labels("embedding", "miss").inc()
+        blob = pack_vector(compute(text))
+        # hand back the float16 round-trip so hits and misses score identically
+        vector = unpack_vector(blob)
+        self.l1.put(key, vector)
+        if self.store:
+            self.store.run(
+                "INSERT OR REPLACE INTO embeddings (key, model, vector, used) VALUES (?, ?, ?, ?)",
+                (key, self.model, blob, time.time()),
+            )
+            self._trim()
+        return vector
+
+    def _trim(self):
+        # amortized eviction: enforce the size bound every 64th insert. The
+        # bound is LRU across models: during a re-index both the active and
+        # the new model are queried, and a retired model's vectors age out.
+        self.inserts += 1
+        if self.inserts % 64:
+            return
+        self.store.run(
+            "DELETE FROM embeddings WHERE key IN ("
+            " SELECT key FROM embeddings ORDER BY used DESC LIMIT -1 OFFSET ?)",
+            (QUERY_CACHE_L2_SIZE,),
+        )
+
+
+# -----------------------------
+# RETRIEVAL RESULTS
+# -----------------------------
+class RetrievalCache:
+    """(model, query, filter, k) -> matched rows, for RETRIEVAL_CACHE_TTL.
+
+    Keys include a corpus version that ingestion and deletion bump, so a
+    changed corpus never serves stale matches in any worker.
+    """
+
+    def __init__(self, model, store=None, size=QUERY_CACHE_L1_SIZE, ttl=RETRIEVAL_CACHE_TTL):
+        self.model = model
+        self.store = store
+        self.ttl = ttl
+        self.l1 = LRU(size)
+        self.local_version = 0
+
+    def version(self):
+        if self.store:
+            row = self.store.run("SELECT value FROM meta WHERE name = 'corpus'", fetch=True)
+            if row:
+                return row[0]
+        return self.local_version
+
+    def bump(self):
+        self.local_version += 1
+        if self.store:
+            self.store.run(
+                "INSERT INTO meta (name, value) VALUES ('corpus', 1) "
+                "ON CONFLICT(name) DO UPDATE SET value = value + 1"
+            )
+            self.store.run("DELETE FROM retrievals WHERE expires < ?", (time.time(),))
+
+    def get(self, *parts):
+        if self.ttl <= 0:
+            return None, None
+        key = cache_key(self.model, self.version(), *parts)
+
+        hit = self.l1.get(key)
+        if hit is not None and hit[0] > time.time():
+            CACHE_EVENTS.labels("retrieval", "l1_hit").inc()
+            return key, hit[1]
+
+        row = self.store.run(
+            "SELECT payload, expires FROM retrievals WHERE key = ?", (key,), fetch=True
+        ) if self.store else None
+        if row and row[1] > time.time():
+            CACHE_EVENTS.labels("retrieval", "l2_hit").inc()
+            rows = json.loads(row[0])
+            self.l1.put(key, (row[1], rows))
+            return key, rows
+
+        CACHE_EVENTS.labels("retrieval", "miss").inc()
+        return key, None
+
+    def put(self, key, rows):
+        if key is None:
+            return
+        expires = time.time() + self.ttl
+        self.l1.put(key, (expires, rows))
+        if self.store:
+            self.store.run(
+                "INSERT OR REPLACE INTO retrievals (key, payload, expires) VALUES (?, ?, ?)",
+                (key, json.dumps(rows), expires),
+            )
+
+
+# -----------------------------
+# STATS
+# -----------------------------
+def stats():
+    """Hit rates per cache from the Prometheus counters."""
+    counts = {}
+    for metric in CACHE_EVENTS.collect():
+        for sample in metric.samples:
+            if sample.name.endswith("_total"):
+                counts.setdefault(sample.labels["cache"], {})[sample.labels["result"]] = sample.value
+
+    out = {}
+    for name, c in counts.items():
+        total = sum(c.values())
+        hits = c.get("l1_hit", 0) + c.get("l2_hit", 0)
+        out[name] = {**c, "hit_rate": hits / total if total else 0.0}
+    return out
@@ -0,0 +1,175 @@
+import os
+import re
+from bisect import bisect_right
+from langchain_core.documents import Document
+from backend.models import tokenizer
+
+CHUNK_TOKENS = int(os.getenv("CHUNK_TOKENS", 192))
+CHUNK_OVERLAP_SENTENCES = int(os.getenv("CHUNK_OVERLAP_SENTENCES", 1))
+
+# close a chunk at a paragraph break once it is this full
+PARAGRAPH_BREAK_RATIO = 0.75
+
+_PARAGRAPH = re.compile(r"(?:[^\n]|\n(?![ \t]*\n))+")
+_SENTENCE = re.compile(r"\S.*?(?:[.!?][\"')\]]*(?=\s)|$)", re.S)
+
+
+# -----------------------------
+# TOKEN COUNTS
+# -----------------------------
+def count_tokens(texts):
+    try:
+        tok = tokenizer()
+    except Exception:
+        tok = None
+
+    if tok is None:
+        # ~1.3 wordpieces per English word
+        return [max(1, round(len(t.split()) * 1.3)) for t in texts]
+
+    ids = tok(list(texts), add_special_tokens=False)["input_ids"]
+    return [len(i) for i in ids]
+
+
+# -----------------------------
+# SECTIONS WITH PAGE OFFSETS
+# -----------------------------
+def build_sections(documents):
+    """Concatenate consecutive Documents that share a heading.
+
+    Pages are joined with a single newline so paragraphs and sentences can
+    run across page breaks; `starts`/`pages` map character offsets back to
+    the page they came from.
+    """
+    sections = []
+
+    for doc in documents:
+        text = doc.page_content.strip()
+        if not text:
+            continue
+
+        heading = doc.metadata.get("heading")
+        if not sections or sections[-1]["heading"] != heading:
+            sections.append({"heading": heading, "text": "", "starts": [], "pages": []})
+
+        section = sections[-1]
+        if section["text"]:
+            section["text"] += "\n"
+        section["starts"].append(len(section["text"]))
+        section["pages"].append(doc.metadata.get("page", 1))
+        section["text"] += text
+
+    return sections
+
+
+def page_at(section, offset):
+    return section["pages"][bisect_right(section["starts"], offset) - 1]
+
+
+# -----------------------------
+# SENTENCE UNITS
+# -----------------------------
+def sentence_units(section, max_tokens):
+    units = []
+
+    for para in _PARAGRAPH.finditer(section["text"]):
+        first = True
+        for sent in _SENTENCE.finditer(para.group()):
+            start = para.start() + sent.start()
+            end = para.start() + sent.end()
+            units.append({"start": start, "end": end, "para_start": first})
+            first = False
+
+    tokens = count_tokens(section["text"][u["start"]:u["end"]] for u in units)
+    for unit, n in zip(units, tokens):
+        unit["tokens"] = n
+
+    return split_long_units(section["text"], units, max_tokens)
+
+
+def split_long_units(text, units, max_tokens):
+    # a single sentence longer than the budget is cut on word boundaries
+    result = []
+
+    for unit in units:
+        if unit["tokens"] <= max_tokens:
+            result.append(unit)
+            continue
+
+        words = list(re.finditer(r"\S+", text[unit["start"]:unit["end"]]))
+        pieces = -(-unit["tokens"] // max_tokens)
+        size = -(-len(words) // pieces)
+
+        for i in range(0, len(words), size):
+            group = words[i:i + size]
+            result.append({
+                "start": unit["start"] + group[0].start(),
+                "end": unit["start"] + group[-1].end(),
+                "para_start": unit["para_start"] and i == 0,
+                "tokens": -(-unit["tokens"] * len(group) // len(words)),
+            })
+
+    return result
+
+
+# -----------------------------
+# PACKING
+# -----------------------------
+def pack_section(section, max_tokens, overlap):
+    chunks = []
+    current, size, fresh = [], 0, 0
+
+    def emit():
+        first, last = current[0], current[-1]
+        chunks.append(Document(
+            page_content=section["text"][first["start"]:last["end"]],
+            metadata={
+                "page": page_at(section, first["start"]),
+                "page_end": page_at(section, last["end"] - 1),
+                "heading": section["heading"],
+                "tokens": size,
+            }
+        ))
+
+    for unit in sentence_units(section, max_tokens):
+        full = size + unit["tokens"] > max_tokens
+        soft = unit["para_start"] and size >= max_tokens * PARAGRAPH_BREAK_RATIO
+
+        if current and fresh and (full or soft):
+            emit()
+            # carry the last sentences forward, never more than half a chunk
+            # and never so much that the next sentence no longer fits
+            tail = current[-overlap:] if overlap else []
+            while tail and (
+                sum(u["tokens"] for u in tail) > max_tokens // 2
+                or sum(u["tokens"] for u in tail) + unit["tokens"] > max_tokens
+            ):
+                tail = tail[1:]
+            current, size, fresh = list(tail), sum(u["tokens"] for u in tail), 0
+
+        current.append(unit)
+        size += unit["tokens"]
+        fresh += 1
+
+    if current and fresh:
+        emit()
+
+    return chunks
+
+
+def chunk_documents(documents, max_tokens=None, overlap=None):
+    """Split a document's pages or sections into token-bounded chunks.
+
+    Chunks break at heading changes, prefer paragraph breaks, and never
+    cut a sentence unless it alone exceeds `max_tokens`. `overlap` is the
+    number of trailing sentences repeated at the start of the next chunk.
+    Each chunk records the page range it covers.
+    """
+    max_tokens = max_tokens or CHUNK_TOKENS
+    overlap = CHUNK_OVERLAP_SENTENCES if overlap is None else overlap
+
+    chunks = []
+    for section in build_sections(documents):
+        chunks.extend(pack_section(section, max_tokens, overlap))
+
+    return chunks
@@ -0,0 +1,203 @@
+import heapq
+import itertools
+import logging
+import os
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from backend.supabase_client import supabase
+from backend.metrics import stage, INGESTED_ITEMS
+from backend.retriever import invalidate_retrievals
+from backend.dedup import index as near_dup_index
+from backend.state import add_tombstones, bump_catalog, discard_tombstone, get_tombstones
+
+log = logging.getLogger(__name__)
+
+BUCKET_NAME = "documents"
+CLEANUP_BATCH = int(os.getenv("CLEANUP_BATCH", 500))   # chunk rows looked up per pass
+TOMBSTONE_BATCH = 100   # ids per update or delete, keeps the PostgREST URL short
+CLEANUP_MAX_RETRIES = 6
+BACKOFF_BASE = 2.0
+BACKOFF_MAX = 300.0
+
+_jobs = []      # heap of (not_before, seq, doc_id, storage_path, attempt)
+_jobs_ready = threading.Condition()
+_seq = itertools.count()
+_cleaned = set()    # finished ids, so late ingestion writes are still caught
+_lock = threading.Lock()
+_worker = None
+
+
+# -----------------------------
+# TOMBSTONES
+# -----------------------------
+def tombstone(doc_ids):
+    """Mark documents deleted and queue their cleanup.
+
+    Listings and retrieval skip tombstoned documents straight away; chunk
+    rows, the storage object and the document row are removed in the
+    background. Returns the rows that were found.
+    """
+    doc_ids = list(dict.fromkeys(doc_ids))
+    if not doc_ids:
+        return []
+
+    found = []
+    deleted_at = datetime.now(timezone.utc).isoformat()
+    for i in range(0, len(doc_ids), TOMBSTONE_BATCH):
+        res = (
+            supabase.table("documents")
+            .update({"status": "deleted", "deleted_at": deleted_at})
+            .in_("id", doc_ids[i:i + TOMBSTONE_BATCH])
+            .execute()
+        )
+        found.extend(res.data or [])
+
+    add_tombstones(row["id"] for row in found)
+    if found:
+        invalidate_retrievals()
+    for row in found:
+        near_dup_index.forget(row["id"])
+        bump_catalog("deleted", row["id"])
+        enqueue(row["id"], row.get("storage_path"))
+
+    return found
+
+
+def is_tombstoned(doc_id):
+    with _lock:
+        if doc_id in _cleaned:
+            return True
+    return doc_id in get_tombstones()
+
+
+# -----------------------------
+# BACKGROUND WORKER
+# -----------------------------
+def enqueue(doc_id, storage_path=None, attempt=0, not_before=0.0):
+    start_worker()
+    push_job(not_before, doc_id, storage_path, attempt)
+
+
+def push_job(not_before, doc_id, storage_path, attempt):
+    with _jobs_ready:
+        heapq.heappush(_jobs, (not_before, next(_seq), doc_id, storage_path, attempt))
+        _jobs_ready.notify()
+
+
+def next_job():
+    """Pop the earliest job once it is due. Sleeps until the earliest
+    deadline; a newly queued job wakes the wait, so backed-off retries
+    never hold up due work."""
+    with _jobs_ready:
+        while True:
+            if not _jobs:
+                _jobs_ready.wait()
+                continue
+            wait = _jobs[0][0] - time.monotonic()
+            if wait <= 0:
+                _, _, doc_id, storage_path, attempt = heapq.heappop(_jobs)
+                return doc_id, storage_path, attempt
+            _jobs_ready.wait(wait)
+
+
+def delete_chunks(doc_id):
+    # bounded deletes keep each statement well inside the request timeout
+    deleted = 0
+    while True:
+        with stage("cleanup", "chunks"):
+            rows = (
+                supabase.table("chunks")
+                .select("id")
+                .eq("source", doc_id)
+                .limit(CLEANUP_BATCH)
+                .execute()
+            ).data or []
+            if not rows:
+                return deleted
+            ids = [r["id"] for r in rows]
+            for i in range(0, len(ids), TOMBSTONE_BATCH):
+                supabase.table("chunks") \
+                    .delete() \
+                    .in_("id", ids[i:i + TOMBSTONE_BATCH]) \
+                    .execute()
+        deleted += len(rows)
+
+
+def remove_object(doc_id, storage_path):
+    if not storage_path:
+        return
+    # a re-upload of the same file may already own this object again
+    live = (
+        supabase.table("documents")
+        .select("id")
+        .eq("storage_path", storage_path)
+        .neq("status", "deleted")
+        .execute()
+    ).data
+    if live:
+        log.info("keeping %s, re-uploaded as %s", storage_path, live[0]["id"])
+        return
+    with stage("cleanup", "storage"):
+        supabase.storage.from_(BUCKET_NAME).remove([storage_path])
+
+
+def clean(doc_id, storage_path):
+    chunks = delete_chunks(doc_id)
+    remove_object(doc_id, storage_path)
+    supabase.table("documents") \
+        .delete() \
+        .eq("id", doc_id) \
+        .eq("status", "deleted") \
+        .execute()
+    INGESTED_ITEMS.labels("deleted_chunks").inc(chunks)
+    log.info("cleaned up %s: %d chunks", doc_id, chunks)
+
+
+def run_worker():
+    while True:
+        doc_id, storage_path, attempt = next_job()
+
+        try:
+            clean(doc_id, storage_path)
+            with _lock:
+                _cleaned.add(doc_id)
+            discard_tombstone(doc_id)
+        except Exception as e:
+            if attempt >= CLEANUP_MAX_RETRIES:
+                # the tombstone stays; resume() picks it up on next start
+                log.error("cleanup of %s abandoned after %d attempts: %s", doc_id, attempt + 1, e)
+                continue
+            delay = random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+            log.warning("cleanup of %s failed (%s), retrying in %.0fs", doc_id, e, delay)
+            push_job(time.monotonic() + delay, doc_id, storage_path, attempt + 1)
+
+
+def start_worker():
+    global _worker
+    with _lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = threading.Thread(target=run_worker, name="cleanup", daemon=True)
+            _worker.start()
+
+
+def resume():
+    """Queue cleanup for tombstones left by a previous process."""
+    try:
+        rows = (
+            supabase.table("documents")
+            .select("id, storage_path")
+            .eq("status", "deleted")
+            .execute()
+        ).data or []
+    except Exception as e:
+        log.error("could not resume cleanup: %s", e)
+        return 0
+
+    add_tombstones(row["id"] for row in rows)
+    for row in rows:
+        enqueue(row["id"], row.get("storage_path"))
+    if rows:
+        log.info("resuming cleanup of %d deleted documents", len(rows))
+    return len(rows)
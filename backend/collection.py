@@ -0,0 +1,118 @@
+"""Named collections: per-team document spaces.
+
+Each collection has its own chunk partition and ANN index
+(docs/migrations/006_collections.sql), so a search only covers the
+collection it names. Existing documents live in DEFAULT_COLLECTION.
+"""
+import logging
+import os
+import re
+import threading
+import time
+from backend.supabase_client import supabase
+
+log = logging.getLogger(__name__)
+
+DEFAULT_COLLECTION = "default"
+COLLECTION_TTL = float(os.getenv("COLLECTION_TTL", 30))   # seconds a lookup is cached
+NAME = re.compile(r"^[a-z0-9_]{1,48}$")
+
+DEFAULT = {"name": DEFAULT_COLLECTION, "max_documents": None}
+
+_cache = {"rows": None, "checked": 0.0}
+_cache_lock = threading.Lock()
+
+
+# -----------------------------
+# LOOKUP
+# -----------------------------
+def _collections(refresh=False):
+    with _cache_lock:
+        fresh = time.monotonic() - _cache["checked"] < COLLECTION_TTL
+        if _cache["rows"] is not None and fresh and not refresh:
+            return _cache["rows"]
+
+    try:
+        rows = supabase.table("collections").select("name, max_documents").execute().data or []
+        rows = {r["name"]: r for r in rows}
+    except Exception as e:
+        # before migration 006, or the DB is briefly unreachable
+        log.warning("could not read collections: %s", e)
+        rows = _cache["rows"] or {DEFAULT_COLLECTION: DEFAULT}
+
+    rows.setdefault(DEFAULT_COLLECTION, DEFAULT)
+    with _cache_lock:
+        _cache["rows"] = rows
+        _cache["checked"] = time.monotonic()
+    return rows
+
+
+def get_collection(name=None):
+    """{name, max_documents} for `name` (default when empty), or None."""
+    name = name or DEFAULT_COLLECTION
+    collection = _collections().get(name)
+    if collection is None:
+        # may have just been created by another worker
+        collection = _collections(refresh=True).get(name)
+    return collection
+
+
+def storage_path(collection, filename):
+    # default keeps the flat "{sha256}_{filename}" layout of existing objects
+    if collection == DEFAULT_COLLECTION:
+        return filename
+    return f"{collection}/{filename}"
+
+
+# -----------------------------
+# LIMITS
+# -----------------------------
+def document_count(name):
+    return (
+        supabase.table("documents")
+        .select("id", count="exact")
+        .eq("collection", name)
+        .neq("status", "deleted")
+        .limit(1)
+        .execute()
+    ).count or 0
+
+
+def remaining(name):
+    """Documents the collection can still take, or None when unlimited.
+
+    The same limit is enforced by a trigger on insert, which covers
+    concurrent uploads this check cannot see.
+    """
+    collection = get_collection(name)
+    if not collection or not collection.get("max_documents"):
+        return None
+    return max(0, collection["max_documents"] - document_count(name))
+
+
+# -----------------------------
+# MANAGEMENT
+# -----------------------------
+def create_collection(name, max_documents=None):
+    """Create a collection (partition + index), or change its limit."""
+    if not NAME.match(name or ""):
+        raise ValueError("collection names are 1-48 characters of a-z, 0-9 and _")
+    if max_documents is not None and max_documents < 1:
+        raise ValueError("max_documents must be at least 1")
+
+    supabase.rpc("create_collection", {
+        "collection_name": name,
+        "max_docs": max_documents,
+    }).execute()
+
+    with _cache_lock:
+        _cache["rows"] = None
+    log.info("collection %s ready (max_documents=%s)", name, max_documents)
+    return {"name": name, "max_documents": max_documents}
+
+
+def list_collections():
+    return [
+        {**c, "documents": document_count(c["name"])}
+        for c in sorted(_collections().values(), key=lambda c: c["name"])
+    ]
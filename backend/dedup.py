@@ -0,0 +1,207 @@
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+from collections import defaultdict
+from backend.supabase_client import supabase
+from backend.metrics import INGESTED_ITEMS
+from backend.collection import DEFAULT_COLLECTION
+from backend.utils import iter_documents
+
+log = logging.getLogger(__name__)
+
+# skip: don't embed near-duplicates; flag: embed but record the match; off
+NEAR_DUP_ACTION = os.getenv("NEAR_DUP_ACTION", "skip")
+NEAR_DUP_THRESHOLD = float(os.getenv("NEAR_DUP_THRESHOLD", 0.9))
+NEAR_DUP_RELOAD = float(os.getenv("NEAR_DUP_RELOAD", 300))   # seconds; picks up other workers' documents
+SHINGLE_WORDS = 5
+NUM_BINS = 128
+BANDS = 16               # 16 bands x 8 rows: candidates from J~0.7, near-certain above 0.85
+ROWS = NUM_BINS // BANDS
+MIN_SHINGLES = 20        # shorter texts are too small to fingerprint reliably
+
+WORD = re.compile(r"[a-z0-9]+")
+
+
+# -----------------------------
+# SIGNATURES
+# -----------------------------
+def shingles(text):
+    words = WORD.findall(text.lower())
+    return {
+        " ".join(words[i:i + SHINGLE_WORDS])
+        for i in range(max(0, len(words) - SHINGLE_WORDS + 1))
+    }
+
+
+def signature(text):
+    """One-permutation MinHash with rotation densification.
+
+    Each shingle is hashed once and kept as the minimum of its bin, so a
+    document costs one hash per shingle rather than one per permutation.
+    Returns NUM_BINS integers, or None for texts too short to compare.
+    """
+    grams = shingles(text)
+    if len(grams) < MIN_SHINGLES:
+        return None
+
+    bins = [None] * NUM_BINS
+    for gram in grams:
+        # 56-bit hashes keep every stored value inside a Postgres bigint
+        h = int.from_bytes(hashlib.blake2b(gram.encode(), digest_size=7).digest(), "big")
+        i, value = h % NUM_BINS, h // NUM_BINS
+        if bins[i] is None or value < bins[i]:
+            bins[i] = value
+
+    # empty bins borrow the next filled bin's value (offset by distance)
+    filled = [i for i, v in enumerate(bins) if v is not None]
+    for i in range(NUM_BINS):
+        if bins[i] is None:
+            j = next((f for f in filled if f > i), filled[0])
+            bins[i] = bins[j] + ((j - i) % NUM_BINS) * (1 << 50)
+    return bins
+
+
+def similarity(a, b):
+    return sum(x == y for x, y in zip(a, b)) / NUM_BINS
+
+
+def document_text(documents):
+    return "\n".join(d.page_content for d in documents)
+
+
+# -----------------------------
+# LSH INDEX
+# -----------------------------
+class LSHIndex:
+    """Banded LSH over stored signatures of completed documents, loaded
+    from `documents.minhash` and reloaded every NEAR_DUP_RELOAD seconds.
+    Documents only match within their own collection.
+
+    A document is indexed as soon as it is checked, so two copies in the
+    same upload find each other, but stays pending until its chunks are
+    written: `confirm` keeps it, `forget` drops it when ingestion fails.
+    """
+
+    def __init__(self):
+        self.buckets = defaultdict(set)
+        self.signatures = {}
+        self.collections = {}
+        self.pending = set()
+        self.loaded_at = None
+        self.lock = threading.Lock()
+
+    def _bands(self, sig):
+        for b in range(BANDS):
+            yield b, hash(tuple(sig[b * ROWS:(b + 1) * ROWS]))
+
+    def _add(self, doc_id, sig, collection):
+        self.signatures[doc_id] = sig
+        self.collections[doc_id] = collection
+        for key in self._bands(sig):
+            self.buckets[key].add(doc_id)
+
+    def _load(self):
+        pending = {
+            doc_id: (self.signatures[doc_id], self.collections[doc_id])
+            for doc_id in self.pending if doc_id in self.signatures
+        }
+        self.buckets, self.signatures, self.collections = defaultdict(set), {}, {}
+
+        for row in iter_documents("id, minhash, status, collection", live=True):
+            # only fully indexed documents: skipped duplicates and failed
+            # ingests have no (or not all) chunks to stand in for a copy
+            if row.get("minhash") and row.get("status") == "completed":
+                self._add(
+                    row["id"],
+                    [int(v) for v in row["minhash"]],
+                    row.get("collection") or DEFAULT_COLLECTION,
+                )
+        # still being ingested by this process
+        for doc_id, (sig, collection) in pending.items():
+            self._add(doc_id, sig, collection)
+
+        self.loaded_at = time.monotonic()
+        log.info("near-duplicate index loaded with %d documents", len(self.signatures))
+
+    def match_and_add(self, doc_id, sig, collection=DEFAULT_COLLECTION):
+        """Best (doc_id, similarity) at or above the threshold, then index
+        `doc_id` unless it is about to be skipped. Checking and adding under
+        one lock means two copies in the same upload still find each other."""
+        with self.lock:
+            if self.loaded_at is None or time.monotonic() - self.loaded_at > NEAR_DUP_RELOAD:
+                self._load()
+
+            candidates = set()
+            for key in self._bands(sig):
+                candidates |= self.buckets.get(key, set())
+            candidates.discard(doc_id)
+
+            best = None
+            for other in candidates:
+                if self.collections.get(other) != collection:
+                    continue
+                score = similarity(sig, self.signatures[other])
+                if score >= NEAR_DUP_THRESHOLD and (best is None or score > best[1]):
+                    best = (other, score)
+
+            if best is None or NEAR_DUP_ACTION != "skip":
+                self._add(doc_id, sig, collection)
+                self.pending.add(doc_id)
+            return best
+
+    def confirm(self, doc_id):
+        with self.lock:
+            self.pending.discard(doc_id)
+
+    def forget(self, doc_id):
+        with self.lock:
+            self.pending.discard(doc_id)
+            sig = self.signatures.pop(doc_id, None)
+            self.collections.pop(doc_id, None)
+            if sig:
+                for key in self._bands(sig):
+                    self.buckets[key].discard(doc_id)
+
+
+index = LSHIndex()
+
+
+# -----------------------------
+# INGESTION HOOK
+# -----------------------------
+def check_document(doc_id, documents, collection=DEFAULT_COLLECTION):
+    """Fingerprint a parsed document and look for a near-duplicate in the
+    same collection.
+
+    Stores the signature (and any match) on the document row. Returns
+    (duplicate_of, similarity), or None when the document is new or
+    detection is off.
+    """
+    if NEAR_DUP_ACTION == "off":
+        return None
+
+    sig = signature(document_text(documents))
+    if sig is None:
+        return None
+
+    try:
+        match = index.match_and_add(doc_id, sig, collection)
+    except Exception as e:
+        log.error("near-duplicate lookup failed for %s: %s", doc_id, e)
+        return None
+
+    update = {"minhash": sig}
+    if match:
+        update.update({"near_duplicate_of": match[0], "similarity": round(match[1], 3)})
+        INGESTED_ITEMS.labels("near_duplicate_files").inc()
+        log.info("%s is a near-duplicate of %s (%.2f)", doc_id, match[0], match[1])
+
+    try:
+        supabase.table("documents").update(update).eq("id", doc_id).execute()
+    except Exception as e:
+        log.error("fingerprint update failed for %s: %s", doc_id, e)
+
+    return match
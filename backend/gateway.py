@@ -0,0 +1,212 @@
+import hashlib
+import logging
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from backend.models import llm
+from backend.metrics import LLM_EVENTS, observe, record_tokens
+
+log = logging.getLogger(__name__)
+
+# Defaults match Groq's free tier for llama-3.1-8b-instant.
+LLM_RPM = float(os.getenv("LLM_RPM", 30))
+LLM_TPM = float(os.getenv("LLM_TPM", 6000))
+LLM_MAX_OUTPUT_TOKENS = 512          # reserved per call, refunded after
+LLM_CACHE_SIZE = int(os.getenv("LLM_CACHE_SIZE", 512))
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", 3600))
+LLM_MAX_RETRIES = 4
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 20.0
+
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+
+# -----------------------------
+# TOKEN BUCKET
+# -----------------------------
+class TokenBucket:
+    """Refills `per_minute` units per minute up to one minute's worth.
+
+    `reserve` may drive the balance negative: the caller is told how long
+    to wait for its share, so waiters are served in arrival order.
+    """
+
+    def __init__(self, per_minute):
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        self.tokens = per_minute
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, amount):
+        with self.lock:
+            self._refill()
+            self.tokens -= amount
+            return max(0.0, -self.tokens / self.rate)
+
+    def refund(self, amount):
+        with self.lock:
+            self._refill()
+            self.tokens = min(self.capacity, self.tokens + amount)
+
+
+requests_bucket = TokenBucket(LLM_RPM)
+tokens_bucket = TokenBucket(LLM_TPM)
+
+
+# -----------------------------
+# COMPLETION CACHE
+# -----------------------------
+class TTLCache:
+
+    def __init__(self, size, ttl):
+        self.size = size
+        self.ttl = ttl
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            item = self.items.get(key)
+            if item is None:
+                return None
+            expires, value = item
+            if expires < time.monotonic():
+                del self.items[key]
+                return None
+            self.items.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self.lock:
+            self.items[key] = (time.monotonic() + self.ttl, value)
+            self.items.move_to_end(key)
+            while len(self.items) > self.size:
+                self.items.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.items.clear()
+
+
+cache = TTLCache(LLM_CACHE_SIZE, LLM_CACHE_TTL)
+
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+
+# -----------------------------
+# PROVIDER CALL
+# -----------------------------
+def estimate_tokens(prompt):
+    # ~4 characters per token for English prompts
+    return len(prompt) // 4 + LLM_MAX_OUTPUT_TOKENS
+
+
+def actual_tokens(response):
+    usage = getattr(response, "usage_metadata", None) or {}
+    return usage.get("total_tokens") or (
+        usage.get("input_tokens", 0) + usage.get("output_tokens", 0)
+    )
+
+
+def retry_delay(error, attempt):
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    retry_after = headers.get("retry-after")
+    if retry_after:
+        try:
+            return min(BACKOFF_MAX, float(retry_after))
+        except ValueError:
+            pass
+    # full jitter
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+
+def is_retryable(error):
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    if status is None:
+        # connection resets, timeouts
+        return isinstance(error, (ConnectionError, TimeoutError)) or "timeout" in str(error).lower()
+    return status in RETRYABLE_STATUS
+
+
+def generate(prompt, call):
+    for attempt in range(LLM_MAX_RETRIES + 1):
+        reserved = estimate_tokens(prompt)
+        wait = max(requests_bucket.reserve(1), tokens_bucket.reserve(reserved))
+        if wait:
+            time.sleep(wait)
+        observe("llm", "queue_wait", wait)
+
+        start = time.perf_counter()
+        try:
+            response = llm().invoke(prompt)
+        except Exception as e:
+            observe("llm", "generate", time.perf_counter() - start)
+            if attempt == LLM_MAX_RETRIES or not is_retryable(e):
+                raise
+            delay = retry_delay(e, attempt)
+            LLM_EVENTS.labels("retry").inc()
+            log.warning("%s llm call failed (%s), retrying in %.1fs", call, e, delay)
+            time.sleep(delay)
+            continue
+
+        observe("llm", "generate", time.perf_counter() - start)
+        used = actual_tokens(response)
+        if used:
+            tokens_bucket.refund(max(0, reserved - used))
+        record_tokens(call, response)
+        return response
+
+
+# -----------------------------
+# GATEWAY
+# -----------------------------
+def complete(prompt, call="llm"):
+    """Run a prompt through the shared LLM with caching and coalescing.
+
+    Identical prompts are answered from a TTL/LRU cache; identical prompts
+    already in flight wait for the first caller's result instead of
+    generating twice. Everything else is rate limited by requests and
+    tokens per minute and retried with jittered backoff.
+    """
+    key = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+
+    cached = cache.get(key)
+    if cached is not None:
+        LLM_EVENTS.labels("cache_hit").inc()
+        return cached
+
+    with _inflight_lock:
+        future = _inflight.get(key)
+        leader = future is None
+        if leader:
+            future = _inflight[key] = Future()
+
+    if not leader:
+        LLM_EVENTS.labels("coalesced").inc()
+        return future.result()
+
+    LLM_EVENTS.labels("miss").inc()
+    try:
+        response = generate(prompt, call)
+        cache.put(key, response)
+        future.set_result(response)
+        return response
+    except BaseException as e:
+        future.set_exception(e)
+        raise
+    finally:
+        with _inflight_lock:
+            _inflight.pop(key, None)
@@ -1,69 +1,81 @@
+import contextvars
+import logging
 import os
 import tempfile
+import uuid
 from concurrent.futures import ThreadPoolExecutor
-from pdf2image import convert_from_path
-import pytesseract
-from backend.state import set_ingestion_status
-from backend.state import get_ingestion_status
-from backend.utils import file_hash
+from backend.state import set_ingestion_status, update_ingestion_progress
+from backend.state import get_ingestion_status, bump_catalog
+from backend.utils import file_hash, set_document_status
+from backend.writer import write_chunks
+from backend.parsers import parse_files
+from backend.chunker import chunk_documents
+from backend.metrics import stage, observe, INGESTED_ITEMS
 from backend.models import embeddings
 from backend.supabase_client import supabase
-from langchain_core.documents import Document
-from langchain_community.document_loaders import (
-    PyPDFLoader,
-    TextLoader,
-    UnstructuredMarkdownLoader
-)
-from langchain_text_splitters import RecursiveCharacterTextSplitter
+from backend.retriever import invalidate_retrievals
+from backend.cleanup import enqueue as enqueue_cleanup, is_tombstoned
+from backend.dedup import NEAR_DUP_ACTION, check_document, index as near_dup_index
+from backend.reindex import LEGACY_VERSION, active_version, embedding_rows
+from backend.admission import embedding_gate
+from backend.profiling import profile_thread
+from backend.collection import DEFAULT_COLLECTION
 
 BUCKET_NAME = "documents"
-INSERT_BATCH = 1000
-model = embeddings()
+SPOOL_MAX_MEMORY = 8 * 1024 * 1024  # larger uploads are spooled to disk
+log = logging.getLogger(__name__)
 
 
 # =====================================================
-# SMART PDF LOADER
+# UPLOAD SPOOL
 # =====================================================
-def load_pdf_smart(path, min_text_length=100):
-    loader = PyPDFLoader(path)
-    normal_docs = loader.load()
-    normal_text = "\n".join(
-        d.page_content.strip() for d in normal_docs
-    ).strip()
+def spool_file(file_bytes, suffix=""):
+    """Hand off uploaded bytes to ingestion without a storage round trip.
 
-    if len(normal_text) >= min_text_length:
-        return normal_docs
+    Small files stay in memory; large ones are written once to a temp
+    file so the background job does not pin them in RAM.
+    """
+    if len(file_bytes) <= SPOOL_MAX_MEMORY:
+        return file_bytes
 
-    images = convert_from_path(path)
+    with tempfile.NamedTemporaryFile(
+        delete=False, prefix="intyrasense_", suffix=suffix
+    ) as tmp:
+        tmp.write(file_bytes)
+        return tmp.name
 
-    docs = []
 
-    for i, img in enumerate(images):
-        text = pytesseract.image_to_string(img).strip()
-
-        if text:
-            docs.append(
-                Document(
-                    page_content=text,
-                    metadata={"page": i + 1}
-                )
-            )
-    return docs
+def release_spool(source):
+    if isinstance(source, str) and os.path.exists(source):
+        os.remove(source)
 
 
 # =====================================================
-# LOAD DOCUMENTS
+# PREPARE FILES
 # =====================================================
-def load_documents(uploaded_files):
-
-    docs = []
+def prepare_files(uploaded_files, spool=None, collection=DEFAULT_COLLECTION):
+    """Resolve, dedupe and register uploaded files in `collection`.
+
+    `spool` maps storage names to bytes or local paths handed off by the
+    upload handler. Files missing from it (resumed or remote jobs) are
+    downloaded from storage. Returns (doc_id, source, ext) parse tasks.
+    """
+    spool = spool or {}
+    tasks = []
     for filename in uploaded_files:
 
+        source = spool.pop(filename, None)
+        # collections other than the default store under "{collection}/"
+        basename = filename.rsplit("/", 1)[-1]
         try:
-            print(f"Downloading {filename}...")
-
-            file_bytes = supabase.storage.from_(BUCKET_NAME).download(filename)
-            hash_value = file_hash(file_bytes)
+            if source is None:
+                log.info("downloading %s", filename)
+                with stage("ingest", "download"):
+                    source = supabase.storage.from_(BUCKET_NAME).download(filename)
+                hash_value = file_hash(source)
+            else:
+                # upload already named the object "{sha256}_{name}"
+                hash_value = basename.split("_", 1)[0]
 
             # -----------------------------
             # DUPLICATE CHECK
@@ -72,23 +84,32 @@ def load_documents(uploaded_files):
                 supabase.table("documents")
                 .select("id")
                 .eq("file_hash", hash_value)
+                .eq("collection", collection)
+                .neq("status", "deleted")
                 .execute()
             )
 
             if res.data:
-                print(f"Skipping duplicate: {filename}")
+                log.info("skipping duplicate: %s", filename)
+                release_spool(source)
                 continue
 
             # -----------------------------
             # VALIDATE NAME
             # -----------------------------
-            if "_" not in filename:
-                print(f"Invalid filename: {filename}")
+            if "_" not in basename:
+                log.warning("invalid filename: %s", filename)
+                release_spool(source)
                 continue
 
-            clean_name = filename.split("_", 1)[1]
+            clean_name = basename.split("_", 1)[1]
             ext = clean_name.split(".")[-1].lower()
 
+            if ext not in ("pdf", "md", "txt"):
+                log.warning("unsupported: %s", ext)
+                release_spool(source)
+                continue
+
             # -----------------------------
             # INSERT DOCUMENT RECORD
             # -----------------------------
@@ -96,64 +117,92 @@ def load_documents(uploaded_files):
                 "storage_path": filename,
                 "type": ext,
                 "file_hash": hash_value,
-                "name": clean_name
+                "name": clean_name,
+                "status": "processing",
+                "collection": collection,
             }).execute()
 
-            doc_id = res.data[0]["id"]
+            tasks.append((res.data[0]["id"], source, ext))
+            bump_catalog("added", res.data[0]["id"], name=clean_name, status="processing")
 
-            # -----------------------------
-            # TEMP FILE
-            # -----------------------------
-            with tempfile.NamedTemporaryFile(delete=False, suffix=f".{ext}") as tmp:
-                tmp.write(file_bytes)
-                path = tmp.name
-
-            try:
-                if ext == "pdf":
-                    loaded = load_pdf_smart(path)
-
-                elif ext == "md":
-                    loaded = UnstructuredMarkdownLoader(path).load()
-
-                elif ext == "txt":
-                    loaded = TextLoader(path).load()
-
-                else:
-                    print(f"Unsupported: {ext}")
-                    continue
+        except Exception as e:
+            log.error("error processing %s: %s", filename, e)
+            release_spool(source)
 
-                # attach metadata
-                for d in loaded:
-                    d.metadata["source"] = doc_id
-                    d.metadata["page"] = d.metadata.get("page", 1)
+    # drop anything the caller spooled but did not list
+    for source in spool.values():
+        release_spool(source)
 
-                docs.extend(loaded)
+    return tasks
 
-            finally:
-                os.remove(path)
 
-        except Exception as e:
-            print(f"Error processing {filename}:", e)
-    print(f"Loaded {len(docs)} documents.")
-    return docs
+# =====================================================
+# LOAD DOCUMENTS
+# =====================================================
+def load_documents(uploaded_files, spool=None, collection=DEFAULT_COLLECTION):
+    """Yield (doc_id, documents) per file as the parser pool finishes it;
+    documents is None for a file that failed to parse (already marked)."""
+    tasks = prepare_files(uploaded_files, spool, collection)
+    sources = {doc_id: source for doc_id, source, _ in tasks}
+    update_ingestion_progress(
+        phase="parsing",
+        files_total=len(tasks),
+        skipped=len(uploaded_files) - len(tasks),
+    )
+
+    for doc_id, loaded, error, timings in parse_files(tasks):
+        release_spool(sources.pop(doc_id, None))
+
+        for name, seconds in timings.items():
+            observe("ingest", name, seconds)
+
+        if error:
+            log.error("error parsing %s: %s", doc_id, error)
+            set_document_status(doc_id, "failed")
+            file_done()
+            yield doc_id, None
+            continue
+
+        if not loaded:
+            set_document_status(doc_id, "completed")
+            file_done()
+            continue
+
+        # attach metadata
+        for d in loaded:
+            d.metadata["source"] = doc_id
+            d.metadata["page"] = d.metadata.get("page", 1)
+
+        yield doc_id, loaded
+
+def file_done(chunks=0):
+    status = get_ingestion_status()
+    update_ingestion_progress(
+        files_done=status.get("files_done", 0) + 1,
+        chunks_written=status.get("chunks_written", 0) + chunks,
+    )
 
 # =====================================================
 # PARALLEL EMBEDDINGS
 # =====================================================
-def embed_parallel(texts, batch_size=64, workers=4):
+def embed_parallel(texts, batch_size=64, workers=4, model_name=None):
 
     batches = [
         texts[i:i + batch_size]
         for i in range(0, len(texts), batch_size)
     ]
 
+    model = embeddings(model_name)
+
     def process(batch):
-        return model.embed_documents(batch)
+        with embedding_gate.background(), profile_thread():
+            return model.embed_documents(batch)
 
     vectors = []
+    ctx = contextvars.copy_context()
 
     with ThreadPoolExecutor(max_workers=workers) as executor:
-        results = executor.map(process, batches)
+        results = executor.map(lambda b: ctx.copy().run(process, b), batches)
 
         for r in results:
             vectors.extend(r)
@@ -162,72 +211,187 @@ def embed_parallel(texts, batch_size=64, workers=4):
 
 
 # =====================================================
-# INGEST PIPELINE
+# DOCUMENT STATUS
 # =====================================================
-def ingest_documents(uploaded_files):
+def finalize_documents(doc_ids, expected, failed):
+    """Mark each document completed, partial or failed from its write
+    results. Returns True when every chunk landed."""
+    ok = True
 
-    try:
-        set_ingestion_status("running")
-        documents = load_documents(uploaded_files)
+    for doc_id in doc_ids:
+        lost = failed.get(doc_id, 0)
+
+        if not lost:
+            status = "completed"
+        elif lost >= expected.get(doc_id, 0):
+            status = "failed"
+        else:
+            status = "partial"
+
+        if status != "completed":
+            ok = False
+            log.warning("document %s: %d chunks not written (%s)", doc_id, lost, status)
+
+        set_document_status(doc_id, status)
+
+    return ok
 
-        if not documents:
-            print("No new documents.")
-            set_ingestion_status("completed")
-            return
 
-        splitter = RecursiveCharacterTextSplitter(
-            chunk_size=800,
-            chunk_overlap=250
+# =====================================================
+# INGEST ONE DOCUMENT
+# =====================================================
+def ingest_loaded(doc_id, documents, collection=DEFAULT_COLLECTION):
+    """Chunk, embed and write one parsed document. Returns True when every
+    chunk landed."""
+    update_ingestion_progress(phase="chunking", current=doc_id)
+    with stage("ingest", "split"):
+        chunks = chunk_documents(documents)
+    log.info("processing %d chunks for %s", len(chunks), doc_id)
+
+    texts, pages, page_ends = [], [], []
+
+    for chunk in chunks:
+        text = chunk.page_content.strip()
+
+        if len(text) < 20:
+            continue
+
+        texts.append(text)
+        pages.append(chunk.metadata.get("page", 1))
+        page_ends.append(chunk.metadata.get("page_end", pages[-1]))
+
+    if not texts:
+        log.info("no valid chunks for %s", doc_id)
+        file_done()
+        return finalize_documents([doc_id], {}, {})
+
+    # -----------------------------
+    # NEAR-DUPLICATES
+    # -----------------------------
+    with stage("ingest", "fingerprint"):
+        match = check_document(doc_id, documents, collection)
+
+    if match and NEAR_DUP_ACTION == "skip":
+        status = get_ingestion_status()
+        update_ingestion_progress(
+            duplicates=status.get("duplicates", 0) + 1,
+            embeddings_avoided=status.get("embeddings_avoided", 0) + len(texts),
         )
+        INGESTED_ITEMS.labels("embeddings_avoided").inc(len(texts))
+        log.info("skipped %s: %d chunk embeddings avoided", doc_id, len(texts))
+        set_document_status(doc_id, "duplicate")
+        file_done()
+        return True
+
+    # -----------------------------
+    # EMBEDDINGS
+    # -----------------------------
+    update_ingestion_progress(phase="embedding", current=doc_id)
+    version = active_version()
+    with stage("ingest", "embed"):
+        vectors = embed_parallel(texts, model_name=version["model"])
+
+    legacy = version["name"] == LEGACY_VERSION
+    records = [
+        {
+            "id": str(uuid.uuid4()),
+            "source": doc_id,
+            "collection": collection,
+            "page": p,
+            "page_end": e,
+            "text": t,
+            # after a cutover the vector lives in chunk_embeddings instead
+            "embedding": v if legacy else None
+        }
+        for t, v, p, e in zip(texts, vectors, pages, page_ends)
+    ]
+
+    # -----------------------------
+    # BULK INSERT
+    # -----------------------------
+    update_ingestion_progress(phase="writing", current=doc_id)
+    with stage("ingest", "insert"):
+        result = write_chunks(records)
+        if not legacy and result["written"]:
+            # vectors reference their chunk (FK): only for chunks that landed
+            landed = [
+                (r, v) for r, v in zip(records, vectors)
+                if r["id"] not in result["failed_ids"]
+            ]
+            vectors_written = write_chunks(
+                embedding_rows(
+                    version["name"], [r for r, _ in landed], [v for _, v in landed]
+                ),
+                table="chunk_embeddings",
+                on_conflict="chunk_id,version",
+            )
+            # a chunk without its versioned vector can never be retrieved
+            lost = len(vectors_written["failed_ids"])
+            if lost:
+                result["failed"][doc_id] += lost
+                result["written"] -= lost
+    if is_tombstoned(doc_id):
+        # deleted while we were writing: clean up the late chunks too
+        enqueue_cleanup(doc_id)
+    if result["written"]:
+        invalidate_retrievals()
+    INGESTED_ITEMS.labels("chunks").inc(result["written"])
+    INGESTED_ITEMS.labels("files").inc()
+    log.info("ingested %d chunks for %s", result["written"], doc_id)
+    file_done(result["written"])
+
+    ok = finalize_documents(
+        [doc_id],
+        {doc_id: len(records)},
+        result["failed"]
+    )
+    if ok:
+        near_dup_index.confirm(doc_id)
+    else:
+        # not fully searchable: must not get later copies skipped
+        near_dup_index.forget(doc_id)
+    return ok
 
-        chunks = splitter.split_documents(documents)
-        print(f"Processing {len(chunks)} chunks...")
 
-        texts, sources, pages = [], [], []
+# =====================================================
+# INGEST PIPELINE
+# =====================================================
+def ingest_documents(uploaded_files, spool=None, collection=DEFAULT_COLLECTION):
+    with stage("ingest", "total"):
+        run_ingestion(uploaded_files, spool, collection)
 
-        for chunk in chunks:
-            text = chunk.page_content.strip()
 
-            if len(text) < 20:
-                continue
+def run_ingestion(uploaded_files, spool=None, collection=DEFAULT_COLLECTION):
+
+    try:
+        set_ingestion_status(
+            "running", phase="preparing", files_total=len(uploaded_files),
+            files_done=0, chunks_written=0,
+        )
+
+        ok = True
+        ingested = 0
 
-            texts.append(text)
-            sources.append(chunk.metadata["source"])
-            pages.append(chunk.metadata.get("page", 1))
-
-        if not texts:
-            print("No valid chunks.")
-            set_ingestion_status("completed", )
-            return
-
-        # -----------------------------
-        # EMBEDDINGS
-        # -----------------------------
-        vectors = embed_parallel(texts)
-
-        records = [
-            {
-                "source": s,
-                "page": p,
-                "text": t,
-                "embedding": v
-            }
-            for t, v, s, p in zip(texts, vectors, sources, pages)
-        ]
-
-        # -----------------------------
-        # BATCH INSERT
-        # -----------------------------
-        for i in range(0, len(records), INSERT_BATCH):
-            batch = records[i:i + INSERT_BATCH]
+        # parsing continues in the pool while earlier files are embedded
+        for doc_id, documents in load_documents(uploaded_files, spool, collection):
+            if documents is None:
+                ok = False
+                continue
             try:
-                supabase.table("chunks").insert(batch).execute()
+                ok = ingest_loaded(doc_id, documents, collection) and ok
+                ingested += 1
             except Exception as e:
-                print("Insert error:", e)
+                log.error("ingestion failed for %s: %s", doc_id, e)
+                near_dup_index.forget(doc_id)
+                set_document_status(doc_id, "failed")
+                file_done()
+                ok = False
+
+        if not ingested and ok:
+            log.info("no new documents")
 
-        print(f"✓ Ingested {len(records)} chunks")
-        set_ingestion_status("completed")
+        set_ingestion_status("completed" if ok else "failed", phase="done", current=None)
 
     except Exception as e:
-        print("Ingestion failed:", e)
-        set_ingestion_status("failed")
\ No newline at end of file
+        log.error("ingestion failed: %s", e)
+        set_ingestion_status("failed", phase="done", current=None, error=str(e))
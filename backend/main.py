@@ -1,30 +1,61 @@
 import os
+import time
+import pstats
+import asyncio
 import uuid
 import threading
 import warnings
 import logging
-from fastapi.responses import Response
+import contextvars
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
 from backend.utils import file_hash
 from dotenv import load_dotenv
-from fastapi import FastAPI, UploadFile, File, HTTPException
+from fastapi import FastAPI, UploadFile, File, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
-from supabase import create_client
-from backend.ingest import ingest_documents
+from backend.supabase_client import get_supabase, supabase
+from backend.models import warm_up as warm_up_models
+from backend.ingest import ingest_documents, release_spool, spool_file
 from backend.qa import answer_question, summarize_documents
-from backend.utils import list_documents
+from backend.sessions import sessions
+from backend.admission import Overloaded, query_limiter, summarize_limiter
+from backend.profiling import (
+    PROFILING,
+    list_profiles,
+    load_profile,
+    profile_unit,
+    requested_profile,
+    stats_path,
+)
+from backend.cleanup import resume as resume_cleanup, tombstone
+from backend.utils import iter_documents, list_documents
+from backend.collection import (
+    DEFAULT_COLLECTION,
+    create_collection,
+    get_collection,
+    list_collections,
+    remaining,
+    storage_path,
+)
 from backend.state import get_ingestion_status
 from backend.state import set_ingestion_status
+from backend.state import get_readiness, set_readiness
+from backend.state import events, format_event, get_catalog_version
+from backend.metrics import (
+    REQUEST_SECONDS,
+    configure_logging,
+    new_request_id,
+    render,
+)
 
 # ---------------------------------
 # ENV + LOGGING
 # ---------------------------------
 warnings.filterwarnings("ignore")
-logging.basicConfig(level=logging.INFO)
+configure_logging(logging.INFO)
 load_dotenv(override=True)
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_KEY = os.getenv("SUPABASE_KEY")
-supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+log = logging.getLogger(__name__)
 
 # ---------------------------------
 # APP INIT
@@ -37,25 +68,106 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Request-ID", "X-Profile-ID"],
 )
 
 
+# ---------------------------------
+# REQUEST IDS + LATENCY
+# ---------------------------------
+@app.middleware("http")
+async def request_context(request: Request, call_next):
+    rid = new_request_id(request.headers.get("X-Request-ID"))
+    start = time.perf_counter()
+    status = 500
+
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        response.headers["X-Request-ID"] = rid
+        return response
+
+    finally:
+        # label by route template so /documents/{doc_id} stays one series
+        route = request.scope.get("route")
+        REQUEST_SECONDS.labels(
+            request.method,
+            getattr(route, "path", "unmatched"),
+            str(status)
+        ).observe(time.perf_counter() - start)
+
+
+def profiled(request: Request, response: Response):
+    # profile id for an X-Profile request, named back in X-Profile-ID
+    unit = requested_profile(request.headers.get("X-Profile"))
+    if unit:
+        response.headers["X-Profile-ID"] = unit
+    return unit
+
+
+# ---------------------------------
+# LOAD SHEDDING
+# ---------------------------------
+@app.exception_handler(Overloaded)
+async def overloaded(request: Request, exc: Overloaded):
+    return JSONResponse(
+        status_code=429,
+        content={"detail": str(exc), "reason": exc.reason, "retry_after": exc.retry_after},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+
 # ---------------------------------
 # CONFIG
 # ---------------------------------
 BUCKET_NAME = "documents"
 ALLOWED_EXT = {".pdf", ".md", ".txt"}
+WARMUP = os.getenv("WARMUP", "1") != "0"   # preload models in the background
+
+# ---------------------------------
+# WARM-UP
+# ---------------------------------
+def warm_up():
+    try:
+        set_readiness("warming")
+        get_supabase()
+        warm_up_models()
+        set_readiness("ready")
+        log.info("backend ready")
+    except Exception as e:
+        log.error("warm-up failed: %s", e)
+        set_readiness("failed", str(e))
+
+@app.on_event("startup")
+def start_warm_up():
+    # serve liveness immediately; /ready flips once models are loaded
+    if WARMUP:
+        threading.Thread(target=warm_up, daemon=True).start()
+    else:
+        set_readiness("ready")
+    # finish deletes a previous process left half done
+    threading.Thread(target=resume_cleanup, daemon=True).start()
 
 # ---------------------------------
 # REQUEST MODELS
 # ---------------------------------
 class QueryRequest(BaseModel):
     question: str
-    chat_history: list = []
+    session_id: str | None = None
+    chat_history: list = []     # only for clients without a session
     document: str | None = None
+    collection: str = DEFAULT_COLLECTION
 
 class SummarizeRequest(BaseModel):
     document: str | None = None
+    collection: str = DEFAULT_COLLECTION
+
+class CollectionRequest(BaseModel):
+    name: str
+    max_documents: int | None = None    # None = unlimited
+
+class DeleteRequest(BaseModel):
+    doc_ids: list[str]
 
 # ---------------------------------
 # HEALTH
@@ -68,6 +180,21 @@ def health():
 def health_head():
     return Response(status_code=200)
 
+@app.get("/ready")
+def ready():
+    readiness = get_readiness()
+    if readiness["state"] != "ready":
+        return JSONResponse(status_code=503, content=readiness)
+    return readiness
+
+# ---------------------------------
+# PROMETHEUS METRICS
+# ---------------------------------
+@app.get("/metrics")
+def metrics():
+    body, content_type = render()
+    return Response(content=body, media_type=content_type)
+
 # ---------------------------------
 # DOCUMENT Ingestion Status
 # ---------------------------------
@@ -75,48 +202,157 @@ def health_head():
 def ingestion_status_api():
     return get_ingestion_status()
 
+# ---------------------------------
+# EVENT STREAM (SSE)
+# ---------------------------------
+KEEPALIVE_SECONDS = 15
+
+@app.get("/events")
+async def event_stream(request: Request):
+    """Ingestion progress and document catalog changes as server-sent
+    events. Resumes from Last-Event-ID when the gap is still buffered,
+    otherwise starts with a snapshot of both."""
+    last_id = request.headers.get("last-event-id", "")
+    subscriber, replay = events.subscribe(int(last_id) if last_id.isdigit() else None)
+    _, queue = subscriber
+
+    async def stream():
+        try:
+            yield "retry: 3000\n\n"
+            if replay is None:
+                snapshot_id = events.last_id
+                yield format_event(snapshot_id, "ingestion", get_ingestion_status())
+                yield format_event(snapshot_id, "catalog", {
+                    "version": get_catalog_version(), "change": "snapshot"
+                })
+            else:
+                for event in replay:
+                    yield format_event(*event)
+
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": keep-alive\n\n"
+                    continue
+                if event is None:
+                    break   # fell too far behind; the client resumes
+                yield format_event(*event)
+        finally:
+            events.unsubscribe(subscriber)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+# ---------------------------------
+# COLLECTIONS
+# ---------------------------------
+def resolve_collection(name):
+    collection = get_collection(name)
+    if collection is None:
+        raise HTTPException(404, f"Collection not found: {name}")
+    return collection["name"]
+
+
+@app.get("/collections")
+def get_collections():
+    return {"collections": list_collections()}
+
+
+@app.post("/collections")
+def post_collection(req: CollectionRequest):
+    try:
+        return create_collection(req.name, req.max_documents)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+
 # ---------------------------------
 # DOCUMENT UPLOAD
 # ---------------------------------
 @app.post("/upload")
-async def upload_documents(files: list[UploadFile] = File(...)):
+async def upload_documents(
+    request: Request,
+    files: list[UploadFile] = File(...),
+    profile: bool = False,
+    collection: str = DEFAULT_COLLECTION,
+):
     
     if not files:
         raise HTTPException(status_code=400, detail="No files uploaded")
+    collection = await run_in_threadpool(resolve_collection, collection)
 
     bucket = supabase.storage.from_(BUCKET_NAME)
     uploaded_files = []
-    existing_files = {f["name"] for f in bucket.list()}
+    spool = {}
+    if collection == DEFAULT_COLLECTION:
+        existing_files = {f["name"] for f in bucket.list()}
+    else:
+        existing_files = {storage_path(collection, f["name"]) for f in bucket.list(collection)}
+    # objects of deleted documents may linger until cleanup; re-uploads replace them
+    pending_delete = {
+        row["storage_path"] for row in iter_documents(
+            "id, storage_path", status="deleted", collection=collection
+        )
+    }
+    existing_files -= pending_delete
 
+    new_files = {}
     for file in files:
         ext = os.path.splitext(file.filename)[1].lower()
         if ext not in ALLOWED_EXT:
             raise HTTPException(status_code=400, detail=f"Unsupported file type: {ext}")
 
-        try:
-            file_bytes = await file.read()
-            hash_value = file_hash(file_bytes)
-            unique_name = f"{hash_value}_{file.filename}"
+        file_bytes = await file.read()
+        unique_name = storage_path(collection, f"{file_hash(file_bytes)}_{file.filename}")
+        if unique_name not in existing_files:
+            new_files[unique_name] = (file_bytes, ext)
 
-            if unique_name in existing_files:
-                continue
-            
+    # checked before anything is stored; the insert trigger catches races
+    room = remaining(collection) if new_files else None
+    if room is not None and len(new_files) > room:
+        raise HTTPException(
+            status_code=409,
+            detail=f"Collection {collection} has room for {room} more documents, got {len(new_files)}",
+        )
+
+    for unique_name, (file_bytes, ext) in new_files.items():
+        try:
             bucket.upload(
                 path=unique_name,
                 file=file_bytes,
+                file_options={"upsert": "true"} if unique_name in pending_delete else None,
             )
             uploaded_files.append(unique_name)
+            spool[unique_name] = spool_file(file_bytes, suffix=ext)
             existing_files.add(unique_name)
 
         except Exception as e:
+            # nothing reaches ingestion now: drop the files spooled so far
+            for source in spool.values():
+                release_spool(source)
             raise HTTPException(status_code=500, detail=str(e))
-        
+
+    # clients pass this as Last-Event-ID to follow this job from the start
+    event_id = events.last_id
+    job_profile = None
+
     if uploaded_files:
         # Mark running before the worker starts so clients never get stuck at idle.
         set_ingestion_status("running")
+        # the job inherits this request's id for its logs
+        ctx = contextvars.copy_context()
+        job_profile = requested_profile(profile or request.headers.get("X-Profile"))
         threading.Thread(
-            target=ingest_documents,
-            args=(uploaded_files,), ##unique_names
+            target=ctx.run,
+            args=(
+                profile_unit, job_profile, "ingest",
+                ingest_documents, uploaded_files, spool, collection,
+            ),
             daemon=True
         ).start()
         message = "Chunk ingestion started."
@@ -127,81 +363,149 @@ async def upload_documents(files: list[UploadFile] = File(...)):
 
     return {
         "status": "upload_successful",
+        "collection": collection,
         "files": uploaded_files,
         "message": message,
+        "event_id": event_id,
+        "profile_id": job_profile,
     }
     
 # ---------------------------------
 # QUESTION ANSWERING
 # ---------------------------------
 @app.post("/query")
-async def query_documents(req: QueryRequest):
+async def query_documents(req: QueryRequest, request: Request, response: Response):
 
     if not req.question.strip():
         raise HTTPException(
             status_code=400,
             detail="Question cannot be empty"
         )
+    # an unknown name costs a DB round trip: keep it off the event loop
+    collection = await run_in_threadpool(resolve_collection, req.collection)
+
+    # legacy clients that resend their own history stay sessionless
+    session_id = None
+    if req.session_id and not sessions.exists(req.session_id):
+        # expired, or held by another worker / a previous process
+        if not req.chat_history:
+            raise HTTPException(
+                status_code=404,
+                detail={"error": "session_expired", "session_id": req.session_id},
+            )
+        session_id = sessions.resume(req.chat_history)
+    elif req.session_id or not req.chat_history:
+        session_id = sessions.open(req.session_id)
 
-    return answer_question(
+    unit = profiled(request, response)
+    # waiting for a slot holds no worker thread; only admitted requests do
+    return await query_limiter.run(
+        profile_unit,
+        unit,
+        "query",
+        answer_question,
         question=req.question,
         chat_history=req.chat_history,
-        document=req.document
+        document=req.document,
+        session_id=session_id,
+        collection=collection
     )
 
+
+@app.delete("/sessions/{session_id}")
+def delete_session(session_id: str):
+    if not sessions.delete(session_id):
+        raise HTTPException(404, "Session not found")
+    return {"status": "deleted", "session_id": session_id}
+
 # ---------------------------------
 # SUMMARIZE
 # --------------------------------- 
 @app.post("/summarize")
-async def summarize_document(req: SummarizeRequest):
-    return summarize_documents(req.document)
+async def summarize_document(req: SummarizeRequest, request: Request, response: Response):
+    collection = await run_in_threadpool(resolve_collection, req.collection)
+    unit = profiled(request, response)
+    return await summarize_limiter.run(
+        profile_unit,
+        unit,
+        "summarize",
+        summarize_documents,
+        req.document,
+        collection
+    )
 
 
 # ---------------------------------
 # LIST DOCUMENTS
 # ---------------------------------
 @app.get("/documents")
-async def get_documents():
+def get_documents(collection: str = DEFAULT_COLLECTION):
+    collection = resolve_collection(collection)
+    # read first: a change during the listing bumps it past this value
+    version = get_catalog_version()
     return {
-        "documents": list_documents()
+        "collection": collection,
+        "documents": list_documents(collection),
+        "version": version
     }
 
 # ---------------------------------
 # DELETE DOCUMENT
 # ---------------------------------
 @app.delete("/documents/{doc_id}")
-async def delete_document(doc_id: str):
+def delete_document(doc_id: str):
+    # tombstone now; chunks, file and row are removed in the background
+    try:
+        found = tombstone([doc_id])
+    except Exception as e:
+        raise HTTPException(500, str(e))
+
+    if not found:
+        raise HTTPException(404, "Document not found")
+
+    return {"status": "deleted", "doc_id": doc_id, "cleanup": "pending"}
+
+
+@app.post("/documents/delete")
+def delete_documents(req: DeleteRequest):
     try:
-        doc_res = supabase.table("documents") \
-            .select("*") \
-            .eq("id", doc_id) \
-            .execute()
+        found = {row["id"] for row in tombstone(req.doc_ids)}
+    except Exception as e:
+        raise HTTPException(500, str(e))
 
-        if not doc_res.data:
-            raise HTTPException(404, "Document not found")
+    return {
+        "status": "deleted",
+        "deleted": [d for d in dict.fromkeys(req.doc_ids) if d in found],
+        "not_found": [d for d in dict.fromkeys(req.doc_ids) if d not in found],
+        "cleanup": "pending",
+    }
 
-        doc = doc_res.data[0]
-        file_path = doc.get("storage_path")
 
-        if not file_path:
-            raise HTTPException(400, "storage_path missing")
+# ---------------------------------
+# PROFILES (ADMIN)
+# ---------------------------------
+@app.get("/admin/profiles")
+def get_profiles():
+    if not PROFILING:
+        raise HTTPException(404, "Profiling is disabled")
+    return {"profiles": list_profiles()}
 
-        # delete chunks
-        supabase.table("chunks") \
-            .delete() \
-            .eq("source", doc_id) \
-            .execute()
 
-        # delete file
-        supabase.storage.from_(BUCKET_NAME).remove([file_path])
+@app.get("/admin/profiles/{profile_id}")
+def get_profile(profile_id: str, sort: str = "cumulative", limit: int = 40):
+    if sort not in pstats.Stats.sort_arg_dict_default:
+        raise HTTPException(400, f"Unknown sort key: {sort}")
 
-        # delete document
-        supabase.table("documents") \
-            .delete() \
-            .eq("id", doc_id) \
-            .execute()
+    profile = load_profile(profile_id, sort, limit) if PROFILING else None
+    if profile is None:
+        raise HTTPException(404, "Profile not found")
+    return profile
 
-        return {"status": "deleted", "doc_id": doc_id}
 
-    except Exception as e:
-        raise HTTPException(500, str(e))
\ No newline at end of file
+@app.get("/admin/profiles/{profile_id}/pstats")
+def download_profile(profile_id: str):
+    # binary pstats dump for snakeviz / python -m pstats
+    path = stats_path(profile_id) if PROFILING else None
+    if path is None:
+        raise HTTPException(404, "Profile not found")
+    return FileResponse(path, media_type="application/octet-stream", filename=f"{profile_id}.prof")
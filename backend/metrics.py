@@ -0,0 +1,142 @@
+import logging
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+)
+
+log = logging.getLogger(__name__)
+
+# -----------------------------
+# REQUEST IDS
+# -----------------------------
+request_id: ContextVar[str] = ContextVar("request_id", default="-")
+
+
+def new_request_id(value=None):
+    rid = value or uuid.uuid4().hex[:16]
+    request_id.set(rid)
+    return rid
+
+
+class RequestIdFilter(logging.Filter):
+    # exposes %(request_id)s to log formats
+    def filter(self, record):
+        record.request_id = request_id.get()
+        return True
+
+
+def configure_logging(level=logging.INFO):
+    handler = logging.StreamHandler()
+    handler.addFilter(RequestIdFilter())
+    handler.setFormatter(logging.Formatter(
+        "%(asctime)s %(levelname)s [%(request_id)s] %(name)s: %(message)s"
+    ))
+    logging.basicConfig(level=level, handlers=[handler], force=True)
+
+
+# -----------------------------
+# PROMETHEUS METRICS
+# -----------------------------
+# 1ms .. ~2min, covers embedding calls through full OCR runs
+BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    1, 2.5, 5, 10, 30, 60, 120,
+)
+
+STAGE_SECONDS = Histogram(
+    "intyrasense_stage_seconds",
+    "Time spent per pipeline stage",
+    ["pipeline", "stage"],
+    buckets=BUCKETS,
+)
+
+REQUEST_SECONDS = Histogram(
+    "intyrasense_request_seconds",
+    "End-to-end HTTP request latency",
+    ["method", "route", "status"],
+    buckets=BUCKETS,
+)
+
+LLM_TOKENS = Counter(
+    "intyrasense_llm_tokens_total",
+    "LLM tokens by call site and direction",
+    ["call", "kind"],
+)
+
+LLM_EVENTS = Counter(
+    "intyrasense_llm_gateway_total",
+    "LLM gateway outcomes: miss, cache_hit, coalesced, retry",
+    ["event"],
+)
+
+CACHE_EVENTS = Counter(
+    "intyrasense_cache_total",
+    "Query cache lookups by cache and result: l1_hit, l2_hit, miss",
+    ["cache", "result"],
+)
+
+ADMISSION_EVENTS = Counter(
+    "intyrasense_admission_total",
+    "Admission decisions per endpoint: admitted, queued, queue_full, deadline, timeout",
+    ["endpoint", "result"],
+)
+
+QUEUE_DEPTH = Gauge(
+    "intyrasense_queue_depth",
+    "Requests (or ingestion embed batches) waiting for a slot",
+    ["queue"],
+)
+
+IN_FLIGHT = Gauge(
+    "intyrasense_in_flight",
+    "Admitted requests currently running per endpoint",
+    ["endpoint"],
+)
+
+INGESTED_ITEMS = Counter(
+    "intyrasense_ingested_total",
+    "Ingested files and chunks",
+    ["kind"],
+)
+
+
+@contextmanager
+def stage(pipeline, name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.labels(pipeline, name).observe(elapsed)
+        log.debug("%s.%s took %.1f ms", pipeline, name, elapsed * 1000)
+
+
+def observe(pipeline, name, seconds):
+    STAGE_SECONDS.labels(pipeline, name).observe(seconds)
+
+
+def record_tokens(call, response):
+    usage = getattr(response, "usage_metadata", None) or {}
+    if not usage:
+        token_usage = (getattr(response, "response_metadata", None) or {}).get("token_usage", {})
+        usage = {
+            "input_tokens": token_usage.get("prompt_tokens", 0),
+            "output_tokens": token_usage.get("completion_tokens", 0),
+        }
+
+    prompt = usage.get("input_tokens", 0) or 0
+    completion = usage.get("output_tokens", 0) or 0
+    LLM_TOKENS.labels(call, "prompt").inc(prompt)
+    LLM_TOKENS.labels(call, "completion").inc(completion)
+    log.debug("%s used %d prompt + %d completion tokens", call, prompt, completion)
+
+
+def render():
+    return generate_latest(), CONTENT_TYPE_LATEST
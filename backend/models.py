@@ -1,10 +1,12 @@
 import os
+import logging
 from functools import lru_cache
 from dotenv import load_dotenv
 
-from langchain_groq import ChatGroq
-from langchain_huggingface import HuggingFaceEmbeddings
+# langchain_groq / langchain_huggingface (and torch behind it) are imported
+# on first use, so importing this module is cheap.
 
+log = logging.getLogger(__name__)
 
 # -----------------------------
 # LOAD ENV
@@ -12,9 +14,7 @@ from langchain_huggingface import HuggingFaceEmbeddings
 load_dotenv()
 
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
-
-if not GROQ_API_KEY:
-    raise RuntimeError("GROQ_API_KEY not set")
+EMBEDDING_MODEL = "BAAI/bge-small-en-v1.5"
 
 
 # -----------------------------
@@ -22,6 +22,11 @@ if not GROQ_API_KEY:
 # -----------------------------
 @lru_cache(maxsize=1)
 def llm():
+    if not GROQ_API_KEY:
+        raise RuntimeError("GROQ_API_KEY not set")
+
+    from langchain_groq import ChatGroq
+
     return ChatGroq(
         model="llama-3.1-8b-instant",
         temperature=0,
@@ -32,11 +37,39 @@ def llm():
 # -----------------------------
 # EMBEDDINGS
 # -----------------------------
-@lru_cache(maxsize=1)
-def embeddings():
+@lru_cache(maxsize=2)
+def embeddings(model_name=None):
+    # a second model is only loaded while re-indexing or after a cutover
+    from langchain_huggingface import HuggingFaceEmbeddings
+
     return HuggingFaceEmbeddings(
-        model_name="BAAI/bge-small-en-v1.5",
+        model_name=model_name or EMBEDDING_MODEL,
         encode_kwargs={
             "normalize_embeddings": True
         }
-    )
\ No newline at end of file
+    )
+
+
+# -----------------------------
+# TOKENIZER
+# -----------------------------
+@lru_cache(maxsize=1)
+def tokenizer():
+    # same vocabulary as the embedding model, used to size chunks
+    from transformers import AutoTokenizer
+    return AutoTokenizer.from_pretrained(EMBEDDING_MODEL)
+
+
+# -----------------------------
+# WARM-UP
+# -----------------------------
+def warm_up():
+    """Load models ahead of the first request.
+
+    One throwaway embedding also initializes torch kernels, which would
+    otherwise land on the first query.
+    """
+    embeddings().embed_query("warm up")
+    tokenizer()
+    llm()
+    log.info("models loaded")
@@ -0,0 +1,449 @@
+import cProfile
+import io
+import logging
+import os
+import re
+import codecs
+import queue
+import tempfile
+import threading
+import time
+import multiprocessing
+from collections import deque
+from multiprocessing.connection import wait
+from langchain_core.documents import Document
+
+PARSE_WORKERS = int(os.getenv("PARSE_WORKERS", min(4, os.cpu_count() or 1)))
+PARSE_TIMEOUT = float(os.getenv("PARSE_TIMEOUT", 300))        # seconds per file
+PARSE_MEMORY_MB = int(os.getenv("PARSE_MEMORY_MB", 2048))     # address space per worker
+
+# "native" (default) or "langchain" to use TextLoader / UnstructuredMarkdownLoader
+TEXT_LOADER = os.getenv("TEXT_LOADER", "native")
+
+# spawn, not fork: the parent holds torch threads and HTTP clients
+_mp = multiprocessing.get_context("spawn")
+
+log = logging.getLogger(__name__)
+
+# per-task stage timings, filled in the worker and sent back with results
+_timings = {}
+
+
+# =====================================================
+# SMART PDF LOADER
+# =====================================================
+def read_pdf_pages(source):
+    if isinstance(source, str):
+        from langchain_community.document_loaders import PyPDFLoader
+        return PyPDFLoader(source).load()
+
+    from pypdf import PdfReader
+    reader = PdfReader(io.BytesIO(source))
+    return [
+        Document(
+            page_content=page.extract_text() or "",
+            metadata={"page": i}
+        )
+        for i, page in enumerate(reader.pages)
+    ]
+
+
+def load_pdf_smart(source, min_text_length=100):
+    """Load a PDF from a local path or raw bytes, OCR'ing scanned files."""
+    normal_docs = read_pdf_pages(source)
+    normal_text = "\n".join(
+        d.page_content.strip() for d in normal_docs
+    ).strip()
+
+    if len(normal_text) >= min_text_length:
+        return normal_docs
+
+    # OCR stack is only imported for scanned PDFs
+    import pytesseract
+    from pdf2image import convert_from_bytes, convert_from_path
+
+    start = time.perf_counter()
+
+    if isinstance(source, str):
+        images = convert_from_path(source)
+    else:
+        images = convert_from_bytes(source)
+
+    docs = []
+
+    for i, img in enumerate(images):
+        text = pytesseract.image_to_string(img).strip()
+
+        if text:
+            docs.append(
+                Document(
+                    page_content=text,
+                    metadata={"page": i + 1}
+                )
+            )
+
+    _timings["ocr"] = _timings.get("ocr", 0.0) + time.perf_counter() - start
+    return docs
+
+
+# =====================================================
+# NATIVE TEXT / MARKDOWN LOADERS
+# =====================================================
+_BOMS = (
+    (codecs.BOM_UTF32_LE, "utf-32"),   # before UTF-16: shares its prefix
+    (codecs.BOM_UTF32_BE, "utf-32"),
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+)
+# a detected legacy encoding is only trusted when its output reads like a
+# language; short texts score 0 coherence for any guess and fall back
+MIN_COHERENCE = 0.2
+MAX_CHAOS = 0.1
+MIN_MULTIBYTE_BYTES = 32   # CJK codecs score no coherence; trust them on longer input only
+
+_HEADING = re.compile(r"^(#{1,6})\s+(.*?)\s*#*\s*$")
+_SETEXT = re.compile(r"^(=+|-+)\s*$")
+_FENCE = re.compile(r"^\s*(```|~~~)")
+_INLINE = (
+    (re.compile(r"!\[([^\]]*)\]\([^)]*\)"), r"\1"),   # images -> alt text
+    (re.compile(r"\[([^\]]+)\]\([^)]*\)"), r"\1"),     # links -> label
+    (re.compile(r"<[^>\n]+>"), ""),                   # inline html
+    (re.compile(r"\*\*|`"), ""),                       # bold / code marks
+    (re.compile(r"^\s*([-*_]\s*){3,}$", re.M), ""),   # horizontal rules
+)
+
+
+def read_bytes(source):
+    if isinstance(source, str):
+        with open(source, "rb") as f:
+            return f.read()
+    return source
+
+
+def decode_text(data):
+    """Decode bytes using a BOM, UTF-8, a confidently detected legacy
+    encoding, or Windows-1252."""
+    for bom, encoding in _BOMS:
+        if data.startswith(bom):
+            return data.decode(encoding)
+
+    try:
+        return data.decode("utf-8")
+    except UnicodeDecodeError:
+        pass
+
+    try:
+        from charset_normalizer import from_bytes
+        from charset_normalizer.utils import is_multi_byte_encoding
+        trusted = [
+            m for m in from_bytes(data)
+            if m.chaos <= MAX_CHAOS and (
+                m.coherence >= MIN_COHERENCE
+                or (len(data) >= MIN_MULTIBYTE_BYTES and not m.encoding.startswith("utf")
+                    and is_multi_byte_encoding(m.encoding))
+            )
+        ]
+        if trusted:
+            # best() ranks by chaos alone, which cannot tell Latin code pages apart
+            return str(max(trusted, key=lambda m: (m.coherence, -m.chaos)))
+    except ImportError:
+        pass
+
+    try:
+        return data.decode("cp1252")
+    except UnicodeDecodeError:
+        # the five bytes cp1252 leaves undefined
+        return data.decode("latin-1")
+
+
+def load_text(source):
+    text = decode_text(read_bytes(source))
+    text = text.replace("\r\n", "\n").replace("\r", "\n")
+    return [Document(page_content=text, metadata={})]
+
+
+def clean_markdown(text):
+    for pattern, repl in _INLINE:
+        text = pattern.sub(repl, text)
+    return re.sub(r"\n{3,}", "\n\n", text).strip()
+
+
+def load_markdown(source):
+    """Split markdown into one Document per heading section.
+
+    Each section keeps its heading line and records the heading path
+    ("Intro > Setup") in metadata, so chunks never straddle sections.
+    """
+    text = load_text(source)[0].page_content
+    lines = text.split("\n")
+
+    sections = []
+    path = []
+    current = []
+    in_fence = False
+
+    def flush():
+        body = clean_markdown("\n".join(current))
+        if body:
+            sections.append(Document(
+                page_content=body,
+                metadata={"heading": " > ".join(t for _, t in path)}
+            ))
+        current.clear()
+
+    for i, line in enumerate(lines):
+        if _FENCE.match(line):
+            in_fence = not in_fence
+            current.append(line)
+            continue
+
+        level, title = None, None
+        if not in_fence:
+            m = _HEADING.match(line)
+            if m:
+                level, title = len(m.group(1)), m.group(2)
+            elif (
+                _SETEXT.match(line) and current and current[-1].strip()
+                and (i < 2 or not lines[i - 2].strip())
+            ):
+                # "Title\n=====" / "Title\n-----"
+                level = 1 if line.lstrip().startswith("=") else 2
+                title = current.pop().strip()
+
+        if level is None:
+            current.append(line)
+            continue
+
+        flush()
+        while path and path[-1][0] >= level:
+            path.pop()
+        path.append((level, title))
+        current.append(title)
+
+    flush()
+
+    for i, doc in enumerate(sections):
+        doc.metadata["section"] = i
+
+    return sections
+
+
+def load_with_langchain(source, ext):
+    from langchain_community.document_loaders import (
+        TextLoader,
+        UnstructuredMarkdownLoader
+    )
+    loader_cls = TextLoader if ext == "txt" else UnstructuredMarkdownLoader
+
+    if isinstance(source, str):
+        return loader_cls(source).load()
+
+    # langchain loaders only read from disk
+    with tempfile.NamedTemporaryFile(delete=False, suffix=f".{ext}") as tmp:
+        tmp.write(source)
+        path = tmp.name
+    try:
+        return loader_cls(path).load()
+    finally:
+        os.remove(path)
+
+
+# =====================================================
+# FORMAT DISPATCH
+# =====================================================
+def load_file(source, ext, text_loader=None):
+    """Parse a spooled file (bytes or local path) into Documents."""
+    if ext == "pdf":
+        return load_pdf_smart(source)
+
+    if ext not in ("txt", "md"):
+        return None
+
+    if (text_loader or TEXT_LOADER) == "langchain":
+        return load_with_langchain(source, ext)
+
+    if ext == "txt":
+        return load_text(source)
+
+    return load_markdown(source)
+
+
+# =====================================================
+# WORKER PROCESS
+# =====================================================
+def _limit_memory(memory_mb):
+    try:
+        import resource
+    except ImportError:  # not available on Windows
+        return
+
+    limit = memory_mb * 1024 * 1024
+    resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+
+def _worker_main(conn, memory_mb):
+    _limit_memory(memory_mb)
+
+    while True:
+        task = conn.recv()
+        if task is None:
+            break
+
+        key, source, ext, profile = task
+        _timings.clear()
+        profiler = cProfile.Profile() if profile else None
+        start = time.perf_counter()
+        try:
+            if profiler:
+                profiler.enable()
+            docs, error = load_file(source, ext), None
+        except BaseException as e:
+            docs, error = None, f"{type(e).__name__}: {e}"
+        finally:
+            if profiler:
+                profiler.disable()
+
+        # OCR is reported separately from text extraction
+        ocr = _timings.get("ocr", 0.0)
+        timings = {"parse": time.perf_counter() - start - ocr}
+        if ocr:
+            timings["ocr"] = ocr
+
+        stats = None
+        if profiler:
+            profiler.create_stats()
+            stats = profiler.stats
+        conn.send((key, docs, error, timings, stats))
+
+
+class _Worker:
+
+    def __init__(self, memory_mb):
+        self.conn, child = _mp.Pipe()
+        self.process = _mp.Process(
+            target=_worker_main,
+            args=(child, memory_mb),
+            daemon=True
+        )
+        self.process.start()
+        child.close()
+        self.key = None
+        self.started = 0.0
+
+    def submit(self, task):
+        self.key = task[0]
+        self.started = time.monotonic()
+        self.conn.send(task)
+
+    def kill(self):
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+        except (BrokenPipeError, OSError):
+            pass
+        self.process.join(timeout=5)
+        if self.process.is_alive():
+            self.kill()
+
+
+# =====================================================
+# PARSER POOL
+# =====================================================
+def _run_pool(tasks, results, workers, timeout, memory_mb):
+    pending = deque(tasks)
+    pool = []
+
+    try:
+        for _ in range(min(workers, len(pending))):
+            pool.append(_Worker(memory_mb))
+
+        while True:
+            for worker in pool:
+                if worker.key is None and pending:
+                    worker.submit(pending.popleft())
+
+            busy = [w for w in pool if w.key is not None]
+            if not busy:
+                break
+
+            ready = wait([w.conn for w in busy], timeout=0.5)
+            now = time.monotonic()
+
+            for i, worker in enumerate(pool):
+                if worker.key is None:
+                    continue
+
+                error = None
+                if worker.conn in ready:
+                    try:
+                        results.put(worker.conn.recv())
+                        worker.key = None
+                        continue
+                    except (EOFError, OSError):
+                        worker.process.join(timeout=1)
+                        error = f"parser exited (code {worker.process.exitcode})"
+
+                elif now - worker.started > timeout:
+                    error = f"parse timed out after {timeout:.0f}s"
+
+                if error:
+                    # isolate the bad file: replace its worker, keep the rest
+                    results.put((worker.key, None, error, {}, None))
+                    worker.kill()
+                    worker.key = None
+                    if pending:
+                        pool[i] = _Worker(memory_mb)
+    except Exception as e:
+        # the pool itself broke; fail whatever has not been reported
+        log.error("parser pool failed: %s", e)
+        for worker in pool:
+            if worker.key is not None:
+                results.put((worker.key, None, str(e), {}, None))
+        for task in pending:
+            results.put((task[0], None, str(e), {}, None))
+
+    finally:
+        for worker in pool:
+            worker.stop()
+        results.put(None)
+
+
+def parse_files(tasks, workers=PARSE_WORKERS, timeout=PARSE_TIMEOUT,
+                memory_mb=PARSE_MEMORY_MB):
+    """Parse (key, source, ext) tasks in isolated worker processes.
+
+    Yields (key, documents, error, timings) as each file finishes, where
+    timings holds worker-side "parse" and "ocr" seconds. Callers can
+    embed early files while later ones are still parsing. A file that
+    crashes, exceeds the memory limit or times out yields an error and
+    does not affect the others.
+    """
+    if not tasks:
+        return
+
+    # parent side only, so worker processes never import it
+    from backend import profiling
+
+    # workers profile their parse when the calling job is profiled
+    profile = profiling.active()
+    tasks = [(key, source, ext, profile) for key, source, ext in tasks]
+
+    results = queue.Queue()
+    threading.Thread(
+        target=_run_pool,
+        args=(tasks, results, workers, timeout, memory_mb),
+        daemon=True
+    ).start()
+
+    while True:
+        item = results.get()
+        if item is None:
+            break
+        key, docs, error, timings, stats = item
+        profiling.add_stats(stats)
+        yield key, docs, error, timings
@@ -0,0 +1,290 @@
+"""Opt-in cProfile + tracemalloc capture for one request or ingestion job.
+
+Nothing is traced unless PROFILING=1 and the unit asks for it: the
+`X-Profile: 1` header on /query and /summarize, `?profile=true` (or the
+header) on /upload for its ingestion job. Pool threads that run under the
+unit's context and parser worker processes are folded into the same CPU
+profile. Memory is process-wide: net allocations by line between the
+start and end of the unit, plus peak traced memory.
+
+Profiles are written to PROFILE_DIR, so any worker on the host can serve
+them through /admin/profiles.
+"""
+import cProfile
+import io
+import json
+import logging
+import os
+import pstats
+import re
+import tempfile
+import threading
+import time
+import tracemalloc
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from backend.metrics import request_id
+
+log = logging.getLogger(__name__)
+
+PROFILING = os.getenv("PROFILING", "0") == "1"
+PROFILE_DIR = os.getenv(
+    "PROFILE_DIR", os.path.join(tempfile.gettempdir(), "intyrasense-profiles")
+)
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", 50))     # newest profiles kept on disk
+MEMORY_TOP = 25                                       # allocation sites per profile
+
+_ID = re.compile(r"[A-Za-z0-9._-]{1,64}")
+_TRUE = {"1", "true", "yes", "on"}
+
+_session = ContextVar("profile_session", default=None)
+_local = threading.local()      # a profiler is already running on this thread
+
+
+# -----------------------------
+# TRACEMALLOC (shared)
+# -----------------------------
+_tracing_lock = threading.Lock()
+_tracing_users = 0
+_started_tracing = False
+
+
+def _start_tracing():
+    global _tracing_users, _started_tracing
+    with _tracing_lock:
+        if _tracing_users == 0:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                _started_tracing = True
+            tracemalloc.reset_peak()
+        _tracing_users += 1
+    return tracemalloc.take_snapshot()
+
+
+def _stop_tracing():
+    global _tracing_users, _started_tracing
+    snapshot = tracemalloc.take_snapshot()
+    peak = tracemalloc.get_traced_memory()[1]
+    with _tracing_lock:
+        _tracing_users -= 1
+        # overlapping units keep tracing until the last one finishes
+        if _tracing_users == 0 and _started_tracing:
+            tracemalloc.stop()
+            _started_tracing = False
+    return snapshot, peak
+
+
+def _top_allocations(baseline, snapshot):
+    # leave out the profiler's own bookkeeping and module imports
+    ignore = (
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, pstats.__file__),
+        tracemalloc.Filter(False, cProfile.__file__),
+        tracemalloc.Filter(False, __file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+    )
+    stats = snapshot.filter_traces(ignore).compare_to(baseline.filter_traces(ignore), "lineno")
+    return [
+        {
+            "where": f"{s.traceback[0].filename}:{s.traceback[0].lineno}",
+            "size_kb": round(s.size_diff / 1024, 1),
+            "count": s.count_diff,
+        }
+        for s in stats[:MEMORY_TOP]
+    ]
+
+
+# -----------------------------
+# SESSIONS
+# -----------------------------
+class _Collected:
+    # raw stats from a worker process, shaped like a Profile for pstats
+    def __init__(self, stats):
+        self.stats = stats
+
+    def create_stats(self):
+        pass
+
+
+class Session:
+    """CPU stats from every participating thread and process of one unit."""
+
+    def __init__(self, unit_id, kind):
+        self.id = unit_id
+        self.kind = kind
+        self.lock = threading.Lock()
+        self.cpu = None
+        self.sources = 0
+        self.created_at = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+        self.start = time.perf_counter()
+        self.baseline = _start_tracing()
+
+    def add(self, profiler):
+        with self.lock:
+            if self.cpu is None:
+                self.cpu = pstats.Stats(profiler)
+            else:
+                self.cpu.add(profiler)
+            self.sources += 1
+
+    def finish(self, error=None):
+        seconds = time.perf_counter() - self.start
+        snapshot, peak = _stop_tracing()
+        meta = {
+            "id": self.id,
+            "kind": self.kind,
+            "created_at": self.created_at,
+            "seconds": round(seconds, 3),
+            "threads_and_processes": self.sources,
+            "error": error,
+            "memory": {
+                "peak_kb": round(peak / 1024, 1),
+                "top": _top_allocations(self.baseline, snapshot),
+            },
+        }
+        try:
+            save(meta, self.cpu)
+        except OSError as e:
+            log.error("could not store profile %s: %s", self.id, e)
+        log.info("profiled %s %s in %.2fs", self.kind, self.id, seconds)
+
+
+def requested_profile(flag):
+    """Profile id for a unit that asked to be profiled, otherwise None.
+
+    The id starts with the request id so logs and profile line up, and
+    ends in a server-generated suffix: X-Request-ID comes from the client
+    and a reused one must not overwrite an earlier profile.
+    """
+    if not PROFILING or str(flag).strip().lower() not in _TRUE:
+        return None
+    rid = request_id.get()
+    if rid == "-" or not _ID.fullmatch(rid):
+        return uuid.uuid4().hex[:16]
+    return f"{rid[:55]}-{uuid.uuid4().hex[:8]}"
+
+
+def profile_unit(unit, kind, fn, *args, **kwargs):
+    """Call fn, profiled as `unit` when one is given."""
+    if not unit:
+        return fn(*args, **kwargs)
+
+    session = Session(unit, kind)
+    token = _session.set(session)
+    error = None
+    try:
+        with profile_thread():
+            return fn(*args, **kwargs)
+    except BaseException as e:
+        error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _session.reset(token)
+        session.finish(error)
+
+
+@contextmanager
+def profile_thread():
+    """Profile the current thread into the active unit, if there is one."""
+    session = _session.get()
+    if session is None or getattr(_local, "active", False):
+        yield
+        return
+
+    profiler = cProfile.Profile()
+    _local.active = True
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        _local.active = False
+        session.add(profiler)
+
+
+def profiled(fn, *args, **kwargs):
+    # for executor.map: run fn on a pool thread inside the active unit
+    with profile_thread():
+        return fn(*args, **kwargs)
+
+
+def active():
+    return _session.get() is not None
+
+
+def add_stats(stats):
+    """Merge raw cProfile stats collected in a worker process."""
+    session = _session.get()
+    if session is not None and stats:
+        session.add(_Collected(stats))
+
+
+# -----------------------------
+# STORAGE
+# -----------------------------
+def _path(unit, ext):
+    return os.path.join(PROFILE_DIR, f"{unit}{ext}")
+
+
+def save(meta, cpu):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    if cpu is not None:
+        cpu.dump_stats(_path(meta["id"], ".prof"))
+    with open(_path(meta["id"], ".json"), "w") as f:
+        json.dump(meta, f)
+
+    # keep the newest PROFILE_KEEP
+    for old in list_profiles()[PROFILE_KEEP:]:
+        for ext in (".json", ".prof"):
+            try:
+                os.remove(_path(old["id"], ext))
+            except OSError:
+                pass
+
+
+def list_profiles():
+    """Stored profile summaries, newest first."""
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+
+    profiles = []
+    for name in os.listdir(PROFILE_DIR):
+        if not name.endswith(".json"):
+            continue
+        try:
+            with open(os.path.join(PROFILE_DIR, name)) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            continue
+        profiles.append({k: meta.get(k) for k in ("id", "kind", "created_at", "seconds", "error")})
+
+    profiles.sort(key=lambda p: p["created_at"] or "", reverse=True)
+    return profiles
+
+
+def stats_path(unit):
+    """Path of the unit's .prof file (pstats / snakeviz), or None."""
+    if not _ID.fullmatch(unit):
+        return None
+    path = _path(unit, ".prof")
+    return path if os.path.exists(path) else None
+
+
+def load_profile(unit, sort="cumulative", limit=40):
+    """Stored summary and memory report with the top `limit` functions
+    by `sort` as pstats text, or None when unknown."""
+    if not _ID.fullmatch(unit):
+        return None
+    try:
+        with open(_path(unit, ".json")) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    path = stats_path(unit)
+    if path:
+        out = io.StringIO()
+        pstats.Stats(path, stream=out).strip_dirs().sort_stats(sort).print_stats(limit)
+        meta["cpu"] = out.getvalue()
+    return meta
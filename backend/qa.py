@@ -1,10 +1,30 @@
-from langchain_core.messages import HumanMessage
+import logging
+import os
+import re
 from backend.utils import get_doc_id_from_name
-from backend.models import llm
+from backend.gateway import complete
+from backend.metrics import stage
 from backend.supabase_client import supabase
-from backend.retriever import retrieve_with_score
+from backend.retriever import fetch_chunks, retrieve_with_score
+from backend.sessions import sessions
+from backend.collection import DEFAULT_COLLECTION
+from backend.state import get_tombstones
 from backend.prompts import SYSTEM_PROMPT, SUMMARY_PROMPT
 
+log = logging.getLogger(__name__)
+
+# words that point back into the conversation; questions without any of
+# them are already standalone and skip the rewrite call
+FOLLOW_UP = re.compile(
+    r"\b(it|its|they|them|their|this|that|these|those|he|she|him|her|his|"
+    r"there|above|previous|earlier|same|former|latter|else|again)\b"
+    r"|^\s*(and|also|so|but|what about|how about|why not)\b",
+    re.IGNORECASE,
+)
+NOT_FOUND = "Not found in internal documents."
+CONTEXT_CHUNKS = int(os.getenv("CONTEXT_CHUNKS", 5))          # retrieved chunks sent to the LLM
+CONFIDENCE_GATE = float(os.getenv("CONFIDENCE_GATE", 0.2))   # best similarity below this: not found
+
 
 # ---------------------------------
 # HELPER: GET DOCUMENT NAME
@@ -32,9 +52,14 @@ def get_document_name(doc_id):
 # ---------------------------------
 # QUESTION REWRITE
 # ---------------------------------
-def rewrite_question(chat_history, question):
+def needs_rewrite(question):
+    return len(question.split()) < 4 or bool(FOLLOW_UP.search(question))
+
 
-    if not chat_history:
+def rewrite_question(chat_history, question, skip_standalone=False):
+    # skip_standalone: only server-side sessions skip the LLM for questions
+    # that already read as standalone; legacy clients always get a rewrite
+    if not chat_history or (skip_standalone and not needs_rewrite(question)):
         return question.strip()
 
     history = "\n".join(
@@ -53,76 +78,143 @@ def rewrite_question(chat_history, question):
         Standalone question:
     """
 
-    response = llm().invoke(prompt)
+    with stage("query", "rewrite"):
+        response = complete(prompt, "rewrite")
 
     return response.content.strip()
 
 
+# ---------------------------------
+# SESSION RETRIEVAL REUSE
+# ---------------------------------
+def reuse_retrieval(turns, standalone_question, doc_id, collection=DEFAULT_COLLECTION):
+    # a follow-up that rewrites to an earlier question reuses its chunks
+    key = standalone_question.strip().lower()
+    for turn in reversed(turns):
+        if (
+            turn["standalone"].strip().lower() == key
+            and turn["doc_id"] == doc_id
+            and turn.get("collection", DEFAULT_COLLECTION) == collection
+        ):
+            rows = fetch_chunks(turn["retrieved"])
+            if rows:
+                log.debug("reusing %d chunks from an earlier turn", len(rows))
+                return rows
+    return None
+
+
+# ---------------------------------
+# CONFIDENCE
+# ---------------------------------
+def context_confidence(retrieved):
+    # best similarity among the context chunks, clamped to [0, 1]
+    scores = [
+        row["score"] for row in retrieved
+        if row.get("text") and isinstance(row.get("score"), (int, float))
+    ]
+    if not scores:
+        return 0.0
+    return max(0.0, min(1.0, float(max(scores))))
+
+
 # ---------------------------------
 # RAG QUESTION ANSWERING
 # ---------------------------------
-def answer_question(question: str, chat_history: list, document=None):
-    standalone_question = rewrite_question(chat_history, question)
-    doc_id = get_doc_id_from_name(document)
+def answer_question(question: str, chat_history: list = None, document=None, session_id=None,
+                    collection: str = DEFAULT_COLLECTION):
+    """Answer from retrieved chunks of `collection`.
 
-    retrieved = retrieve_with_score(
-        standalone_question,
-        doc_id
-    )
+    With a `session_id`, history comes from the server-side session (the
+    stored standalone questions, not raw follow-ups) and the turn is
+    recorded there; `chat_history` is only used by clients without one.
+    """
+    turns = sessions.turns(session_id) if session_id else []
+    if turns:
+        chat_history = [(t["standalone"], t["answer"]) for t in turns]
+
+    standalone_question = rewrite_question(chat_history, question, skip_standalone=bool(turns))
+
+    with stage("query", "name_lookup"):
+        doc_id = get_doc_id_from_name(document)
+
+    retrieved = reuse_retrieval(turns, standalone_question, doc_id, collection)
+    if retrieved is None:
+        retrieved = retrieve_with_score(
+            standalone_question,
+            doc_id,
+            collection=collection
+        )
+    retrieved = retrieved[:CONTEXT_CHUNKS]
+
+    result = generate_answer(standalone_question, retrieved)
+
+    if session_id:
+        sessions.append(session_id, {
+            "question": question,
+            "standalone": standalone_question,
+            "answer": result["answer"],
+            "doc_id": doc_id,
+            "collection": collection,
+            "retrieved": [
+                {k: row.get(k) for k in ("id", "source", "page", "page_end", "score")}
+                for row in retrieved
+            ],
+        })
+        result["session_id"] = session_id
 
+    return result
+
+
+def generate_answer(standalone_question, retrieved):
     if not retrieved:
         return {
-            "answer": "Not found in internal documents.",
+            "answer": NOT_FOUND,
             "citations": [],
             "confidence": 0.0
         }
 
-    retrieved = retrieved[:5]
-    print("SCORES:", [row.get("score") for row in retrieved])
+    if log.isEnabledFor(logging.DEBUG):
+        log.debug("scores: %s", [row.get("score") for row in retrieved])
     context_chunks = []
-    similarities = []
     citations = []
 
     for row in retrieved:
 
         content = row.get("text")
-        similarity = row.get("score", 0)
         doc_id = row.get("source")
         page = row.get("page")
+        page_end = row.get("page_end")
 
         if content:
             context_chunks.append(content)
-            if isinstance(similarity, (int, float)):
-                similarities.append(similarity)
 
         if doc_id:
-            book_name = get_document_name(doc_id)
+            with stage("query", "name_lookup"):
+                book_name = get_document_name(doc_id)
             
             if not book_name or book_name == "unknown":
                 continue
             parts = [book_name]
             if isinstance(page, int) and page > 0:
-                parts.append(f"page {page}")
+                if isinstance(page_end, int) and page_end > page:
+                    parts.append(f"pages {page}–{page_end}")
+                else:
+                    parts.append(f"page {page}")
             citations.append(" — ".join(parts))
 
     if not context_chunks:
         return {
-            "answer": "Not found in internal documents.",
+            "answer": NOT_FOUND,
             "citations": [],
             "confidence": 0.0
         }
 
-    # confidence score
-    if not similarities:
-        confidence = 0.0
-    else:
-        confidence = max(similarities)
-        confidence = max(0.0, min(1.0, float(confidence)))
+    confidence = context_confidence(retrieved)
 
-    if confidence < 0.2:
-        print("neeche wala confidence")
+    if confidence < CONFIDENCE_GATE:
+        log.debug("confidence %.3f below gate", confidence)
         return {
-            "answer": "Not found in internal documents.",
+            "answer": NOT_FOUND,
             "citations": [],
             "confidence": round(confidence, 2)
         }
@@ -134,7 +226,8 @@ def answer_question(question: str, chat_history: list, document=None):
         question=standalone_question
     )
 
-    response = llm().invoke(prompt)
+    with stage("query", "generate"):
+        response = complete(prompt, "answer")
 
     return {
         "answer": response.content.strip(),
@@ -147,11 +240,11 @@ def answer_question(question: str, chat_history: list, document=None):
 # DOCUMENT SUMMARIZATION
 # ---------------------------------
 
-def summarize_documents(document=None):
-    print("Summarizing document:", document)
+def summarize_documents(document=None, collection: str = DEFAULT_COLLECTION):
+    log.info("summarizing document: %s (collection %s)", document, collection)
     query = supabase.table("chunks").select(
         "text, source"
-    )
+    ).eq("collection", collection)
     if document:
         doc_id = get_doc_id_from_name(document)
         if not doc_id:
@@ -161,7 +254,8 @@ def summarize_documents(document=None):
             }
             
         query = query.eq("source", doc_id)       
-    response = query.limit(15).execute() # limit context for LLM
+    with stage("summarize", "fetch_chunks"):
+        response = query.limit(15).execute() # limit context for LLM
     
 
     if not response.data:
@@ -170,9 +264,11 @@ def summarize_documents(document=None):
             "citations": []
         }
 
+    deleted = get_tombstones()
+    rows = [r for r in response.data if r.get("source") not in deleted]
     chunks = [
         row["text"]
-        for row in response.data
+        for row in rows
         if row.get("text")
     ]
 
@@ -186,13 +282,15 @@ def summarize_documents(document=None):
     context = "\n\n".join(chunks)
     prompt = SUMMARY_PROMPT.format(context=context)
 
-    result = llm().invoke(prompt)
+    with stage("summarize", "generate"):
+        result = complete(prompt, "summarize")
 
     citations = []
 
-    for row in response.data:
+    for row in rows:
         if row.get("source"):
-            citations.append(get_document_name(row["source"]))
+            with stage("summarize", "name_lookup"):
+                citations.append(get_document_name(row["source"]))
 
     return {
         "summary": result.content.strip(),
@@ -0,0 +1,261 @@
+"""Re-embed the corpus with a new model without taking queries offline.
+
+    python -m backend.reindex start bge-base --model BAAI/bge-base-en-v1.5
+    python -m backend.reindex run bge-base --rate 50
+    python -m backend.reindex status
+    python -m backend.reindex cutover bge-base
+
+`run` embeds chunks into chunk_embeddings in throttled batches while
+queries keep using the active version. Progress is stored in
+reindex_jobs after every batch, so an interrupted run resumes where it
+stopped. `cutover` finishes any stragglers, then activates the version
+in one transaction; every backend process switches within
+ACTIVE_VERSION_TTL seconds.
+"""
+import argparse
+import logging
+import os
+import threading
+import time
+from backend.supabase_client import supabase
+from backend.models import EMBEDDING_MODEL, embeddings
+from backend.metrics import stage
+from backend.writer import write_chunks
+from backend.admission import embedding_gate
+from backend.collection import DEFAULT_COLLECTION
+
+log = logging.getLogger(__name__)
+
+LEGACY_VERSION = "legacy"        # chunks.embedding, written by EMBEDDING_MODEL
+ACTIVE_VERSION_TTL = float(os.getenv("ACTIVE_VERSION_TTL", 30))
+REINDEX_BATCH = int(os.getenv("REINDEX_BATCH", 128))
+REINDEX_RATE = float(os.getenv("REINDEX_RATE", 50))   # chunks per second
+
+LEGACY = {"name": LEGACY_VERSION, "model": EMBEDDING_MODEL}
+
+_active = {"version": None, "checked": 0.0}
+_active_lock = threading.Lock()
+
+
+# -----------------------------
+# ACTIVE VERSION
+# -----------------------------
+def active_version():
+    """The index queries and new chunks use: {name, model}.
+
+    Read from index_versions at most every ACTIVE_VERSION_TTL seconds;
+    without an active row (or the table) the legacy column is used.
+    """
+    with _active_lock:
+        if _active["version"] and time.monotonic() - _active["checked"] < ACTIVE_VERSION_TTL:
+            return _active["version"]
+
+    try:
+        rows = (
+            supabase.table("index_versions")
+            .select("name, model")
+            .eq("status", "active")
+            .limit(1)
+            .execute()
+        ).data
+        version = rows[0] if rows else LEGACY
+    except Exception as e:
+        # keep serving from the last known version
+        log.warning("could not read active index version: %s", e)
+        version = _active["version"] or LEGACY
+
+    with _active_lock:
+        if version != _active["version"] and _active["version"]:
+            log.info("index version switched to %s (%s)", version["name"], version["model"])
+        _active["version"] = version
+        _active["checked"] = time.monotonic()
+    return version
+
+
+def embedding_rows(version, chunks, vectors):
+    # chunks: rows with "id" and "collection" (the chunk's partition key)
+    return [
+        {
+            "chunk_id": chunk["id"],
+            "collection": chunk.get("collection", DEFAULT_COLLECTION),
+            "version": version,
+            "embedding": vector,
+        }
+        for chunk, vector in zip(chunks, vectors)
+    ]
+
+
+# -----------------------------
+# JOBS
+# -----------------------------
+def get_job(version):
+    rows = supabase.table("reindex_jobs").select("*").eq("version", version).execute().data
+    return rows[0] if rows else None
+
+
+def update_job(version, **fields):
+    fields["updated_at"] = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+    supabase.table("reindex_jobs").update(fields).eq("version", version).execute()
+
+
+def start(version, model):
+    if version == LEGACY_VERSION:
+        raise ValueError(f"'{LEGACY_VERSION}' is reserved for chunks.embedding")
+
+    dim = len(embeddings(model).embed_query("dimension probe"))
+    total = supabase.table("chunks").select("id", count="exact").limit(1).execute().count or 0
+
+    supabase.table("index_versions").upsert({
+        "name": version, "model": model, "dim": dim, "status": "building",
+    }, on_conflict="name").execute()
+    if not get_job(version):
+        supabase.table("reindex_jobs").insert({
+            "version": version, "status": "running", "total": total,
+        }).execute()
+
+    log.info("created index version %s: %s, %d dims, %d chunks", version, model, dim, total)
+
+
+def pending(version, after, batch):
+    return supabase.rpc("reindex_pending", {
+        "target_version": version,
+        "after_id": after,
+        "batch_size": batch,
+    }).execute().data or []
+
+
+def run(version, rate=REINDEX_RATE, batch=REINDEX_BATCH):
+    """Embed every chunk missing from `version`, resuming from the job's
+    cursor. Returns the number of chunks embedded."""
+    job = get_job(version)
+    if job is None:
+        raise ValueError(f"no re-index job for {version}; run 'start' first")
+
+    model = supabase.table("index_versions").select("model") \
+        .eq("name", version).execute().data[0]["model"]
+    embedder = embeddings(model)
+
+    cursor, done, embedded = job.get("cursor"), job.get("done") or 0, 0
+    update_job(version, status="running", error=None)
+
+    try:
+        while True:
+            started = time.monotonic()
+            rows = pending(version, cursor, batch)
+
+            if not rows:
+                if cursor is None:
+                    break
+                # end of the id range: sweep once more from the start for
+                # chunks ingested behind the cursor while we ran
+                cursor = None
+                continue
+
+            with stage("reindex", "embed"), embedding_gate.background():
+                vectors = embedder.embed_documents([r["text"] for r in rows])
+            with stage("reindex", "insert"):
+                result = write_chunks(
+                    embedding_rows(version, rows, vectors),
+                    table="chunk_embeddings",
+                    on_conflict="chunk_id,version",
+                )
+            if result["failed"]:
+                raise RuntimeError(f"{sum(result['failed'].values())} rows failed to write")
+
+            cursor = rows[-1]["id"]
+            done += len(rows)
+            embedded += len(rows)
+            update_job(version, cursor=cursor, done=done)
+
+            # throttle so ingestion and queries keep their share of the DB
+            pause = len(rows) / rate - (time.monotonic() - started)
+            if pause > 0:
+                time.sleep(pause)
+
+    except Exception as e:
+        update_job(version, status="failed", error=str(e))
+        raise
+
+    update_job(version, status="ready", cursor=None)
+    log.info("index version %s ready: %d chunks embedded this run", version, embedded)
+    return embedded
+
+
+def cutover(version):
+    """Activate `version` after a final catch-up pass."""
+    if version == LEGACY_VERSION:
+        # back to chunks.embedding: retire whatever is active
+        supabase.table("index_versions").update({"status": "retired"}) \
+            .eq("status", "active").execute()
+        log.info("retired the active version; queries use %s", LEGACY_VERSION)
+        missing = supabase.table("chunks").select("id", count="exact") \
+            .is_("embedding", "null").limit(1).execute().count or 0
+        if missing:
+            log.warning("%d chunks were ingested without a legacy vector; re-ingest them", missing)
+        return
+
+    job = get_job(version)
+    if not job or job["status"] not in ("ready", "active"):
+        raise ValueError(f"{version} is not ready (status: {job and job['status']})")
+
+    run(version)
+    supabase.rpc("activate_index_version", {"target_version": version}).execute()
+    log.info("activated %s; waiting %.0fs for backends to switch", version, ACTIVE_VERSION_TTL)
+
+    # chunks written with the old model before every process switched
+    time.sleep(ACTIVE_VERSION_TTL + 5)
+    run(version)
+    update_job(version, status="active")
+
+
+def status():
+    jobs = {j["version"]: j for j in supabase.table("reindex_jobs").select("*").execute().data or []}
+    versions = supabase.table("index_versions").select("*").execute().data or []
+    return [
+        {**v, **{k: jobs.get(v["name"], {}).get(k) for k in ("done", "total", "error", "updated_at")},
+         "job": jobs.get(v["name"], {}).get("status")}
+        for v in versions
+    ]
+
+
+# -----------------------------
+# CLI
+# -----------------------------
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("start", help="register a version and its job")
+    p.add_argument("version")
+    p.add_argument("--model", required=True)
+
+    p = sub.add_parser("run", help="embed missing chunks (resumable)")
+    p.add_argument("version")
+    p.add_argument("--rate", type=float, default=REINDEX_RATE, help="chunks per second")
+    p.add_argument("--batch", type=int, default=REINDEX_BATCH)
+
+    p = sub.add_parser("cutover", help="catch up, then activate")
+    p.add_argument("version")
+
+    sub.add_parser("status")
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    if args.command == "start":
+        start(args.version, args.model)
+    elif args.command == "run":
+        run(args.version, args.rate, args.batch)
+    elif args.command == "cutover":
+        cutover(args.version)
+    else:
+        for row in status():
+            print(
+                f"{row['name']:<16} {row['status']:<9} {row['model']:<32} "
+                f"{row.get('done') or 0}/{row.get('total') or 0} {row.get('job') or ''} "
+                f"{row.get('error') or ''}"
+            )
+
+
+if __name__ == "__main__":
+    main()
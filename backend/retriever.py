@@ -1,53 +1,146 @@
-from functools import lru_cache
+import logging
+import os
+import threading
 from backend.supabase_client import supabase
-from backend.models import embeddings
+from backend.models import EMBEDDING_MODEL, embeddings
+from backend.metrics import stage
+from backend.cache import EmbeddingCache, RetrievalCache, open_store
+from backend.state import get_tombstones
+from backend.reindex import LEGACY_VERSION, active_version
+from backend.admission import embedding_gate
+from backend.collection import DEFAULT_COLLECTION
 
-model = embeddings()
+log = logging.getLogger(__name__)
+
+RETRIEVAL_K = int(os.getenv("RETRIEVAL_K", 10))
 
 
 # -----------------------------
 # CACHE QUERY EMBEDDINGS
 # -----------------------------
-@lru_cache(maxsize=256)
-def embed_query_cached(text: str):
+_store = open_store()
+_query_caches = {}
+_query_caches_lock = threading.Lock()
+retrievals = RetrievalCache(EMBEDDING_MODEL, _store)
+
+
+def query_cache(model):
+    with _query_caches_lock:
+        if model not in _query_caches:
+            _query_caches[model] = EmbeddingCache(model, _store)
+        return _query_caches[model]
+
+
+def embed_query_cached(text: str, model=None):
+    model = model or EMBEDDING_MODEL
     text = text.strip().lower()
-    return tuple(model.embed_query(text))
+    embedder = embeddings(model)
+
+    def compute(value):
+        # ingestion batches yield to us on the shared model
+        with embedding_gate.foreground():
+            return embedder.embed_query(value)
+
+    return query_cache(model).get_or_compute(text, compute)
+
+
+def invalidate_retrievals():
+    # call whenever chunks are added or removed
+    retrievals.bump()
 
 
 # -----------------------------
 # RETRIEVE CHUNKS
 # -----------------------------
-def retrieve_with_score(query: str, document=None, k: int = 10):
+def retrieve_with_score(query: str, document=None, k: int = None,
+                        collection: str = DEFAULT_COLLECTION):
+    k = k or RETRIEVAL_K
     try:
-        query_embedding = list(embed_query_cached(query))
+        # cut over atomically: one version for the embedding, the search
+        # and the cache key of this query
+        version = active_version()
+        cache_key, cached = retrievals.get(
+            version["name"], collection, query.strip().lower(), document, k
+        )
+        if cached is not None:
+            return drop_tombstoned(cached)
+
+        with stage("query", "embed"):
+            query_embedding = list(embed_query_cached(query, version["model"]))
         query_embedding = [float(x) for x in query_embedding]
         params = {
             "query_embedding": query_embedding,
-            "match_count": k
+            "match_count": k,
+            # the partition key: only this collection's index is searched
+            "filter_collection": collection,
         }
+        rpc = "match_embeddings"
+        if version["name"] != LEGACY_VERSION:
+            rpc = "match_embeddings_version"
+            params["target_version"] = version["name"]
         
         if document:
             params["filter_source"] = document
-        print("Retrieval params:", document)
-        response = supabase.rpc(
-            "match_embeddings",
-            params
-        ).execute()
+        log.debug("retrieval filter: %s", document)
+        with stage("query", "retrieve"):
+            response = supabase.rpc(
+                rpc,
+                params
+            ).execute()
 
         if not response.data:
             return []
-        print("Raw retrieval response:", response.data)
+        log.debug("retrieved %d rows", len(response.data))
         results = []
         for r in response.data:
             results.append({
+                "id": r.get("id"),
                 "text": r.get("text"),
                 "source": r.get("source"),     # document id
                 "page": r.get("page", 1),
+                "page_end": r.get("page_end"),
                 "score": r.get("score", 0.0)
             })
 
-        return results
+        retrievals.put(cache_key, results)
+        return drop_tombstoned(results)
 
     except Exception as e:
-        print("Retrieval error:", e)
-        return []
\ No newline at end of file
+        log.error("retrieval error: %s", e)
+        return []
+
+
+def drop_tombstoned(rows):
+    # match_embeddings already skips deleted documents (migration 003);
+    # this covers the moment between the tombstone and the cache bump
+    deleted = get_tombstones()
+    if not deleted:
+        return rows
+    return [r for r in rows if r.get("source") not in deleted]
+
+
+# -----------------------------
+# FETCH KNOWN CHUNKS
+# -----------------------------
+def fetch_chunks(refs):
+    """Rehydrate previously retrieved rows (id, source, page, page_end,
+    score) with their text by primary key, skipping the vector search.
+    Rows whose chunk no longer exists are dropped."""
+    ids = [r["id"] for r in refs if r.get("id")]
+    if not ids:
+        return []
+
+    try:
+        with stage("query", "fetch_chunks"):
+            response = supabase.table("chunks") \
+                .select("id, text") \
+                .in_("id", ids) \
+                .execute()
+    except Exception as e:
+        log.error("chunk fetch error: %s", e)
+        return []
+
+    texts = {r["id"]: r.get("text") for r in response.data or []}
+    return drop_tombstoned(
+        [dict(r, text=texts[r["id"]]) for r in refs if r.get("id") in texts]
+    )
\ No newline at end of file
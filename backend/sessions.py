@@ -0,0 +1,130 @@
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+SESSION_TTL = float(os.getenv("SESSION_TTL", 3600))
+SESSION_MAX_MB = float(os.getenv("SESSION_MAX_MB", 64))
+SESSION_MAX_TURNS = int(os.getenv("SESSION_MAX_TURNS", 20))
+
+
+def turn_size(turn):
+    # rough bytes held by one turn: its strings plus the retrieved refs
+    text = sum(len(v) for v in turn.values() if isinstance(v, str))
+    return 200 + text + 160 * len(turn.get("retrieved") or ())
+
+
+class Session:
+
+    def __init__(self, session_id):
+        self.id = session_id
+        self.turns = []
+        self.size = 0
+        self.touched = time.monotonic()
+
+
+# -----------------------------
+# SESSION STORE
+# -----------------------------
+class SessionStore:
+    """Conversation turns per session id, kept in process memory.
+
+    Each turn holds the user's question, the standalone question it was
+    rewritten to, the answer, the document scope and the retrieved chunk
+    ids with their scores and pages, so follow-ups neither resend history
+    nor redo work already done. Sessions idle for `ttl` seconds are
+    dropped, and the least recently used go first once `max_bytes` is hit.
+    """
+
+    def __init__(self, ttl=SESSION_TTL, max_bytes=SESSION_MAX_MB * 1024 * 1024,
+                 max_turns=SESSION_MAX_TURNS):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.max_turns = max_turns
+        self.sessions = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+
+    def _expire(self):
+        cutoff = time.monotonic() - self.ttl
+        while self.sessions:
+            oldest = next(iter(self.sessions.values()))
+            if oldest.touched >= cutoff and self.size <= self.max_bytes:
+                break
+            self._drop(oldest.id)
+
+    def _drop(self, session_id):
+        session = self.sessions.pop(session_id, None)
+        if session:
+            self.size -= session.size
+
+    def open(self, session_id=None):
+        """Return the id of a live session, creating it if needed."""
+        with self.lock:
+            self._expire()
+            session_id = session_id or uuid.uuid4().hex
+            if session_id not in self.sessions:
+                self.sessions[session_id] = Session(session_id)
+            self.sessions.move_to_end(session_id)
+            self.sessions[session_id].touched = time.monotonic()
+            return session_id
+
+    def exists(self, session_id):
+        """False for ids this process never saw or already expired: the
+        store is per process, so a restart or another worker loses them."""
+        with self.lock:
+            self._expire()
+            return session_id in self.sessions
+
+    def resume(self, chat_history):
+        """Open a new session seeded with a client's (question, answer)
+        history, for a session this process no longer has."""
+        session_id = self.open()
+        for question, answer in chat_history[-self.max_turns:]:
+            self.append(session_id, {
+                "question": question,
+                "standalone": question,
+                "answer": answer,
+                "doc_id": None,
+                "retrieved": [],
+            })
+        return session_id
+
+    def turns(self, session_id):
+        with self.lock:
+            session = self.sessions.get(session_id)
+            return list(session.turns) if session else []
+
+    def append(self, session_id, turn):
+        with self.lock:
+            session = self.sessions.get(session_id)
+            if session is None:
+                session = self.sessions[session_id] = Session(session_id)
+
+            size = turn_size(turn)
+            session.turns.append(turn)
+            session.size += size
+            self.size += size
+
+            while len(session.turns) > self.max_turns:
+                dropped = turn_size(session.turns.pop(0))
+                session.size -= dropped
+                self.size -= dropped
+
+            session.touched = time.monotonic()
+            self.sessions.move_to_end(session_id)
+            self._expire()
+
+    def delete(self, session_id):
+        with self.lock:
+            existed = session_id in self.sessions
+            self._drop(session_id)
+            return existed
+
+    def stats(self):
+        with self.lock:
+            return {"sessions": len(self.sessions), "bytes": self.size}
+
+
+sessions = SessionStore()
@@ -0,0 +1,346 @@
+"""Export the corpus to a snapshot file and restore it without re-embedding.
+
+    python -m backend.snapshot export corpus.snap --float16 --files
+    python -m backend.snapshot import corpus.snap --workers 4
+
+A snapshot is a zip holding manifest.json, documents.jsonl, chunk shards
+as .npz (ids, document index, pages, UTF-8 text blob + offsets, one
+(n, dim) embedding matrix) and, with --files, the raw uploads. Shards are
+restored in parallel, one shard in memory per worker, through the bulk
+writer. Re-running an import is safe: rows are upserted by id.
+"""
+import argparse
+import contextvars
+import io
+import json
+import logging
+import os
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from backend.supabase_client import supabase
+from backend.utils import iter_documents
+from backend.writer import write_chunks
+from backend.reindex import LEGACY_VERSION, active_version, embedding_rows
+from backend.collection import DEFAULT_COLLECTION, create_collection, list_collections
+
+log = logging.getLogger(__name__)
+
+FORMAT = 1
+BUCKET_NAME = "documents"
+SNAPSHOT_SHARD = int(os.getenv("SNAPSHOT_SHARD", 50000))      # chunks per shard
+SNAPSHOT_WORKERS = int(os.getenv("SNAPSHOT_WORKERS", 4))      # shards restored at once
+EXPORT_PAGE = 1000       # rows per select; keyset-paged on id
+DOCUMENT_BATCH = 500
+
+
+# -----------------------------
+# ENCODING
+# -----------------------------
+def decode_vector(value):
+    # PostgREST returns pgvector columns as "[0.1,0.2,...]"
+    if isinstance(value, str):
+        return np.fromstring(value.strip("[]"), sep=",", dtype=np.float32)
+    return np.asarray(value, dtype=np.float32)
+
+
+def pack_shard(rows, dtype):
+    texts = [r["text"].encode("utf-8") for r in rows]
+    offsets = np.zeros(len(texts) + 1, dtype=np.int64)
+    np.cumsum([len(t) for t in texts], out=offsets[1:])
+
+    buf = io.BytesIO()
+    np.savez_compressed(
+        buf,
+        id=np.array([r["id"] for r in rows], dtype="S36"),
+        doc=np.array([r["doc"] for r in rows], dtype=np.int32),
+        page=np.array([-1 if r["page"] is None else r["page"] for r in rows], dtype=np.int32),
+        page_end=np.array([-1 if r["page_end"] is None else r["page_end"] for r in rows], dtype=np.int32),
+        text=np.frombuffer(b"".join(texts), dtype=np.uint8),
+        text_offsets=offsets,
+        embedding=np.stack([r["embedding"] for r in rows]).astype(dtype),
+    )
+    return buf.getvalue()
+
+
+def unpack_shard(data):
+    arrays = np.load(io.BytesIO(data))
+    text, offsets = arrays["text"].tobytes(), arrays["text_offsets"]
+    page, page_end = arrays["page"], arrays["page_end"]
+    for i, chunk_id in enumerate(arrays["id"]):
+        yield {
+            "id": chunk_id.decode(),
+            "doc": int(arrays["doc"][i]),
+            "page": None if page[i] < 0 else int(page[i]),
+            "page_end": None if page_end[i] < 0 else int(page_end[i]),
+            "text": text[offsets[i]:offsets[i + 1]].decode("utf-8"),
+            "embedding": arrays["embedding"][i],
+        }
+
+
+# -----------------------------
+# EXPORT
+# -----------------------------
+def iter_chunks(version):
+    """Chunks in id order with the active version's vectors."""
+    cursor = None
+    while True:
+        query = supabase.table("chunks").select("id, source, page, page_end, text, embedding")
+        if cursor:
+            query = query.gt("id", cursor)
+        rows = query.order("id").limit(EXPORT_PAGE).execute().data or []
+        if not rows:
+            return
+
+        if version["name"] != LEGACY_VERSION:
+            # same id range from the versioned table
+            query = (
+                supabase.table("chunk_embeddings")
+                .select("chunk_id, embedding")
+                .eq("version", version["name"])
+                .gte("chunk_id", rows[0]["id"])
+                .lte("chunk_id", rows[-1]["id"])
+            )
+            vectors = {r["chunk_id"]: r["embedding"] for r in query.execute().data or []}
+            for row in rows:
+                row["embedding"] = vectors.get(row["id"])
+
+        yield from rows
+        cursor = rows[-1]["id"]
+
+
+def export_snapshot(path, shard_size=SNAPSHOT_SHARD, dtype="float32", include_files=False):
+    start = time.perf_counter()
+    version = active_version()
+    documents = list(iter_documents(live=True))
+    index = {d["id"]: i for i, d in enumerate(documents)}
+    shards, shard, skipped, dim = [], [], 0, None
+
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as zf:
+        def flush():
+            name = f"chunks/{len(shards):05d}.npz"
+            # already compressed; store as is
+            zf.writestr(name, pack_shard(shard, dtype), compress_type=zipfile.ZIP_STORED)
+            shards.append({"name": name, "chunks": len(shard)})
+            log.info("wrote %s (%d chunks)", name, len(shard))
+            shard.clear()
+
+        for row in iter_chunks(version):
+            if row["source"] not in index or row["embedding"] is None:
+                skipped += 1
+                continue
+            vector = decode_vector(row["embedding"])
+            dim = dim or len(vector)
+            shard.append({**row, "doc": index[row["source"]], "embedding": vector})
+            if len(shard) >= shard_size:
+                flush()
+        if shard:
+            flush()
+
+        zf.writestr("documents.jsonl", "".join(json.dumps(d, default=str) + "\n" for d in documents))
+
+        if include_files:
+            bucket = supabase.storage.from_(BUCKET_NAME)
+            for d in documents:
+                if not d.get("storage_path"):
+                    continue
+                try:
+                    zf.writestr(f"files/{d['storage_path']}", bucket.download(d["storage_path"]))
+                except Exception as e:
+                    log.warning("could not export file %s: %s", d["storage_path"], e)
+
+        manifest = {
+            "format": FORMAT,
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "model": version["model"],
+            "version": version["name"],
+            "dim": dim,
+            "dtype": dtype,
+            "documents": len(documents),
+            "chunks": sum(s["chunks"] for s in shards),
+            "shards": shards,
+            "files": include_files,
+            "collections": [
+                {"name": c["name"], "max_documents": c.get("max_documents")}
+                for c in list_collections()
+            ],
+        }
+        zf.writestr("manifest.json", json.dumps(manifest, indent=2))
+
+    if skipped:
+        log.warning("skipped %d chunks of deleted documents or without a vector", skipped)
+    log.info(
+        "exported %d documents, %d chunks to %s in %.1fs",
+        manifest["documents"], manifest["chunks"], path, time.perf_counter() - start
+    )
+    return manifest
+
+
+# -----------------------------
+# IMPORT
+# -----------------------------
+def import_documents(documents):
+    """Upsert document rows, leaving out ones whose file already exists in
+    their collection under another id. Returns the set of skipped snapshot
+    indexes."""
+    live = {
+        (d.get("collection") or DEFAULT_COLLECTION, d["file_hash"]): d["id"]
+        for d in iter_documents("id, file_hash, collection", live=True)
+    }
+    skipped, rows = set(), []
+    for i, d in enumerate(documents):
+        key = (d.get("collection") or DEFAULT_COLLECTION, d.get("file_hash"))
+        if live.get(key, d["id"]) != d["id"]:
+            skipped.add(i)
+            continue
+        # near_duplicate_of may point at a later row; set it afterwards
+        rows.append({k: v for k, v in d.items() if k != "near_duplicate_of"})
+
+    for i in range(0, len(rows), DOCUMENT_BATCH):
+        supabase.table("documents").upsert(rows[i:i + DOCUMENT_BATCH], on_conflict="id").execute()
+
+    # only link to documents that exist here
+    present = set(live.values()) | {r["id"] for r in rows}
+    for i, d in enumerate(documents):
+        if i not in skipped and d.get("near_duplicate_of") in present:
+            supabase.table("documents").update({"near_duplicate_of": d["near_duplicate_of"]}) \
+                .eq("id", d["id"]).execute()
+    return skipped
+
+
+def import_shard(zf, shard, documents, skipped, version):
+    rows = [r for r in unpack_shard(zf.read(shard["name"])) if r["doc"] not in skipped]
+    legacy = version["name"] == LEGACY_VERSION
+    records = [
+        {
+            "id": r["id"],
+            "source": documents[r["doc"]]["id"],
+            "collection": documents[r["doc"]].get("collection") or DEFAULT_COLLECTION,
+            "page": r["page"],
+            "page_end": r["page_end"],
+            "text": r["text"],
+            "embedding": r["embedding"] if legacy else None,
+        }
+        for r in rows
+    ]
+    result = write_chunks(records, on_conflict="collection,id")
+    written, failed = result["written"], sum(result["failed"].values())
+    if not legacy and written:
+        # vectors reference their chunk (FK): only for chunks that landed
+        landed = [
+            (record, r["embedding"]) for record, r in zip(records, rows)
+            if record["id"] not in result["failed_ids"]
+        ]
+        vectors = write_chunks(
+            embedding_rows(version["name"], [c for c, _ in landed], [v for _, v in landed]),
+            table="chunk_embeddings",
+            on_conflict="chunk_id,version",
+        )
+        # restored without a vector: not searchable until a re-run fills it
+        lost = len(vectors["failed_ids"])
+        written, failed = written - lost, failed + lost
+    log.info("restored %s: %d/%d chunks", shard["name"], written, len(records))
+    return written, failed
+
+
+def import_snapshot(path, workers=SNAPSHOT_WORKERS, include_files=True):
+    start = time.perf_counter()
+    with zipfile.ZipFile(path) as zf:
+        manifest = json.loads(zf.read("manifest.json"))
+        if manifest.get("format") != FORMAT:
+            raise ValueError(f"unsupported snapshot format {manifest.get('format')}")
+
+        # vectors are only comparable with queries embedded by the same model
+        version = active_version()
+        if manifest["model"] != version["model"]:
+            raise ValueError(
+                f"snapshot was embedded with {manifest['model']}, "
+                f"this index uses {version['model']}; re-index one side first"
+            )
+
+        # partitions must exist before their chunks arrive
+        for c in manifest.get("collections", []):
+            if c["name"] != DEFAULT_COLLECTION:
+                create_collection(c["name"], c.get("max_documents"))
+
+        with zf.open("documents.jsonl") as f:
+            documents = [json.loads(line) for line in f]
+        skipped = import_documents(documents)
+        if skipped:
+            log.info("skipping %d documents already present", len(skipped))
+
+        if include_files and manifest.get("files"):
+            bucket = supabase.storage.from_(BUCKET_NAME)
+            bundled = set(zf.namelist())
+            for i, d in enumerate(documents):
+                name = f"files/{d.get('storage_path')}"
+                if i not in skipped and name in bundled:
+                    bucket.upload(
+                        path=d["storage_path"],
+                        file=zf.read(name),
+                        file_options={"upsert": "true"},
+                    )
+
+        # each worker holds one decoded shard at a time
+        ctx = contextvars.copy_context()
+        written = failed = 0
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for ok, lost in executor.map(
+                lambda s: ctx.copy().run(import_shard, zf, s, documents, skipped, version),
+                manifest["shards"],
+            ):
+                written += ok
+                failed += lost
+
+    # cached retrievals in running backends predate the restore
+    from backend.retriever import invalidate_retrievals
+    invalidate_retrievals()
+
+    elapsed = time.perf_counter() - start
+    log.info(
+        "imported %d documents, %d chunks (%d failed) in %.1fs",
+        len(documents) - len(skipped), written, failed, elapsed
+    )
+    return {
+        "documents": len(documents) - len(skipped),
+        "skipped_documents": len(skipped),
+        "chunks": written,
+        "failed_chunks": failed,
+        "seconds": elapsed,
+    }
+
+
+# -----------------------------
+# CLI
+# -----------------------------
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("export", help="write documents and chunks to a snapshot")
+    p.add_argument("path")
+    p.add_argument("--shard-size", type=int, default=SNAPSHOT_SHARD)
+    p.add_argument("--float16", action="store_true", help="halve vector size (~3 significant digits)")
+    p.add_argument("--files", action="store_true", help="include the uploaded files")
+
+    p = sub.add_parser("import", help="restore a snapshot (idempotent)")
+    p.add_argument("path")
+    p.add_argument("--workers", type=int, default=SNAPSHOT_WORKERS)
+    p.add_argument("--no-files", action="store_true", help="skip uploading bundled files")
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    if args.command == "export":
+        export_snapshot(
+            args.path, args.shard_size,
+            dtype="float16" if args.float16 else "float32",
+            include_files=args.files,
+        )
+    else:
+        print(json.dumps(import_snapshot(args.path, args.workers, not args.no_files), indent=2))
+
+
+if __name__ == "__main__":
+    main()
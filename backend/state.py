@@ -1,7 +1,131 @@
+import asyncio
+import json
+import threading
+from collections import deque
+
 ingestion_status = {"state": "idle"}
 
-def set_ingestion_status(state: str):
+def set_ingestion_status(state: str, **progress):
+    if state == "running" and ingestion_status.get("state") != "running":
+        # new job: drop the previous job's counters
+        ingestion_status.clear()
     ingestion_status["state"] = state
+    ingestion_status.update(progress)
+    events.publish("ingestion", dict(ingestion_status))
+
+def update_ingestion_progress(**progress):
+    ingestion_status.update(progress)
+    events.publish("ingestion", dict(ingestion_status))
 
 def get_ingestion_status():
-    return ingestion_status
\ No newline at end of file
+    return ingestion_status
+
+readiness = {"state": "starting", "error": None}
+
+def set_readiness(state: str, error: str | None = None):
+    readiness["state"] = state
+    readiness["error"] = error
+
+def get_readiness():
+    return readiness
+
+
+# -----------------------------
+# DOCUMENT CATALOG VERSION
+# -----------------------------
+catalog = {"version": 0}
+_catalog_lock = threading.Lock()
+
+def bump_catalog(change: str, doc_id=None, **fields):
+    # clients cache the document list by this version
+    with _catalog_lock:
+        catalog["version"] += 1
+        version = catalog["version"]
+    events.publish("catalog", {"version": version, "change": change, "doc_id": doc_id, **fields})
+
+def get_catalog_version():
+    return catalog["version"]
+
+
+# -----------------------------
+# TOMBSTONED DOCUMENTS
+# -----------------------------
+# ids deleted but not yet cleaned up (backend/cleanup.py)
+tombstones = set()
+_tombstone_lock = threading.Lock()
+
+def add_tombstones(doc_ids):
+    with _tombstone_lock:
+        tombstones.update(doc_ids)
+
+def discard_tombstone(doc_id):
+    with _tombstone_lock:
+        tombstones.discard(doc_id)
+
+def get_tombstones():
+    with _tombstone_lock:
+        return set(tombstones)
+
+
+# -----------------------------
+# EVENT BUS
+# -----------------------------
+class EventBus:
+    """Fan-out of state changes to server-sent-event subscribers.
+
+    Publishers are plain threads (ingestion, request handlers); each
+    subscriber is an asyncio queue drained by its /events response. The
+    last `history` events are kept so a reconnecting client can resume
+    from its Last-Event-ID. A subscriber that falls `max_pending` events
+    behind is cut off and resumes on reconnect.
+    """
+
+    def __init__(self, history=256, max_pending=512):
+        self.history = deque(maxlen=history)
+        self.max_pending = max_pending
+        self.last_id = 0
+        self.subscribers = set()
+        self.lock = threading.Lock()
+
+    def publish(self, name, data):
+        with self.lock:
+            self.last_id += 1
+            event = (self.last_id, name, data)
+            self.history.append(event)
+            subscribers = list(self.subscribers)
+
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(self._offer, queue, event)
+            except RuntimeError:
+                # loop already closed
+                self.subscribers.discard((loop, queue))
+
+    def _offer(self, queue, event):
+        if queue.qsize() >= self.max_pending:
+            queue.put_nowait(None)
+        else:
+            queue.put_nowait(event)
+
+    def subscribe(self, last_event_id=None):
+        """Register the running loop; returns (queue, replay events or
+        None when the client must start from a snapshot)."""
+        queue = asyncio.Queue()
+        subscriber = (asyncio.get_running_loop(), queue)
+        with self.lock:
+            self.subscribers.add(subscriber)
+            replay = None
+            if last_event_id is not None and self.history and last_event_id >= self.history[0][0] - 1:
+                replay = [e for e in self.history if e[0] > last_event_id]
+        return subscriber, replay
+
+    def unsubscribe(self, subscriber):
+        with self.lock:
+            self.subscribers.discard(subscriber)
+
+
+def format_event(event_id, name, data):
+    return f"id: {event_id}\nevent: {name}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+events = EventBus()
@@ -1,6 +1,6 @@
 import os
+import threading
 from dotenv import load_dotenv
-from supabase import create_client, Client
 
 
 # ---------------------------------
@@ -8,28 +8,47 @@ from supabase import create_client, Client
 # ---------------------------------
 load_dotenv()
 
-
-# ---------------------------------
-# ENV VALIDATION
-# ---------------------------------
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 
-if not SUPABASE_URL:
-    raise RuntimeError("SUPABASE_URL environment variable not set")
-
-if not SUPABASE_KEY:
-    raise RuntimeError("SUPABASE_KEY environment variable not set")
-
 
 # ---------------------------------
 # CLIENT INITIALIZATION
 # ---------------------------------
-def create_supabase_client() -> Client:
+def create_supabase_client():
+    if not SUPABASE_URL:
+        raise RuntimeError("SUPABASE_URL environment variable not set")
+
+    if not SUPABASE_KEY:
+        raise RuntimeError("SUPABASE_KEY environment variable not set")
+
+    from supabase import create_client
     return create_client(SUPABASE_URL, SUPABASE_KEY)
 
 
 # ---------------------------------
-# GLOBAL CLIENT (singleton)
+# GLOBAL CLIENT (lazy singleton)
 # ---------------------------------
-supabase: Client = create_supabase_client()
\ No newline at end of file
+_client = None
+_lock = threading.Lock()
+
+
+def get_supabase():
+    global _client
+
+    if _client is None:
+        with _lock:
+            if _client is None:
+                _client = create_supabase_client()
+
+    return _client
+
+
+class _LazyClient:
+    # keeps `from backend.supabase_client import supabase` working while
+    # deferring the import and connection setup to the first call
+    def __getattr__(self, name):
+        return getattr(get_supabase(), name)
+
+
+supabase = _LazyClient()
@@ -1,15 +1,55 @@
 from backend.supabase_client import supabase
+from backend.state import bump_catalog
+from backend.collection import DEFAULT_COLLECTION
 import hashlib
-def list_documents():
+import logging
+
+log = logging.getLogger(__name__)
+
+DOCUMENT_PAGE = 1000    # PostgREST truncates unpaged selects at max-rows (1000 by default)
+
+def iter_documents(columns="*", live=False, **filters):
+    """Every document row (only non-deleted ones when `live`) matching the
+    column=value `filters`, keyset-paged on id. `columns` must include id."""
+    cursor = None
+    while True:
+        query = supabase.table("documents").select(columns)
+        if live:
+            query = query.neq("status", "deleted")
+        for column, value in filters.items():
+            query = query.eq(column, value)
+        if cursor:
+            query = query.gt("id", cursor)
+        rows = query.order("id").limit(DOCUMENT_PAGE).execute().data or []
+        yield from rows
+        if len(rows) < DOCUMENT_PAGE:
+            return
+        cursor = rows[-1]["id"]
+
+def list_documents(collection=DEFAULT_COLLECTION):
     res = (
         supabase
         .table("documents")
-        .select("id, name, storage_path")
+        .select("id, name, storage_path, status, near_duplicate_of")
+        .eq("collection", collection)
+        .neq("status", "deleted")
         .order("name", desc=False)
         .execute()
     )
     return res.data or []
 
+def set_document_status(doc_id, status):
+    try:
+        (supabase.table("documents")
+            .update({"status": status})
+            .eq("id", doc_id)
+            .neq("status", "deleted")   # never resurrect a tombstone
+            .execute()
+        )
+        bump_catalog("status", doc_id, status=status)
+    except Exception as e:
+        log.error("status update failed for %s: %s", doc_id, e)
+
 def file_hash(data: bytes):
     return hashlib.sha256(data).hexdigest()
 
@@ -17,6 +57,7 @@ def get_doc_id_from_name(name):
     res = (supabase.table("documents") 
         .select("id") 
         .eq("storage_path", name) 
+        .neq("status", "deleted") 
         .limit(1) 
         .execute()
     )
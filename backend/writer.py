@@ -0,0 +1,176 @@
+import contextvars
+import json
+import logging
+import random
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from backend.supabase_client import supabase
+from backend.profiling import profiled
+
+log = logging.getLogger(__name__)
+
+MAX_BATCH_ROWS = 1000
+MAX_PAYLOAD_BYTES = 2 * 1024 * 1024   # stay well under the PostgREST body limit
+INSERT_WORKERS = 3
+MAX_RETRIES = 5
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 8.0
+
+# a retried batch may already have committed (ambiguous timeout), so every
+# write is an upsert on the table's key; chunks are keyed per partition
+CONFLICT_KEYS = {
+    "chunks": "collection,id",
+    "chunk_embeddings": "chunk_id,version",
+}
+
+
+# -----------------------------
+# VECTOR ENCODING
+# -----------------------------
+def encode_vector(vector):
+    # pgvector text literal; 6 significant digits is lossless enough for
+    # normalized float32 embeddings and roughly halves the JSON payload.
+    return "[" + ",".join(f"{float(x):.6g}" for x in vector) + "]"
+
+
+def encode_record(record):
+    row = dict(record)
+    if row.get("embedding") is not None:
+        row["embedding"] = encode_vector(row["embedding"])
+    return row
+
+
+# -----------------------------
+# ADAPTIVE BATCHING
+# -----------------------------
+def plan_batches(rows, max_rows=MAX_BATCH_ROWS, max_bytes=MAX_PAYLOAD_BYTES):
+    batches = []
+    batch, size = [], 2
+
+    for row in rows:
+        row_size = len(json.dumps(row)) + 1
+
+        if batch and (len(batch) >= max_rows or size + row_size > max_bytes):
+            batches.append(batch)
+            batch, size = [], 2
+
+        batch.append(row)
+        size += row_size
+
+    if batch:
+        batches.append(batch)
+
+    return batches
+
+
+def is_payload_error(error):
+    message = str(error).lower()
+    return "413" in message or "too large" in message or "payload" in message
+
+
+def is_transient(error):
+    """Timeouts, dropped connections, 5xx and 429 may succeed on a retry;
+    other 4xx (constraint violations, bad rows) fail the same way again."""
+    response = getattr(error, "response", None)
+    status = getattr(error, "status_code", None) or getattr(response, "status_code", None)
+    if isinstance(status, int):
+        return status == 429 or status >= 500
+
+    # Postgres SQLSTATE from PostgREST: connection (08), serialization or
+    # deadlock (40), resources (53), statement timeout / shutdown (57)
+    code = str(getattr(error, "code", "") or "")
+    if len(code) == 3 and code.isdigit():
+        return code == "429" or code >= "500"
+    if code:
+        return code[:2] in ("08", "40", "53", "57")
+
+    message = str(error).lower()
+    return any(s in message for s in (
+        "timeout", "timed out", "connection", "temporarily", "429", "502", "503", "504",
+    ))
+
+
+# -----------------------------
+# INSERT WITH RETRY
+# -----------------------------
+def insert_batch(table, batch, on_conflict=None):
+    """Write one batch, halving it on payload errors and backing off on
+    transient ones. With `on_conflict` (or a known key for `table`) the
+    batch is upserted, so retrying a write that did commit is harmless.
+    Returns the rows that could not be written."""
+    on_conflict = on_conflict or CONFLICT_KEYS.get(table)
+    for attempt in range(MAX_RETRIES):
+        try:
+            if on_conflict:
+                supabase.table(table).upsert(batch, on_conflict=on_conflict).execute()
+            else:
+                supabase.table(table).insert(batch).execute()
+            return []
+
+        except Exception as e:
+            if is_payload_error(e) and len(batch) > 1:
+                mid = len(batch) // 2
+                return (
+                    insert_batch(table, batch[:mid], on_conflict)
+                    + insert_batch(table, batch[mid:], on_conflict)
+                )
+
+            log.warning("insert error (attempt %d/%d): %s", attempt + 1, MAX_RETRIES, e)
+            if not is_transient(e) or attempt + 1 == MAX_RETRIES:
+                break
+
+            delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt)
+            delay *= random.uniform(0.5, 1.0)
+            time.sleep(delay)
+
+    return batch
+
+
+# -----------------------------
+# BULK WRITER
+# -----------------------------
+def write_chunks(records, table="chunks", workers=INSERT_WORKERS, on_conflict=None):
+    """Bulk insert chunk records.
+
+    Returns counts of written rows and of failed rows per `source` (per
+    `chunk_id` for rows without one), so the caller can mark documents as
+    partial or failed, and the ids of the failed rows (`id`, or `chunk_id`
+    for chunk_embeddings) so nothing is written against them.
+    """
+    start = time.perf_counter()
+    rows = [encode_record(r) for r in records]
+    batches = plan_batches(rows)
+
+    failed = Counter()
+    failed_ids = set()
+
+    # keep the job's request id on worker-thread log lines
+    ctx = contextvars.copy_context()
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for lost in executor.map(
+            lambda b: ctx.copy().run(profiled, insert_batch, table, b, on_conflict), batches
+        ):
+            for row in lost:
+                # chunk_embeddings rows have no source; key them by chunk
+                failed[row.get("source") or row.get("chunk_id")] += 1
+                failed_ids.add(row.get("id") or row.get("chunk_id"))
+
+    elapsed = time.perf_counter() - start
+    written = len(rows) - sum(failed.values())
+    rate = written / elapsed if elapsed > 0 else 0.0
+
+    log.info(
+        "inserted %d/%d rows in %d batches (%.2fs, %.0f rows/sec)",
+        written, len(rows), len(batches), elapsed, rate
+    )
+
+    return {
+        "written": written,
+        "failed": failed,
+        "failed_ids": failed_ids,
+        "batches": len(batches),
+        "seconds": elapsed,
+        "rows_per_sec": rate,
+    }
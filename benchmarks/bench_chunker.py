@@ -0,0 +1,196 @@
+"""Structure-aware chunker vs RecursiveCharacterTextSplitter(800, 250).
+
+Builds a synthetic multi-page corpus with planted facts (some split across
+a page break), chunks it both ways and reports chunk count, embedded
+tokens and recall@k of the chunk holding each fact. Retrieval uses the
+real embedding model with --embed, otherwise TF-IDF cosine.
+
+    python -m benchmarks.bench_chunker --docs 20 --embed
+"""
+import argparse
+import json
+import math
+import os
+import random
+import re
+from collections import Counter
+
+os.environ.setdefault("GROQ_API_KEY", "offline-benchmark")
+
+from langchain_core.documents import Document
+from backend.chunker import chunk_documents, count_tokens
+from benchmarks.corpus import CODENAMES
+
+FILLER = (
+    "quarterly operations review covered staffing vendor contracts facility "
+    "maintenance training schedules compliance audits travel policy budget "
+    "forecasts hiring plans infrastructure upgrades customer feedback"
+).split()
+
+
+# -----------------------------
+# SYNTHETIC CORPUS
+# -----------------------------
+def filler_sentence(rng):
+    words = [rng.choice(FILLER) for _ in range(rng.randint(10, 22))]
+    return " ".join(words).capitalize() + "."
+
+
+def make_document(rng, doc_index, pages=6, facts=4):
+    sentences = [filler_sentence(rng) for _ in range(pages * 24)]
+    planted = []
+
+    for i in range(facts):
+        name = f"{rng.choice(CODENAMES)}-{doc_index}-{i}"
+        value = rng.randint(1000, 99999)
+        fact = f"The {name} initiative was approved with a budget of {value} dollars."
+        sentences.insert(rng.randrange(len(sentences)), fact)
+        planted.append({
+            "question": f"What budget was approved for the {name} initiative?",
+            "needles": [name, str(value)],
+        })
+
+    per_page = math.ceil(len(sentences) / pages)
+    texts = []
+    for p in range(pages):
+        body = sentences[p * per_page:(p + 1) * per_page]
+        paragraphs = [" ".join(body[j:j + 4]) for j in range(0, len(body), 4)]
+        texts.append("\n\n".join(paragraphs))
+
+    pages_docs = [
+        Document(page_content=t, metadata={"page": i + 1})
+        for i, t in enumerate(texts)
+    ]
+    return pages_docs, planted
+
+
+def make_corpus(rng, docs):
+    corpus, questions = [], []
+    for d in range(docs):
+        pages, planted = make_document(rng, d)
+        # one extra fact straddles a page break, as PDF extraction often does
+        name, value = f"{rng.choice(CODENAMES)}-{d}-x", rng.randint(1000, 99999)
+        pages[0].page_content += f" The {name} initiative was approved"
+        pages[1].page_content = (
+            f"with a budget of {value} dollars. " + pages[1].page_content
+        )
+        planted.append({
+            "question": f"What budget was approved for the {name} initiative?",
+            "needles": [name, str(value)],
+        })
+        corpus.append(pages)
+        questions.extend(planted)
+    return corpus, questions
+
+
+# -----------------------------
+# CHUNKERS
+# -----------------------------
+def chunk_baseline(corpus):
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+    splitter = RecursiveCharacterTextSplitter(chunk_size=800, chunk_overlap=250)
+    return [c.page_content for pages in corpus for c in splitter.split_documents(pages)]
+
+
+def chunk_structured(corpus):
+    return [c.page_content for pages in corpus for c in chunk_documents(pages)]
+
+
+# -----------------------------
+# RETRIEVAL
+# -----------------------------
+def tfidf_ranker(chunks):
+    tokenize = lambda t: re.findall(r"[a-z0-9-]+", t.lower())
+    docs = [Counter(tokenize(c)) for c in chunks]
+    df = Counter(w for d in docs for w in d)
+    idf = {w: math.log(len(docs) / n) + 1 for w, n in df.items()}
+
+    def vec(counts):
+        v = {w: c * idf.get(w, 0.0) for w, c in counts.items()}
+        norm = math.sqrt(sum(x * x for x in v.values())) or 1.0
+        return {w: x / norm for w, x in v.items()}
+
+    vectors = [vec(d) for d in docs]
+
+    def rank(question):
+        q = vec(Counter(tokenize(question)))
+        scores = [sum(q[w] * v.get(w, 0.0) for w in q) for v in vectors]
+        return sorted(range(len(chunks)), key=lambda i: -scores[i])
+
+    return rank
+
+
+def embedding_ranker(chunks):
+    from backend.models import embeddings
+    model = embeddings()
+    vectors = model.embed_documents(chunks)
+
+    def rank(question):
+        q = model.embed_query(question)
+        scores = [sum(a * b for a, b in zip(q, v)) for v in vectors]
+        return sorted(range(len(chunks)), key=lambda i: -scores[i])
+
+    return rank
+
+
+def evaluate(chunks, questions, ranker, ks=(1, 5)):
+    rank = ranker(chunks)
+    hits = Counter()
+
+    for q in questions:
+        order = rank(q["question"])
+        relevant = {
+            i for i, c in enumerate(chunks)
+            if all(n in c for n in q["needles"])
+        }
+        for k in ks:
+            if relevant & set(order[:k]):
+                hits[k] += 1
+
+    tokens = sum(count_tokens(chunks))
+    result = {
+        "chunks": len(chunks),
+        "embedded_tokens": tokens,
+        "avg_tokens": tokens / max(1, len(chunks)),
+    }
+    for k in ks:
+        result[f"recall@{k}"] = hits[k] / max(1, len(questions))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--docs", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--embed", action="store_true", help="rank with the embedding model")
+    parser.add_argument("--json", help="write results to this path")
+    args = parser.parse_args()
+
+    corpus, questions = make_corpus(random.Random(args.seed), args.docs)
+    ranker = embedding_ranker if args.embed else tfidf_ranker
+
+    results = {}
+    for name, chunker in (("recursive-800/250", chunk_baseline), ("structured", chunk_structured)):
+        try:
+            results[name] = evaluate(chunker(corpus), questions, ranker)
+        except ImportError as e:
+            results[name] = {"error": str(e)}
+
+    print(f"{len(questions)} questions, ranker={'embedding' if args.embed else 'tfidf'}")
+    print(f"{'chunker':<20} {'chunks':>7} {'tokens':>9} {'avg':>6} {'R@1':>6} {'R@5':>6}")
+    for name, r in results.items():
+        if "error" in r:
+            print(f"{name:<20} unavailable: {r['error']}")
+            continue
+        print(
+            f"{name:<20} {r['chunks']:>7} {r['embedded_tokens']:>9} {r['avg_tokens']:>6.0f} "
+            f"{r['recall@1']:>6.2f} {r['recall@5']:>6.2f}"
+        )
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Native txt/md loaders vs the langchain loaders.
+
+Measures cold import time (fresh interpreter) and files/sec on a synthetic
+corpus. Run from the repo root:
+
+    python -m benchmarks.bench_loaders --files 200
+"""
+import argparse
+import json
+import random
+import subprocess
+import sys
+import time
+
+from backend.parsers import load_file
+from benchmarks.corpus import make_markdown, make_text
+
+IMPORTS = {
+    "native": "import backend.parsers",
+    "langchain": (
+        "from langchain_community.document_loaders import "
+        "TextLoader, UnstructuredMarkdownLoader; "
+        "import unstructured.partition.md"
+    ),
+}
+
+
+# -----------------------------
+# MEASUREMENTS
+# -----------------------------
+def import_seconds(statement, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(
+            [sys.executable, "-c", statement], check=True, capture_output=True
+        )
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def files_per_sec(files, ext, loader):
+    start = time.perf_counter()
+    for data in files:
+        load_file(data, ext, text_loader=loader)
+    return len(files) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="write results to this path")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    corpus = {
+        "txt": [make_text(rng) for _ in range(args.files)],
+        "md": [make_markdown(rng) for _ in range(args.files)],
+    }
+
+    results = {}
+    for loader, statement in IMPORTS.items():
+        row = {}
+        try:
+            row["import_s"] = import_seconds(statement)
+            for ext, files in corpus.items():
+                row[f"{ext}_files_per_s"] = files_per_sec(files, ext, loader)
+        except Exception as e:  # langchain / unstructured not installed
+            row["error"] = str(e)
+        results[loader] = row
+
+    print(f"{'loader':<10} {'import s':>9} {'txt f/s':>10} {'md f/s':>10}")
+    for loader, row in results.items():
+        if "error" in row:
+            print(f"{loader:<10} unavailable: {row['error']}")
+            continue
+        print(
+            f"{loader:<10} {row['import_s']:>9.2f} "
+            f"{row['txt_files_per_s']:>10.0f} {row['md_files_per_s']:>10.0f}"
+        )
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""API cold start: import time of backend.main and time to /ready.
+
+Import time is measured in fresh interpreters with dummy credentials, so
+no network is touched. With --serve, uvicorn is started and polled until
+`/` answers (healthy) and until `/ready` answers (models warmed); that
+needs real credentials in .env and a cached embedding model.
+
+    python -m benchmarks.bench_startup
+    python -m benchmarks.bench_startup --serve
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+import urllib.request
+
+IMPORT_SNIPPET = (
+    "import time; t = time.perf_counter(); import backend.main; "
+    "print(time.perf_counter() - t)"
+)
+# what a request path that touches the models pays on first use
+FIRST_USE_SNIPPET = (
+    "import time; t = time.perf_counter(); "
+    "from backend.models import embeddings; embeddings().embed_query('x'); "
+    "print(time.perf_counter() - t)"
+)
+DUMMY_ENV = {
+    "SUPABASE_URL": "https://offline.invalid",
+    "SUPABASE_KEY": "offline",
+    "GROQ_API_KEY": "offline",
+}
+
+
+def run_snippet(snippet, repeat):
+    env = {**os.environ, **DUMMY_ENV}
+    times = []
+    for _ in range(repeat):
+        out = subprocess.run(
+            [sys.executable, "-c", snippet],
+            env=env, check=True, capture_output=True, text=True
+        )
+        times.append(float(out.stdout.strip().splitlines()[-1]))
+    return min(times)
+
+
+def wait_for(url, deadline):
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(url, timeout=1) as r:
+                if r.status == 200:
+                    return True
+        except Exception:
+            pass
+        time.sleep(0.05)
+    return False
+
+
+def serve(port, timeout):
+    start = time.monotonic()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "backend.main:app", "--port", str(port)],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        base = f"http://127.0.0.1:{port}"
+        deadline = start + timeout
+        healthy = wait_for(f"{base}/", deadline) and time.monotonic() - start
+        ready = wait_for(f"{base}/ready", deadline) and time.monotonic() - start
+        return {"healthy_s": healthy or None, "ready_s": ready or None}
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--serve", action="store_true")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--timeout", type=float, default=300)
+    parser.add_argument("--json", help="write results to this path")
+    args = parser.parse_args()
+
+    results = {"import_backend_main_s": run_snippet(IMPORT_SNIPPET, args.repeat)}
+    print(f"import backend.main       {results['import_backend_main_s']:.2f}s")
+
+    try:
+        results["first_embedding_s"] = run_snippet(FIRST_USE_SNIPPET, 1)
+        print(f"first embedding (lazy)    {results['first_embedding_s']:.2f}s")
+    except subprocess.CalledProcessError as e:
+        print("first embedding unavailable:", e.stderr.strip().splitlines()[-1])
+
+    if args.serve:
+        results.update(serve(args.port, args.timeout))
+        print(f"start -> healthy (/)      {results['healthy_s']}")
+        print(f"start -> ready (/ready)   {results['ready_s']}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""Synthetic corpora with planted, answerable facts."""
+import hashlib
+import random
+
+WORDS = (
+    "retrieval embedding document chunk vector index query latency "
+    "storage pipeline context answer model token page section report "
+    "quarterly operations review staffing vendor contracts facility "
+    "maintenance training compliance audits budget forecasts hiring"
+).split()
+CODENAMES = [
+    "aurora", "basalt", "cobalt", "delta", "ember", "fjord", "granite",
+    "harbor", "indigo", "juniper", "kestrel", "lumen", "meridian", "nimbus",
+]
+
+
+def sentence(rng):
+    words = [rng.choice(WORDS) for _ in range(rng.randint(8, 20))]
+    return " ".join(words).capitalize() + "."
+
+
+def paragraph(rng, sentences=5):
+    return " ".join(sentence(rng) for _ in range(sentences))
+
+
+def make_text(rng, paragraphs=30):
+    return "\n\n".join(paragraph(rng) for _ in range(paragraphs)).encode("utf-8")
+
+
+def make_markdown(rng, sections=12):
+    parts = []
+    for i in range(sections):
+        parts.append(f"{'#' * rng.randint(1, 3)} Section {i}")
+        parts.extend(paragraph(rng) for _ in range(rng.randint(1, 4)))
+    return "\n\n".join(parts).encode("utf-8")
+
+
+def make_fact(rng, tag):
+    name = f"{rng.choice(CODENAMES)}-{tag}"
+    value = rng.randint(1000, 99999)
+    return (
+        f"The {name} initiative was approved with a budget of {value} dollars.",
+        {
+            "question": f"What budget was approved for the {name} initiative?",
+            "needles": [name, str(value)],
+        },
+    )
+
+
+def make_corpus(files=20, paragraphs=30, facts=3, seed=0):
+    """Return ({storage_name: bytes}, questions).
+
+    Storage names follow the upload convention "{sha256}_{filename}", and
+    each question lists the `needles` its supporting chunk must contain.
+    """
+    rng = random.Random(seed)
+    corpus, questions = {}, []
+
+    for i in range(files):
+        ext = "md" if i % 2 else "txt"
+        body = [paragraph(rng) for _ in range(paragraphs)]
+
+        for j in range(facts):
+            fact, question = make_fact(rng, f"{i}-{j}")
+            at = rng.randrange(len(body))
+            body[at] = f"{body[at]} {fact}"
+            question["file"] = f"doc{i}.{ext}"
+            questions.append(question)
+
+        if ext == "md":
+            body = [
+                f"## Part {k}\n\n{p}" if k % 4 == 0 else p
+                for k, p in enumerate(body)
+            ]
+
+        data = "\n\n".join(body).encode("utf-8")
+        digest = hashlib.sha256(data).hexdigest()
+        corpus[f"{digest}_doc{i}.{ext}"] = data
+
+    return corpus, questions
@@ -0,0 +1,287 @@
+"""Retrieval quality and latency per configuration.
+
+Ingests a corpus through the real pipeline (in-memory Supabase, see
+fakes.py) once per chunk size, then asks every labeled question with each
+retrieval depth k, context size and confidence gate. One row per
+configuration:
+
+    recall@k   a relevant chunk is among the k retrieved
+    recall@ctx a relevant chunk is among the context chunks sent to the LLM
+    mrr        mean reciprocal rank of the first relevant chunk within k
+    gate_fn    share of questions with a relevant chunk in context that the
+               confidence gate still rejects as "not found"
+    ctx_tok    mean tokens of context per question (the LLM prompt cost)
+    p50/p95    retrieve_with_score latency; query embeddings are warmed
+               first, so rows differ only in search cost
+
+Labels are JSONL, one question per line. A chunk is relevant when it holds
+every `needles` string (case-insensitive) and, when given, comes from
+document `file` and covers `page`:
+
+    {"question": "...", "needles": ["kestrel-3", "41210"], "file": "doc3.txt"}
+
+Without --docs a synthetic corpus with planted facts is used. With
+--embed, the cheapest configuration within --tolerance of the current
+defaults' recall@ctx and gate_fn is marked with *. The default hashed
+vectors only exercise the harness and its latency: they rank different
+questions alike, so no configuration is recommended from them.
+
+    python -m benchmarks.evaluate
+    python -m benchmarks.evaluate --docs ./corpus --labels labels.jsonl \\
+        --chunk-tokens 128,192,256 --k 3,5,10 --context 3,5 --gate 0.2,0.3 --embed
+"""
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import sys
+import tempfile
+import time
+
+from benchmarks import fakes
+from benchmarks.corpus import make_corpus
+from benchmarks.run import summarize_latencies
+
+
+def int_list(value):
+    return [int(v) for v in value.split(",")]
+
+
+def float_list(value):
+    return [float(v) for v in value.split(",")]
+
+
+# -----------------------------
+# CORPUS + LABELS
+# -----------------------------
+def load_docs(directory):
+    # storage names follow the upload convention "{sha256}_{filename}"
+    corpus = {}
+    for name in sorted(os.listdir(directory)):
+        if os.path.splitext(name)[1].lower() not in (".pdf", ".md", ".txt"):
+            continue
+        with open(os.path.join(directory, name), "rb") as f:
+            data = f.read()
+        corpus[f"{hashlib.sha256(data).hexdigest()}_{name}"] = data
+    return corpus
+
+
+def load_labels(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def is_relevant(row, label, names):
+    text = (row.get("text") or "").lower()
+    if not all(n.lower() in text for n in label["needles"]):
+        return False
+    if label.get("file") and names.get(row.get("source")) != label["file"]:
+        return False
+    if label.get("page") is not None:
+        first = row.get("page") or 1
+        if not first <= label["page"] <= (row.get("page_end") or first):
+            return False
+    return True
+
+
+# -----------------------------
+# INGESTION PER CHUNK SIZE
+# -----------------------------
+def reingest(db, corpus, chunk_tokens, overlap):
+    from backend import chunker
+    from backend.ingest import ingest_documents, spool_file
+
+    db.tables.clear()
+    db.buckets.clear()
+    # read by chunk_documents on every call
+    chunker.CHUNK_TOKENS = chunk_tokens
+    chunker.CHUNK_OVERLAP_SENTENCES = overlap
+    ingest_documents(list(corpus), {name: spool_file(data) for name, data in corpus.items()})
+
+    chunks = db.tables.get("chunks", [])
+    tokens = chunker.count_tokens(r["text"] for r in chunks)
+    names = {d["id"]: d["name"] for d in db.tables.get("documents", [])}
+    return names, len(chunks), sum(tokens) / max(1, len(tokens))
+
+
+# -----------------------------
+# EVALUATION
+# -----------------------------
+def run_queries(labels, k):
+    from backend.retriever import retrieve_with_score
+
+    ranked, latencies = [], []
+    for label in labels:
+        start = time.perf_counter()
+        ranked.append(retrieve_with_score(label["question"], k=k))
+        latencies.append(time.perf_counter() - start)
+    return ranked, latencies
+
+
+def score(labels, ranked, names, k, context, gate):
+    from backend.chunker import count_tokens
+    from backend.qa import context_confidence
+
+    found = in_context = rejected = 0
+    reciprocal, ctx_tokens = 0.0, 0
+
+    for label, rows in zip(labels, ranked):
+        hits = [i for i, row in enumerate(rows[:k]) if is_relevant(row, label, names)]
+        ctx = rows[:context]
+        ctx_tokens += sum(count_tokens(r["text"] for r in ctx if r.get("text")))
+
+        if hits:
+            found += 1
+            reciprocal += 1 / (hits[0] + 1)
+        if hits and hits[0] < context:
+            in_context += 1
+            if context_confidence(ctx) < gate:
+                rejected += 1
+
+    n = max(1, len(labels))
+    return {
+        "recall@k": found / n,
+        "recall@ctx": in_context / n,
+        "mrr": reciprocal / n,
+        "gate_fn": rejected / max(1, in_context),
+        "ctx_tokens": ctx_tokens / n,
+    }
+
+
+def cheapest(rows, defaults, tolerance):
+    """Cheapest row (context tokens, then k) that stays within `tolerance`
+    of the defaults' recall@ctx and gate false negatives, or of the best
+    recall@ctx when the defaults are not in the grid."""
+    base = next((r for r in rows if all(r[key] == v for key, v in defaults.items())), None)
+    if base is None:
+        base = max(rows, key=lambda r: r["recall@ctx"])
+
+    eligible = [
+        r for r in rows
+        if r["recall@ctx"] >= base["recall@ctx"] - tolerance
+        and r["gate_fn"] <= base["gate_fn"] + tolerance
+    ]
+    return min(eligible, key=lambda r: (r["ctx_tokens"], r["k"], r["p50_ms"]))
+
+
+def print_table(rows, best):
+    print(
+        f"\n  {'tokens':>6} {'ovl':>3} {'k':>3} {'ctx':>3} {'gate':>5} "
+        f"{'R@k':>6} {'R@ctx':>6} {'MRR':>6} {'gateFN':>6} {'ctx_tok':>7} "
+        f"{'p50ms':>7} {'p95ms':>7}"
+    )
+    for r in rows:
+        mark = "*" if r is best else " "
+        print(
+            f"{mark} {r['chunk_tokens']:>6} {r['overlap']:>3} {r['k']:>3} {r['context']:>3} "
+            f"{r['gate']:>5.2f} {r['recall@k']:>6.3f} {r['recall@ctx']:>6.3f} "
+            f"{r['mrr']:>6.3f} {r['gate_fn']:>6.3f} {r['ctx_tokens']:>7.0f} "
+            f"{r['p50_ms']:>7.2f} {r['p95_ms']:>7.2f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--docs", help="directory of .pdf/.md/.txt files (needs --labels)")
+    parser.add_argument("--labels", help="JSONL of {question, needles[, file, page]}")
+    parser.add_argument("--files", type=int, default=20, help="synthetic corpus size")
+    parser.add_argument("--paragraphs", type=int, default=30)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--chunk-tokens", type=int_list, default=[192])
+    parser.add_argument("--overlap", type=int_list, default=[1], help="sentences")
+    parser.add_argument("--k", type=int_list, default=[5, 10])
+    parser.add_argument("--context", type=int_list, default=[3, 5])
+    parser.add_argument("--gate", type=float_list, default=[0.2])
+    parser.add_argument("--tolerance", type=float, default=0.02)
+    parser.add_argument("--db-latency-ms", type=float, default=0)
+    parser.add_argument("--embed", action="store_true",
+                        help="embed with the real model instead of hashed vectors")
+    parser.add_argument("--out", help="write results JSON here")
+    args = parser.parse_args()
+
+    if args.docs and not args.labels:
+        parser.error("--docs needs --labels")
+
+    # every search must hit the index, and re-ingesting the same files
+    # must not be caught by near-duplicate detection
+    os.environ["RETRIEVAL_CACHE_TTL"] = "0"
+    os.environ["NEAR_DUP_ACTION"] = "off"
+    os.environ["QUERY_CACHE"] = "memory"
+    os.environ["QUERY_CACHE_L1_SIZE"] = "100000"
+    os.environ["QUERY_CACHE_PATH"] = os.path.join(tempfile.mkdtemp(), "cache.sqlite3")
+
+    embedder = None
+    if args.embed:
+        from langchain_huggingface import HuggingFaceEmbeddings
+        embedder = HuggingFaceEmbeddings(
+            model_name="BAAI/bge-small-en-v1.5",
+            encode_kwargs={"normalize_embeddings": True},
+        )
+    db, _, _ = fakes.install(
+        db=fakes.FakeSupabase(latency=args.db_latency_ms / 1000), embedder=embedder
+    )
+
+    if args.docs:
+        corpus = load_docs(args.docs)
+    else:
+        corpus, labels = make_corpus(args.files, args.paragraphs, seed=args.seed)
+    if args.labels:
+        labels = load_labels(args.labels)
+
+    from backend.qa import CONFIDENCE_GATE, CONTEXT_CHUNKS
+    from backend.retriever import RETRIEVAL_K, embed_query_cached
+    from backend.chunker import CHUNK_OVERLAP_SENTENCES, CHUNK_TOKENS
+    defaults = {
+        "chunk_tokens": CHUNK_TOKENS, "overlap": CHUNK_OVERLAP_SENTENCES,
+        "k": RETRIEVAL_K, "context": CONTEXT_CHUNKS, "gate": CONFIDENCE_GATE,
+    }
+
+    for label in labels:
+        embed_query_cached(label["question"])
+
+    rows = []
+    for chunk_tokens, overlap in itertools.product(args.chunk_tokens, args.overlap):
+        names, chunks, avg_tokens = reingest(db, corpus, chunk_tokens, overlap)
+        print(f"chunk_tokens={chunk_tokens} overlap={overlap}: {chunks} chunks, "
+              f"{avg_tokens:.0f} tokens avg", file=sys.stderr)
+
+        for k in args.k:
+            ranked, latencies = run_queries(labels, k)
+            latency = summarize_latencies(latencies)
+
+            for context, gate in itertools.product(args.context, args.gate):
+                if context > k:
+                    continue
+                row = {
+                    "chunk_tokens": chunk_tokens, "overlap": overlap,
+                    "k": k, "context": context, "gate": gate, "chunks": chunks,
+                }
+                row.update(score(labels, ranked, names, k, context, gate))
+                row.update({"p50_ms": latency["p50_ms"], "p95_ms": latency["p95_ms"]})
+                rows.append(row)
+
+    if not rows:
+        parser.error("no configuration has context <= k")
+
+    # hashed bag-of-words vectors say nothing about retrieval quality
+    best = cheapest(rows, defaults, args.tolerance) if args.embed else None
+    print(f"{len(labels)} questions, {len(corpus)} files, "
+          f"embeddings={'model' if args.embed else 'hashed'}")
+    print_table(rows, best)
+    if best is None:
+        print("\nhashed embeddings: quality columns are not meaningful, "
+              "no configuration recommended (use --embed)")
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({
+                "config": vars(args),
+                "defaults": defaults,
+                "cheapest": best,
+                "rows": rows,
+            }, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,471 @@
+"""In-memory stand-ins for Supabase, ChatGroq and the embedding model.
+
+`install()` registers fake `backend.supabase_client` and `backend.models`
+modules, so it must run before anything under `backend` is imported.
+"""
+import hashlib
+import json
+import math
+import re
+import sys
+import threading
+import time
+import types
+import uuid
+from collections import Counter
+
+DIM = 384
+
+
+# -----------------------------
+# TABLES
+# -----------------------------
+class Result:
+
+    def __init__(self, data, count=None):
+        self.data = data
+        self.count = count
+
+
+class FakeQuery:
+
+    def __init__(self, db, table):
+        self.db = db
+        self.table = table
+        self.op = "select"
+        self.columns = None
+        self.payload = None
+        self.filters = []
+        self.ordering = None
+        self.bounds = None
+        self.one = False
+        self.count = None
+        self.conflict = ("id",)
+
+    # ---- operations
+    def select(self, columns="*", count=None, **kwargs):
+        self.op = "select"
+        self.count = count
+        if columns.strip() != "*":
+            self.columns = [c.strip() for c in columns.split(",")]
+        return self
+
+    def insert(self, rows, **kwargs):
+        self.op, self.payload = "insert", rows
+        return self
+
+    def upsert(self, rows, on_conflict="id", **kwargs):
+        self.op, self.payload = "upsert", rows
+        self.conflict = tuple(c.strip() for c in on_conflict.split(","))
+        return self
+
+    def update(self, values, **kwargs):
+        self.op, self.payload = "update", values
+        return self
+
+    def delete(self, **kwargs):
+        self.op = "delete"
+        return self
+
+    # ---- filters
+    def eq(self, column, value):
+        self.filters.append(lambda r: r.get(column) == value)
+        return self
+
+    def neq(self, column, value):
+        self.filters.append(lambda r: r.get(column) != value)
+        return self
+
+    def in_(self, column, values):
+        values = set(values)
+        self.filters.append(lambda r: r.get(column) in values)
+        return self
+
+    def is_(self, column, value):
+        expected = None if value in (None, "null") else value
+        self.filters.append(lambda r: r.get(column) is expected)
+        return self
+
+    def gt(self, column, value):
+        self.filters.append(lambda r: r.get(column) is not None and r[column] > value)
+        return self
+
+    def lt(self, column, value):
+        self.filters.append(lambda r: r.get(column) is not None and r[column] < value)
+        return self
+
+    def gte(self, column, value):
+        self.filters.append(lambda r: r.get(column) is not None and r[column] >= value)
+        return self
+
+    def lte(self, column, value):
+        self.filters.append(lambda r: r.get(column) is not None and r[column] <= value)
+        return self
+
+    def order(self, column, desc=False, **kwargs):
+        self.ordering = (column, desc)
+        return self
+
+    def limit(self, count, **kwargs):
+        self.bounds = (0, count)
+        return self
+
+    def range(self, start, end, **kwargs):
+        self.bounds = (start, end - start + 1)
+        return self
+
+    def single(self):
+        self.one = True
+        return self
+
+    # ---- execution
+    def execute(self):
+        self.db.round_trip(self.table, self.op)
+        with self.db.lock:
+            data = getattr(self, f"_{self.op}")()
+            total = len(self._match()) if self.count else None
+
+        if self.one:
+            if len(data) != 1:
+                raise ValueError(f"expected one row from {self.table}, got {len(data)}")
+            data = data[0]
+        return Result(data, total)
+
+    def _rows(self):
+        return self.db.tables.setdefault(self.table, [])
+
+    def _match(self):
+        return [r for r in self._rows() if all(f(r) for f in self.filters)]
+
+    def _project(self, rows):
+        if self.columns is None:
+            return [dict(r) for r in rows]
+        return [{c: r.get(c) for c in self.columns} for r in rows]
+
+    def _select(self):
+        rows = self._match()
+        if self.ordering:
+            column, desc = self.ordering
+            rows.sort(key=lambda r: (r.get(column) is None, r.get(column)), reverse=desc)
+        if self.bounds:
+            start, count = self.bounds
+            rows = rows[start:start + count]
+        return self._project(rows)
+
+    def _insert(self):
+        rows = self.payload if isinstance(self.payload, list) else [self.payload]
+        stored = []
+        for row in rows:
+            row = dict(row)
+            row.setdefault("id", str(uuid.uuid4()))
+            self._rows().append(row)
+            stored.append(dict(row))
+        return stored
+
+    def _upsert(self):
+        rows = self.payload if isinstance(self.payload, list) else [self.payload]
+        key = lambda r: tuple(r.get(c) for c in self.conflict)
+        existing = {key(r): r for r in self._rows()}
+        stored = []
+        for row in rows:
+            if key(row) in existing:
+                existing[key(row)].update(row)
+                stored.append(dict(existing[key(row)]))
+            else:
+                self.payload = row
+                stored.extend(self._insert())
+        return stored
+
+    def _update(self):
+        rows = self._match()
+        for row in rows:
+            row.update(self.payload)
+        return [dict(r) for r in rows]
+
+    def _delete(self):
+        rows = self._match()
+        ids = {id(r) for r in rows}
+        self.db.tables[self.table] = [r for r in self._rows() if id(r) not in ids]
+        return [dict(r) for r in rows]
+
+
+# -----------------------------
+# STORAGE
+# -----------------------------
+class FakeBucket:
+
+    def __init__(self, db, name):
+        self.db = db
+        self.files = db.buckets.setdefault(name, {})
+
+    def upload(self, path, file, **kwargs):
+        self.db.round_trip("storage", "upload")
+        self.files[path] = bytes(file)
+        return {"path": path}
+
+    def download(self, path):
+        self.db.round_trip("storage", "download")
+        return self.files[path]
+
+    def list(self, path=None, *args, **kwargs):
+        # names directly under `path`, with folders as entries, like storage
+        self.db.round_trip("storage", "list")
+        prefix = f"{path.rstrip('/')}/" if path else ""
+        names = {
+            name[len(prefix):].split("/", 1)[0]
+            for name in self.files if name.startswith(prefix)
+        }
+        return [{"name": name} for name in sorted(names)]
+
+    def remove(self, paths):
+        self.db.round_trip("storage", "remove")
+        for path in paths:
+            self.files.pop(path, None)
+        return [{"name": p} for p in paths]
+
+
+class FakeStorage:
+
+    def __init__(self, db):
+        self.db = db
+
+    def from_(self, bucket):
+        return FakeBucket(self.db, bucket)
+
+
+# -----------------------------
+# RPC
+# -----------------------------
+def as_vector(value):
+    if isinstance(value, str):
+        return json.loads(value)
+    return value
+
+
+class FakeRpc:
+
+    def __init__(self, db, name, params):
+        self.db, self.name, self.params = db, name, params
+
+    def execute(self):
+        self.db.round_trip("rpc", self.name)
+        handler = self.db.functions.get(self.name)
+        if handler is None:
+            raise ValueError(f"unknown rpc {self.name}")
+        with self.db.lock:
+            return Result(handler(self.db, self.params))
+
+
+def rank(db, params, candidates):
+    """Score (chunk row, vector) pairs against the query like the SQL
+    functions do: skip other collections, other sources and deleted
+    documents."""
+    query = params["query_embedding"]
+    source = params.get("filter_source")
+    collection = params.get("filter_collection", "default")
+    deleted = {d["id"] for d in db.tables.get("documents", []) if d.get("status") == "deleted"}
+    scored = []
+
+    for row, vector in candidates:
+        if vector is None:
+            continue
+        if row.get("collection", "default") != collection:
+            continue
+        if source and row.get("source") != source:
+            continue
+        if row.get("source") in deleted:
+            continue
+        score = sum(a * b for a, b in zip(query, as_vector(vector)))
+        scored.append((score, row))
+
+    scored.sort(key=lambda x: -x[0])
+    return [
+        {
+            "id": row.get("id"),
+            "text": row.get("text"),
+            "source": row.get("source"),
+            "page": row.get("page"),
+            "page_end": row.get("page_end"),
+            "score": score,
+        }
+        for score, row in scored[:params.get("match_count", 10)]
+    ]
+
+
+def match_embeddings(db, params):
+    return rank(db, params, ((r, r.get("embedding")) for r in db.tables.get("chunks", [])))
+
+
+def match_embeddings_version(db, params):
+    chunks = {r["id"]: r for r in db.tables.get("chunks", [])}
+    return rank(db, params, (
+        (chunks[e["chunk_id"]], e["embedding"])
+        for e in db.tables.get("chunk_embeddings", [])
+        if e["version"] == params["target_version"] and e["chunk_id"] in chunks
+    ))
+
+
+def reindex_pending(db, params):
+    done = {
+        e["chunk_id"] for e in db.tables.get("chunk_embeddings", [])
+        if e["version"] == params["target_version"]
+    }
+    after = params.get("after_id")
+    rows = sorted(
+        (r for r in db.tables.get("chunks", [])
+         if r["id"] not in done and (after is None or r["id"] > after)),
+        key=lambda r: r["id"],
+    )
+    return [
+        {"id": r["id"], "text": r["text"], "collection": r.get("collection", "default")}
+        for r in rows[:params.get("batch_size", 256)]
+    ]
+
+
+def create_collection(db, params):
+    # partitions and indexes have no in-memory counterpart
+    rows = db.tables.setdefault("collections", [])
+    row = next((r for r in rows if r["name"] == params["collection_name"]), None)
+    if row is None:
+        rows.append({"name": params["collection_name"], "max_documents": params.get("max_docs")})
+    else:
+        row["max_documents"] = params.get("max_docs")
+    return None
+
+
+def activate_index_version(db, params):
+    target = params["target_version"]
+    for v in db.tables.get("index_versions", []):
+        if v["name"] == target:
+            v["status"] = "active"
+        elif v["status"] == "active":
+            v["status"] = "retired"
+    for job in db.tables.get("reindex_jobs", []):
+        if job["version"] == target:
+            job["status"] = "active"
+    return None
+
+
+class FakeSupabase:
+    """Table, storage and RPC surface used by the backend, held in memory.
+
+    `latency` seconds are slept on every round trip to mimic network RTT;
+    `calls` counts round trips per (table, operation).
+    """
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.lock = threading.RLock()
+        self.tables = {}
+        self.buckets = {}
+        self.calls = Counter()
+        self.functions = {
+            "match_embeddings": match_embeddings,
+            "match_embeddings_version": match_embeddings_version,
+            "reindex_pending": reindex_pending,
+            "activate_index_version": activate_index_version,
+            "create_collection": create_collection,
+        }
+        self.storage = FakeStorage(self)
+
+    def round_trip(self, target, op):
+        self.calls[f"{target}.{op}"] += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def table(self, name):
+        return FakeQuery(self, name)
+
+    def rpc(self, name, params):
+        return FakeRpc(self, name, params)
+
+
+# -----------------------------
+# MODELS
+# -----------------------------
+class FakeEmbeddings:
+    """Deterministic hashed bag-of-words vectors, L2-normalized."""
+
+    def __init__(self, dim=DIM, latency=0.0):
+        self.dim = dim
+        self.latency = latency
+
+    def _embed(self, text):
+        vector = [0.0] * self.dim
+        for word in re.findall(r"[a-z0-9-]+", text.lower()):
+            h = int(hashlib.md5(word.encode()).hexdigest(), 16)
+            vector[h % self.dim] += 1.0 if (h >> 20) & 1 else -1.0
+        norm = math.sqrt(sum(x * x for x in vector)) or 1.0
+        return [x / norm for x in vector]
+
+    def embed_documents(self, texts):
+        if self.latency:
+            time.sleep(self.latency * len(texts))
+        return [self._embed(t) for t in texts]
+
+    def embed_query(self, text):
+        if self.latency:
+            time.sleep(self.latency)
+        return self._embed(text)
+
+
+class FakeMessage:
+
+    def __init__(self, content, prompt_tokens, completion_tokens):
+        self.content = content
+        self.usage_metadata = {
+            "input_tokens": prompt_tokens,
+            "output_tokens": completion_tokens,
+        }
+        self.response_metadata = {}
+
+
+class FakeLLM:
+    """Deterministic completions with latency = base + per output token."""
+
+    def __init__(self, latency=0.3, per_token=0.002, output_tokens=120):
+        self.latency = latency
+        self.per_token = per_token
+        self.output_tokens = output_tokens
+        self.calls = 0
+
+    def invoke(self, prompt):
+        self.calls += 1
+        digest = hashlib.sha256(str(prompt).encode()).hexdigest()
+        time.sleep(self.latency + self.per_token * self.output_tokens)
+        words = " ".join(digest[i:i + 4] for i in range(0, 48, 4))
+        return FakeMessage(
+            f"Synthetic answer {words}.",
+            prompt_tokens=len(str(prompt).split()),
+            completion_tokens=self.output_tokens,
+        )
+
+
+# -----------------------------
+# INSTALL
+# -----------------------------
+def install(db=None, llm=None, embedder=None):
+    """Register fake backend.supabase_client / backend.models modules."""
+    if "backend.supabase_client" in sys.modules or "backend.models" in sys.modules:
+        raise RuntimeError("install() must run before backend modules are imported")
+
+    db = db or FakeSupabase()
+    llm = llm or FakeLLM()
+    embedder = embedder or FakeEmbeddings()
+
+    client = types.ModuleType("backend.supabase_client")
+    client.supabase = db
+    client.create_supabase_client = lambda: db
+    client.get_supabase = lambda: db
+
+    models = types.ModuleType("backend.models")
+    models.EMBEDDING_MODEL = "fake-hash-384"
+    models.GROQ_API_KEY = "offline"
+    models.llm = lambda: llm
+    models.embeddings = lambda *args, **kwargs: embedder
+    models.tokenizer = lambda: None   # chunker falls back to word counts
+    models.warm_up = lambda: None
+
+    sys.modules["backend.supabase_client"] = client
+    sys.modules["backend.models"] = models
+    return db, llm, embedder
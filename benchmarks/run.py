@@ -0,0 +1,249 @@
+"""Offline benchmark suite.
+
+Runs ingestion, query, summarize and snapshot scenarios against in-memory
+Supabase, a deterministic fake LLM and hashed embeddings, so results depend
+only on the code under test. Writes JSON for regression comparison:
+
+    python -m benchmarks.run --out bench.json
+    python -m benchmarks.run --compare bench.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks import fakes
+from benchmarks.corpus import make_corpus
+
+# lower is better for these keys; everything else is informational
+LATENCY_KEYS = (
+    "p50_ms", "p95_ms", "p99_ms", "mean_ms", "seconds", "export_seconds", "import_seconds"
+)
+
+
+# -----------------------------
+# HELPERS
+# -----------------------------
+def summarize_latencies(samples):
+    samples = sorted(samples)
+
+    def pct(p):
+        return samples[min(len(samples) - 1, int(p * len(samples)))] * 1000
+
+    return {
+        "count": len(samples),
+        "mean_ms": statistics.fmean(samples) * 1000,
+        "p50_ms": pct(0.50),
+        "p95_ms": pct(0.95),
+        "p99_ms": pct(0.99),
+        "max_ms": samples[-1] * 1000,
+    }
+
+
+def timed_calls(fn, args_list, concurrency):
+    def call(args):
+        start = time.perf_counter()
+        result = fn(*args)
+        return time.perf_counter() - start, result
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        outcomes = list(executor.map(call, args_list))
+    wall = time.perf_counter() - start
+
+    return [t for t, _ in outcomes], [r for _, r in outcomes], wall
+
+
+def stage_means():
+    # mean seconds per (pipeline, stage) from the backend's histograms
+    from backend.metrics import STAGE_SECONDS
+
+    totals = {}
+    for metric in STAGE_SECONDS.collect():
+        for sample in metric.samples:
+            key = f"{sample.labels['pipeline']}.{sample.labels['stage']}"
+            if sample.name.endswith("_sum"):
+                totals.setdefault(key, [0, 0])[0] = sample.value
+            elif sample.name.endswith("_count"):
+                totals.setdefault(key, [0, 0])[1] = sample.value
+
+    return {k: (s / n) * 1000 for k, (s, n) in totals.items() if n}
+
+
+# -----------------------------
+# SCENARIOS
+# -----------------------------
+def scenario_ingest(db, corpus):
+    from backend.ingest import ingest_documents, spool_file
+
+    calls_before = sum(db.calls.values())
+    spool = {name: spool_file(data) for name, data in corpus.items()}
+
+    start = time.perf_counter()
+    ingest_documents(list(corpus), spool)
+    elapsed = time.perf_counter() - start
+
+    chunks = len(db.tables.get("chunks", []))
+    return {
+        "files": len(corpus),
+        "chunks": chunks,
+        "seconds": elapsed,
+        "files_per_s": len(corpus) / elapsed,
+        "chunks_per_s": chunks / elapsed,
+        "round_trips": sum(db.calls.values()) - calls_before,
+    }
+
+
+def scenario_query(questions, count, concurrency):
+    from backend.qa import answer_question
+
+    rng = random.Random(1)
+    picked = [rng.choice(questions) for _ in range(count)]
+    args = [(q["question"], [], None) for q in picked]
+
+    latencies, results, wall = timed_calls(answer_question, args, concurrency)
+    answered = sum(1 for r in results if r.get("citations"))
+
+    out = summarize_latencies(latencies)
+    out.update({
+        "concurrency": concurrency,
+        "throughput_qps": count / wall,
+        "answered_ratio": answered / count,
+    })
+    return out
+
+
+def scenario_summarize(db, count, concurrency):
+    from backend.qa import summarize_documents
+
+    paths = [d["storage_path"] for d in db.tables.get("documents", [])]
+    rng = random.Random(2)
+    args = [(rng.choice(paths),) for _ in range(count)]
+
+    latencies, _, wall = timed_calls(summarize_documents, args, concurrency)
+
+    out = summarize_latencies(latencies)
+    out.update({"concurrency": concurrency, "throughput_qps": count / wall})
+    return out
+
+
+def scenario_snapshot(db):
+    from backend.snapshot import export_snapshot, import_snapshot
+
+    path = os.path.join(tempfile.mkdtemp(), "corpus.snap")
+    start = time.perf_counter()
+    manifest = export_snapshot(path)
+    exported = time.perf_counter() - start
+
+    # restore into emptied tables, as on a fresh environment
+    db.tables["chunks"], db.tables["documents"] = [], []
+    restored = import_snapshot(path, include_files=False)
+
+    return {
+        "chunks": manifest["chunks"],
+        "bytes": os.path.getsize(path),
+        "export_seconds": exported,
+        "import_seconds": restored["seconds"],
+        "import_chunks_per_s": restored["chunks"] / restored["seconds"],
+    }
+
+
+# -----------------------------
+# COMPARISON
+# -----------------------------
+def compare(baseline, current, threshold):
+    regressions = []
+    print(f"\n{'metric':<40} {'baseline':>12} {'current':>12} {'change':>8}")
+
+    for scenario, metrics in current["scenarios"].items():
+        for key, value in metrics.items():
+            old = baseline.get("scenarios", {}).get(scenario, {}).get(key)
+            if not isinstance(value, (int, float)) or not old:
+                continue
+
+            change = (value - old) / old
+            flag = ""
+            if key in LATENCY_KEYS and change > threshold:
+                flag = "  REGRESSION"
+                regressions.append(f"{scenario}.{key}")
+
+            print(f"{scenario + '.' + key:<40} {old:>12.2f} {value:>12.2f} {change:>+8.1%}{flag}")
+
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", type=int, default=20)
+    parser.add_argument("--paragraphs", type=int, default=30)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--llm-latency-ms", type=float, default=300)
+    parser.add_argument("--db-latency-ms", type=float, default=5)
+    parser.add_argument("--embed-latency-ms", type=float, default=1, help="per text")
+    parser.add_argument("--llm-rpm", type=float, default=1e6,
+                        help="gateway requests/min (default: effectively unlimited)")
+    parser.add_argument("--llm-cache", type=int, default=0,
+                        help="gateway completion cache size (0 measures every generation)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="write results JSON here")
+    parser.add_argument("--compare", help="baseline JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="latency regression that fails --compare")
+    args = parser.parse_args()
+
+    # read by backend.gateway at import
+    os.environ["LLM_RPM"] = str(args.llm_rpm)
+    os.environ["LLM_TPM"] = str(args.llm_rpm * 10000)
+    os.environ["LLM_CACHE_SIZE"] = str(args.llm_cache)
+    # fresh shared query cache per run, so earlier runs can't warm it
+    os.environ["QUERY_CACHE_PATH"] = os.path.join(tempfile.mkdtemp(), "cache.sqlite3")
+
+    db, llm, _ = fakes.install(
+        db=fakes.FakeSupabase(latency=args.db_latency_ms / 1000),
+        llm=fakes.FakeLLM(latency=args.llm_latency_ms / 1000),
+        embedder=fakes.FakeEmbeddings(latency=args.embed_latency_ms / 1000),
+    )
+
+    corpus, questions = make_corpus(args.files, args.paragraphs, seed=args.seed)
+
+    results = {
+        "config": vars(args),
+        "python": platform.python_version(),
+        "scenarios": {},
+    }
+    scenarios = results["scenarios"]
+
+    scenarios["ingest"] = scenario_ingest(db, corpus)
+    scenarios["query"] = scenario_query(questions, args.queries, args.concurrency)
+    scenarios["summarize"] = scenario_summarize(db, max(1, args.queries // 4), args.concurrency)
+    # last: it replaces the tables with their restored copy
+    scenarios["snapshot"] = scenario_snapshot(db)
+    results["stages_mean_ms"] = stage_means()
+    results["llm_calls"] = llm.calls
+    from backend.cache import stats as cache_stats
+    results["cache"] = cache_stats()
+    results["db_round_trips"] = dict(db.calls)
+
+    print(json.dumps(results["scenarios"], indent=2))
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(json.load(f), results, args.threshold)
+        if regressions:
+            print("\nregressed:", ", ".join(regressions))
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
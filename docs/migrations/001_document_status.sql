@@ -0,0 +1,4 @@
+-- Per-document ingestion status, written by backend/ingest.py.
+-- processing -> completed | partial | failed
+alter table documents
+    add column if not exists status text not null default 'completed';
@@ -0,0 +1,29 @@
+-- Chunks may span pages (backend/chunker.py): store the last page too,
+-- and return chunk ids + page ranges from the similarity search.
+alter table chunks
+    add column if not exists page_end integer;
+
+drop function if exists match_embeddings(vector, integer, uuid);
+
+create function match_embeddings(
+    query_embedding vector(384),
+    match_count integer default 10,
+    filter_source uuid default null
+)
+returns table (
+    id uuid,
+    text text,
+    source uuid,
+    page integer,
+    page_end integer,
+    score double precision
+)
+language sql stable
+as $$
+    select c.id, c.text, c.source, c.page, c.page_end,
+           1 - (c.embedding <=> query_embedding) as score
+    from chunks c
+    where filter_source is null or c.source = filter_source
+    order by c.embedding <=> query_embedding
+    limit match_count;
+$$;
@@ -0,0 +1,41 @@
+-- Deletes are tombstones first (backend/cleanup.py): the document row is
+-- marked status = 'deleted' at once and removed, with its chunks and
+-- storage object, by a background job. Similarity search must skip
+-- tombstoned documents in the meantime.
+alter table documents
+    add column if not exists deleted_at timestamptz;
+
+create index if not exists documents_deleted_idx
+    on documents (id) where status = 'deleted';
+
+create index if not exists chunks_source_idx
+    on chunks (source);
+
+drop function if exists match_embeddings(vector, integer, uuid);
+
+create function match_embeddings(
+    query_embedding vector(384),
+    match_count integer default 10,
+    filter_source uuid default null
+)
+returns table (
+    id uuid,
+    text text,
+    source uuid,
+    page integer,
+    page_end integer,
+    score double precision
+)
+language sql stable
+as $$
+    select c.id, c.text, c.source, c.page, c.page_end,
+           1 - (c.embedding <=> query_embedding) as score
+    from chunks c
+    where (filter_source is null or c.source = filter_source)
+      and not exists (
+          select 1 from documents d
+          where d.id = c.source and d.status = 'deleted'
+      )
+    order by c.embedding <=> query_embedding
+    limit match_count;
+$$;
@@ -0,0 +1,7 @@
+-- Near-duplicate detection (backend/dedup.py): a 128-value MinHash
+-- signature per document, and the earlier document it matched.
+-- status gains 'duplicate' for near-duplicates skipped before embedding.
+alter table documents
+    add column if not exists minhash bigint[],
+    add column if not exists near_duplicate_of uuid references documents (id) on delete set null,
+    add column if not exists similarity real;
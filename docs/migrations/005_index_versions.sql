@@ -0,0 +1,109 @@
+-- Embedding model migrations (backend/reindex.py).
+--
+-- The original index lives in chunks.embedding and is called 'legacy'.
+-- A re-index writes a new model's vectors to chunk_embeddings under a
+-- version name while queries keep using the active version; cutover flips
+-- index_versions in one transaction.
+
+create table if not exists index_versions (
+    name text primary key,
+    model text not null,
+    dim integer not null,
+    status text not null default 'building',   -- building | active | retired
+    created_at timestamptz not null default now(),
+    activated_at timestamptz
+);
+
+create unique index if not exists index_versions_one_active
+    on index_versions (status) where status = 'active';
+
+create table if not exists chunk_embeddings (
+    chunk_id uuid not null references chunks (id) on delete cascade,
+    version text not null references index_versions (name) on delete cascade,
+    embedding vector not null,        -- any dimension; one model per version
+    primary key (chunk_id, version)
+);
+
+-- After a build finishes, add an ANN index for its dimension, e.g.:
+--   create index on chunk_embeddings
+--       using hnsw ((embedding::vector(768)) vector_cosine_ops)
+--       where version = 'bge-base';
+
+create table if not exists reindex_jobs (
+    version text primary key references index_versions (name) on delete cascade,
+    status text not null default 'running',   -- running | ready | active | failed
+    cursor uuid,                               -- last chunk id embedded
+    done integer not null default 0,
+    total integer not null default 0,
+    error text,
+    updated_at timestamptz not null default now()
+);
+
+-- Once a non-legacy version is active, new chunks carry no legacy vector.
+alter table chunks alter column embedding drop not null;
+
+-- Chunks after `after_id` (all chunks when null) still missing a vector
+-- for `target_version`, in id order.
+create or replace function reindex_pending(
+    target_version text,
+    after_id uuid default null,
+    batch_size integer default 256
+)
+returns table (id uuid, text text)
+language sql stable
+as $$
+    select c.id, c.text
+    from chunks c
+    where (after_id is null or c.id > after_id)
+      and not exists (
+          select 1 from chunk_embeddings e
+          where e.chunk_id = c.id and e.version = target_version
+      )
+    order by c.id
+    limit batch_size;
+$$;
+
+create or replace function match_embeddings_version(
+    query_embedding vector,
+    target_version text,
+    match_count integer default 10,
+    filter_source uuid default null
+)
+returns table (
+    id uuid,
+    text text,
+    source uuid,
+    page integer,
+    page_end integer,
+    score double precision
+)
+language sql stable
+as $$
+    select c.id, c.text, c.source, c.page, c.page_end,
+           1 - (e.embedding <=> query_embedding) as score
+    from chunk_embeddings e
+    join chunks c on c.id = e.chunk_id
+    where e.version = target_version
+      and (filter_source is null or c.source = filter_source)
+      and not exists (
+          select 1 from documents d
+          where d.id = c.source and d.status = 'deleted'
+      )
+    order by e.embedding <=> query_embedding
+    limit match_count;
+$$;
+
+-- Cutover: one transaction, so there is never zero or two active versions.
+create or replace function activate_index_version(target_version text)
+returns void
+language plpgsql
+as $$
+begin
+    update index_versions set status = 'retired'
+        where status = 'active' and name <> target_version;
+    update index_versions set status = 'active', activated_at = now()
+        where name = target_version;
+    update reindex_jobs set status = 'active', updated_at = now()
+        where version = target_version;
+end;
+$$;
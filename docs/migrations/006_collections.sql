@@ -0,0 +1,220 @@
+-- Named collections (backend/collection.py).
+--
+-- Every document and chunk belongs to one collection. chunks becomes a
+-- list-partitioned table with one partition (and one ANN index) per
+-- collection, so a search only scans its own collection. Existing data is
+-- the 'default' collection: the old chunks table is attached as its
+-- partition, without copying rows.
+
+create table if not exists collections (
+    name text primary key check (name ~ '^[a-z0-9_]{1,48}$'),
+    max_documents integer check (max_documents is null or max_documents > 0),
+    created_at timestamptz not null default now()
+);
+
+insert into collections (name) values ('default') on conflict do nothing;
+
+alter table documents
+    add column if not exists collection text not null default 'default'
+        references collections (name);
+
+create index if not exists documents_collection_idx
+    on documents (collection, status);
+
+-- A unique key on a partitioned table must include the partition key, so
+-- chunks are keyed by (collection, id) and chunk_embeddings references both.
+alter table chunk_embeddings drop constraint if exists chunk_embeddings_chunk_id_fkey;
+alter table chunk_embeddings
+    add column if not exists collection text not null default 'default';
+
+alter table chunks drop constraint if exists chunks_source_fkey;
+alter table chunks add column if not exists collection text not null default 'default';
+alter table chunks drop constraint chunks_pkey;
+alter table chunks add primary key (collection, id);
+-- lets ATTACH skip the validation scan
+alter table chunks add constraint chunks_default_only check (collection = 'default');
+alter table chunks rename to chunks_default;
+-- index names stay behind on a rename; free them for the parent
+alter index chunks_pkey rename to chunks_default_pkey;
+alter index if exists chunks_source_idx rename to chunks_default_source_idx;
+
+create table chunks (like chunks_default including defaults)
+    partition by list (collection);
+alter table chunks add primary key (collection, id);
+alter table chunks attach partition chunks_default for values in ('default');
+alter table chunks_default drop constraint chunks_default_only;
+
+alter table chunks
+    add foreign key (source) references documents (id) on delete cascade;
+-- keyset paging, session rehydration and cleanup look chunks up by id alone
+create index if not exists chunks_id_idx on chunks (id);
+create index if not exists chunks_source_idx on chunks (source);
+
+alter table chunk_embeddings
+    add constraint chunk_embeddings_chunk_fkey
+    foreign key (collection, chunk_id) references chunks (collection, id) on delete cascade;
+
+create index if not exists chunk_embeddings_version_collection_idx
+    on chunk_embeddings (version, collection);
+
+-- Create a collection with its own chunk partition and HNSW index, or
+-- change its document limit (null = unlimited).
+create or replace function create_collection(
+    collection_name text,
+    max_docs integer default null
+)
+returns void
+language plpgsql
+as $$
+declare
+    -- own prefix, so no name can land on chunks_id_idx and the like
+    part text := case when collection_name = 'default' then 'chunks_default'
+                      else 'chunks_c_' || collection_name end;
+begin
+    -- the check constraint on collections.name guards the DDL below
+    insert into collections (name, max_documents) values (collection_name, max_docs)
+        on conflict (name) do update set max_documents = excluded.max_documents;
+
+    if to_regclass(part) is null then
+        execute format(
+            'create table %I partition of chunks for values in (%L)', part, collection_name
+        );
+        execute format(
+            'create index on %I using hnsw (embedding vector_cosine_ops)', part
+        );
+    elsif not exists (
+        select 1 from pg_inherits
+        where inhrelid = to_regclass(part) and inhparent = 'chunks'::regclass
+    ) then
+        -- never register a collection that has nowhere to store its chunks
+        raise exception 'relation % exists and is not a chunks partition', part
+            using errcode = 'duplicate_table';
+    end if;
+end;
+$$;
+
+-- Per-collection document limit, also enforced here so concurrent
+-- uploads cannot overshoot it. Re-inserting an existing row (snapshot
+-- restore) is not a new document.
+create or replace function enforce_collection_limit()
+returns trigger
+language plpgsql
+as $$
+declare
+    cap integer;
+    used integer;
+begin
+    select max_documents into cap from collections where name = new.collection;
+    if cap is null or exists (select 1 from documents where id = new.id) then
+        return new;
+    end if;
+
+    perform pg_advisory_xact_lock(hashtext('collection:' || new.collection));
+    select count(*) into used from documents
+        where collection = new.collection and status <> 'deleted';
+    if used >= cap then
+        raise exception 'collection % is full (% documents)', new.collection, cap
+            using errcode = 'check_violation';
+    end if;
+    return new;
+end;
+$$;
+
+drop trigger if exists documents_collection_limit on documents;
+create trigger documents_collection_limit
+    before insert on documents
+    for each row execute function enforce_collection_limit();
+
+-- Similarity search within one collection; the partition key filter
+-- prunes every other collection's partition.
+drop function if exists match_embeddings(vector, integer, uuid);
+
+create function match_embeddings(
+    query_embedding vector(384),
+    match_count integer default 10,
+    filter_source uuid default null,
+    filter_collection text default 'default'
+)
+returns table (
+    id uuid,
+    text text,
+    source uuid,
+    page integer,
+    page_end integer,
+    score double precision
+)
+language sql stable
+as $$
+    select c.id, c.text, c.source, c.page, c.page_end,
+           1 - (c.embedding <=> query_embedding) as score
+    from chunks c
+    where c.collection = filter_collection
+      and (filter_source is null or c.source = filter_source)
+      and not exists (
+          select 1 from documents d
+          where d.id = c.source and d.status = 'deleted'
+      )
+    order by c.embedding <=> query_embedding
+    limit match_count;
+$$;
+
+-- For a re-indexed version, add its ANN index per collection, e.g.:
+--   create index on chunk_embeddings
+--       using hnsw ((embedding::vector(768)) vector_cosine_ops)
+--       where version = 'bge-base' and collection = 'default';
+drop function if exists match_embeddings_version(vector, text, integer, uuid);
+
+create function match_embeddings_version(
+    query_embedding vector,
+    target_version text,
+    match_count integer default 10,
+    filter_source uuid default null,
+    filter_collection text default 'default'
+)
+returns table (
+    id uuid,
+    text text,
+    source uuid,
+    page integer,
+    page_end integer,
+    score double precision
+)
+language sql stable
+as $$
+    select c.id, c.text, c.source, c.page, c.page_end,
+           1 - (e.embedding <=> query_embedding) as score
+    from chunk_embeddings e
+    join chunks c on c.collection = e.collection and c.id = e.chunk_id
+    where e.version = target_version
+      and e.collection = filter_collection
+      and c.collection = filter_collection
+      and (filter_source is null or c.source = filter_source)
+      and not exists (
+          select 1 from documents d
+          where d.id = c.source and d.status = 'deleted'
+      )
+    order by e.embedding <=> query_embedding
+    limit match_count;
+$$;
+
+-- The re-index writes chunk_embeddings rows, which now need the collection.
+drop function if exists reindex_pending(text, uuid, integer);
+
+create function reindex_pending(
+    target_version text,
+    after_id uuid default null,
+    batch_size integer default 256
+)
+returns table (id uuid, text text, collection text)
+language sql stable
+as $$
+    select c.id, c.text, c.collection
+    from chunks c
+    where (after_id is null or c.id > after_id)
+      and not exists (
+          select 1 from chunk_embeddings e
+          where e.chunk_id = c.id and e.version = target_version
+      )
+    order by c.id
+    limit batch_size;
+$$;
@@ -1,6 +1,8 @@
 import streamlit as st
 import requests
+import json
 import os
+import threading
 import time
 BACKEND_URL = os.getenv("BACKEND_URL", "http://localhost:8000")
 
@@ -13,23 +15,124 @@ st.caption("Document-grounded Q&A with explicit evidence")
 # ==============================
 
 if "chat_history" not in st.session_state:
-    st.session_state.chat_history = []
+    st.session_state.chat_history = []   # display only; the backend keeps the context
+
+if "session_id" not in st.session_state:
+    st.session_state.session_id = None
+
+if "collection" not in st.session_state:
+    st.session_state.collection = "default"
+
+
+def reset_chat():
+    session_id = st.session_state.session_id
+    st.session_state.chat_history.clear()
+    st.session_state.session_id = None
+    if session_id:
+        try:
+            requests.delete(f"{BACKEND_URL}/sessions/{session_id}", timeout=5)
+        except requests.exceptions.RequestException:
+            pass   # expires server-side anyway
+
+
+# ==============================
+# HELPER: BACKEND EVENTS (SSE)
+# ==============================
+
+def sse_events(last_event_id=None):
+    """Yield (event, data) from GET /events until the stream closes."""
+    headers = {"Last-Event-ID": str(last_event_id)} if last_event_id is not None else {}
+    # the backend sends a keep-alive every 15s, so a 30s read timeout means it is gone
+    with requests.get(f"{BACKEND_URL}/events", headers=headers, stream=True, timeout=(5, 30)) as r:
+        r.raise_for_status()
+        name, data = "message", []
+        for line in r.iter_lines(decode_unicode=True):
+            if line is None:
+                continue
+            if not line:
+                if data:
+                    yield name, json.loads("\n".join(data))
+                name, data = "message", []
+            elif line.startswith("event:"):
+                name = line[6:].strip()
+            elif line.startswith("data:"):
+                data.append(line[5:].strip())
+
+
+@st.cache_resource
+def catalog_listener():
+    # one background subscriber per Streamlit process tracks the catalog version
+    state = {"version": None}
+
+    def run():
+        while True:
+            try:
+                for name, data in sse_events():
+                    if name == "catalog":
+                        state["version"] = data.get("version")
+            except (requests.exceptions.RequestException, ValueError):
+                pass
+            state["version"] = None   # unknown while disconnected
+            time.sleep(3)
+
+    threading.Thread(target=run, daemon=True).start()
+    return state
+
+
+def catalog_key():
+    version = catalog_listener()["version"]
+    if version is None:
+        # stream down: fall back to a 30s refresh
+        return f"t{int(time.time() // 30)}"
+    return f"v{version}"
 
 
 # ==============================
 # HELPER: FETCH DOCUMENTS
 # ==============================
 
-@st.cache_data(ttl=30)
-def get_documents():
+@st.cache_data(max_entries=16)
+def get_documents(cache_key, collection):
+    # cache_key only changes when the backend reports a catalog change
     try:
-        r = requests.get(f"{BACKEND_URL}/documents", timeout=5)
+        r = requests.get(
+            f"{BACKEND_URL}/documents",
+            params={"collection": collection},
+            timeout=5
+        )
         if r.status_code == 200:
             return r.json().get("documents", [])
     except:
         pass
     return []
 
+
+@st.cache_data(ttl=30)
+def get_collections():
+    try:
+        r = requests.get(f"{BACKEND_URL}/collections", timeout=5)
+        if r.status_code == 200:
+            return [c["name"] for c in r.json().get("collections", [])]
+    except:
+        pass
+    return ["default"]
+
+# ==============================
+# COLLECTION
+# ==============================
+
+collections = get_collections()
+collection = st.selectbox(
+    "Collection:",
+    collections,
+    index=collections.index(st.session_state.collection)
+    if st.session_state.collection in collections else 0
+)
+if collection != st.session_state.collection:
+    # a session's history belongs to the collection it searched
+    st.session_state.collection = collection
+    reset_chat()
+
 # ==============================
 # UPLOAD SECTION
 # ==============================
@@ -71,6 +174,7 @@ if st.button("Upload & Index"):
 
             r = requests.post(
                 f"{BACKEND_URL}/upload",
+                params={"collection": collection},
                 files=files_payload,
                 timeout=120
             )
@@ -82,40 +186,48 @@ if st.button("Upload & Index"):
 
             if data.get("files"):
                 status_box = st.empty()
+                progress_bar = st.progress(0.0)
                 deadline = time.time() + 600
-                while True:
-                    try:
-                        res = requests.get(
-                            f"{BACKEND_URL}/ingestion-status",
-                            timeout=5
-                        )
-                        print("Ingestion status response:", res.status_code, res.text)
-                        if res.status_code == 200:
-                            state = res.json().get("state")
+                last_event_id = data.get("event_id")
+                state = "running"
 
+                while state == "running" and time.time() < deadline:
+                    try:
+                        # replays from the upload, so a fast job is never missed
+                        for name, event in sse_events(last_event_id):
+                            if name != "ingestion":
+                                continue
+                            state = event.get("state")
+                            total = event.get("files_total") or 0
+                            done = event.get("files_done") or 0
+
+                            if total:
+                                progress_bar.progress(min(1.0, done / total))
                             if state == "running":
-                                status_box.info("Indexing document chunks...")
-
-                            elif state == "completed":
-                                status_box.success(
-                                    "✔ All document chunks ingested successfully."
+                                status_box.info(
+                                    f"Indexing: {event.get('phase', 'starting')} "
+                                    f"({done}/{total} files, "
+                                    f"{event.get('chunks_written', 0)} chunks)"
                                 )
+                            else:
                                 break
-
-                            elif state == "failed":
-                                status_box.error("Ingestion failed.")
+                            if time.time() >= deadline:
                                 break
 
-                    except:
-                        status_box.warning("Checking ingestion status...")
-
-                    if time.time() >= deadline:
-                        status_box.error("Ingestion status timed out. Please try again.")
-                        break
+                    except (requests.exceptions.RequestException, ValueError):
+                        status_box.warning("Reconnecting to progress stream...")
+                        last_event_id = None
+                        time.sleep(2)
 
-                    time.sleep(2)
+                if state == "completed":
+                    progress_bar.progress(1.0)
+                    status_box.success("✔ All document chunks ingested successfully.")
+                elif state == "failed":
+                    status_box.error("Ingestion failed.")
+                else:
+                    status_box.error("Ingestion status timed out. Please try again.")
 
-            st.session_state.chat_history.clear()
+            reset_chat()
             get_documents.clear()
 
         else:
@@ -135,7 +247,7 @@ if st.button("Upload & Index"):
 st.divider()
 st.header("📂 Select Document")
 
-docs = get_documents()
+docs = get_documents(catalog_key(), collection)
 
 doc_map = {}
 for d in docs:
@@ -177,7 +289,7 @@ if selected_name != "All Documents":
                 if res.status_code == 200:
                     st.success("Deleted successfully")
                     get_documents.clear()
-                    st.session_state.chat_history.clear()
+                    reset_chat()
                     st.rerun()
                 else:
                     st.error(f"Delete failed: {res.text}")
@@ -201,7 +313,7 @@ if st.button("Summarize Document"):
             print("Selected document:", selected_document)
             r = requests.post(
                 f"{BACKEND_URL}/summarize",
-                json={"document": selected_document}, #doc_id gone
+                json={"document": selected_document, "collection": collection}, #doc_id gone
                 timeout=60
             )
         if r.status_code == 200:
@@ -218,6 +330,8 @@ if st.button("Summarize Document"):
                 for c in citations:
                     st.markdown(f"- `{c}`")
 
+        elif r.status_code == 429:
+            st.warning(f"Server busy, try again in {r.headers.get('Retry-After', 'a few')} seconds.")
         else:
             st.error(r.text)
 
@@ -233,7 +347,7 @@ st.divider()
 st.header("💬 Ask Questions")
 
 if st.button("Clear Chat"):
-    st.session_state.chat_history.clear()
+    reset_chat()
     st.rerun()
 
 
@@ -251,8 +365,9 @@ if user_question:
 
     payload = {
         "question": user_question,
-        "chat_history": st.session_state.chat_history,
-        "document": None if selected_document == "All Documents" else selected_document
+        "session_id": st.session_state.session_id,
+        "document": None if selected_document == "All Documents" else selected_document,
+        "collection": collection
     }
 
     try:
@@ -263,15 +378,31 @@ if user_question:
                 json=payload,
                 timeout=60
             )
+            if r.status_code == 404:
+                # session lost (restart or another worker): resend our history
+                payload["chat_history"] = st.session_state.chat_history
+                if not payload["chat_history"]:
+                    payload["session_id"] = None
+                r = requests.post(
+                    f"{BACKEND_URL}/query",
+                    json=payload,
+                    timeout=60
+                )
 
         if r.status_code == 200:
 
             data = r.json()
 
+            st.session_state.session_id = data.get("session_id")
             answer = data.get("answer", "No answer returned.")
             confidence = data.get("confidence", 0.0)
             citations = data.get("citations", [])
 
+        elif r.status_code == 429:
+            answer = f"Server busy, try again in {r.headers.get('Retry-After', 'a few')} seconds."
+            confidence = 0
+            citations = []
+
         else:
             answer = "Backend error."
             confidence = 0
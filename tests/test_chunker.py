@@ -0,0 +1,44 @@
+import pytest
+from langchain_core.documents import Document
+
+from backend import chunker
+
+
+@pytest.fixture(autouse=True)
+def word_tokens(monkeypatch):
+    # one token per word keeps sizes exact and avoids loading a tokenizer
+    monkeypatch.setattr(chunker, "count_tokens", lambda texts: [len(t.split()) for t in texts])
+
+
+def sentence(words, tag):
+    return " ".join(f"{tag}{i}" for i in range(words - 1)) + " end."
+
+
+def test_overlap_never_exceeds_budget():
+    text = " ".join([sentence(91, "a"), sentence(150, "b"), sentence(150, "c")])
+    chunks = chunker.chunk_documents([Document(page_content=text)], max_tokens=192, overlap=1)
+
+    assert [c.metadata["tokens"] for c in chunks] == [91, 150, 150]
+    for chunk in chunks:
+        assert len(chunk.page_content.split()) <= 192
+
+
+def test_overlap_kept_when_it_fits():
+    text = " ".join(sentence(60, t) for t in "abcd")
+    chunks = chunker.chunk_documents([Document(page_content=text)], max_tokens=130, overlap=1)
+
+    assert [c.metadata["tokens"] for c in chunks] == [120, 120, 120]
+    # the previous chunk's last sentence is repeated
+    assert [c.page_content.split()[0] for c in chunks] == ["a0", "b0", "c0"]
+
+
+@pytest.mark.parametrize("overlap", [0, 1, 2, 3])
+def test_every_chunk_within_budget(overlap):
+    sizes = [5, 40, 91, 150, 12, 70, 190, 33, 8, 120, 64]
+    text = " ".join(sentence(n, f"s{i}x") for i, n in enumerate(sizes))
+    chunks = chunker.chunk_documents([Document(page_content=text)], max_tokens=192, overlap=overlap)
+
+    assert chunks
+    for chunk in chunks:
+        assert chunk.metadata["tokens"] <= 192
+        assert len(chunk.page_content.split()) <= 192
@@ -0,0 +1,49 @@
+import codecs
+
+import pytest
+
+from backend.parsers import decode_text, load_text
+
+
+@pytest.mark.parametrize("text, encoding", [
+    # short Western text: no detector guess is coherent, cp1252 fallback
+    ("café", "cp1252"),
+    ("naïve résumé", "cp1252"),
+    ("très bien. Où est la gare?", "latin-1"),
+    ("Grüße aus München, schöne Straße", "cp1252"),
+    ("smart “quotes” – dash…", "cp1252"),
+    ("Ça va? Sí, señor.", "cp1252"),
+])
+def test_short_legacy_text_is_not_garbled(text, encoding):
+    assert decode_text(text.encode(encoding)) == text
+
+
+@pytest.mark.parametrize("text, encoding", [
+    ("Le café était très bon, et nous avons passé une soirée agréable "
+     "à discuter de la période médiévale. " * 5, "cp1252"),
+    ("Příliš žluťoučký kůň úpěl ďábelské ódy. "
+     "Česká republika je krásná země ve střední Evropě. " * 3, "cp1250"),
+    ("Это пример текста на русском языке, достаточно длинный "
+     "для определения кодировки.", "cp1251"),
+    ("日本語のテキストです。これはテストの文章で、"
+     "エンコーディングを判定します。" * 3, "shift_jis"),
+])
+def test_detected_legacy_encodings(text, encoding):
+    pytest.importorskip("charset_normalizer")
+    assert decode_text(text.encode(encoding)) == text
+
+
+def test_utf8_and_boms():
+    text = "naïve – 日本"
+    assert decode_text(text.encode("utf-8")) == text
+    assert decode_text(codecs.BOM_UTF8 + text.encode("utf-8")) == text
+    assert decode_text(text.encode("utf-16")) == text
+
+
+def test_undefined_cp1252_bytes_fall_back_to_latin1():
+    assert decode_text(b"\xfc\x81") == "ü\x81"
+
+
+def test_load_text_normalizes_newlines():
+    docs = load_text("Zeile eins\r\nZeile zwei\rdrei".encode("cp1252"))
+    assert docs[0].page_content == "Zeile eins\nZeile zwei\ndrei"